@@ -1,12 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
+import asyncio
 import logging
+import re
+import uuid
+from app.core.cancellation import cancellation_registry, RequestCancelled
 from app.core.claude_client import education_agent
+from app.core.config import settings
+from app.core.idempotency import chat_flights, deduplicated, fingerprint, idempotency_store
+from app.core.rate_limit import client_identity
+from app.core.structured_logging import bind_request_id
+from app.services.plot_store import negotiate_render_options
+from app.services.result_cache import response_cache, response_cache_key
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Client-chosen request IDs (X-Request-ID) end up in store keys and logs
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.:-]{1,128}$")
+
+def _request_id(http_request: Request) -> str:
+    """Use the client's X-Request-ID so it can cancel before the response arrives"""
+    request_id = http_request.headers.get("x-request-id", "")
+    return request_id if _REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+
 class ChatMessage(BaseModel):
     role: str = Field(..., description="消息角色 (user/assistant)")
     content: str = Field(..., description="消息内容")
@@ -14,6 +32,10 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=2000, description="User message")
     history: Optional[List[Dict[str, Any]]] = Field(default=[], description="Conversation history")
+    viewport_width: Optional[int] = Field(default=None, ge=1, le=10000, description="Client plot area width in CSS pixels")
+    device_pixel_ratio: Optional[float] = Field(default=None, gt=0, le=8, description="Client device pixel ratio")
+    plot_format: Optional[str] = Field(default=None, description="Preferred plot format (png/webp/svg)")
+    session_id: Optional[str] = Field(default=None, max_length=128, description="Conversation session ID for persistent execution state")
 
 class ToolResult(BaseModel):
     tool_name: str = Field(..., description="工具名称")
@@ -28,10 +50,105 @@ class ChatResponse(BaseModel):
     error: Optional[str] = Field(default=None, description="Error message if any")
 
 @router.post("/chat")
-async def chat_endpoint(request: ChatRequest):
-    """Main chat endpoint for interacting with the AI assistant"""
+async def chat_endpoint(request: ChatRequest, http_request: Request, http_response: Response):
+    """Main chat endpoint for interacting with the AI assistant
+    
+    Concurrent duplicates (double-clicks, proxy retries) share one pipeline
+    run, and a repeated Idempotency-Key replays the stored response.
+    """
+    request_id = _request_id(http_request)
+    bind_request_id(request_id)
+    http_response.headers["X-Request-ID"] = request_id
+    request_fingerprint = fingerprint(request.model_dump())
+    client = request.session_id or client_identity(http_request)
+    
+    idempotency_key = http_request.headers.get("idempotency-key")
+    if idempotency_key is not None:
+        if not _REQUEST_ID_PATTERN.match(idempotency_key):
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+        idempotency_key = f"{client}:{idempotency_key}"
+        record = await asyncio.to_thread(idempotency_store.get, idempotency_key)
+        if record is not None:
+            if record["fingerprint"] != request_fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+            deduplicated.inc(kind="idempotent_replay")
+            http_response.headers["Idempotent-Replayed"] = "true"
+            return dict(record["response"], request_id=request_id)
+    
+    # Opening questions of the syllabus may have been answered ahead of time. Any first
+    # turn qualifies, session or not, except with kernels, whose state the answer wouldn't set up
+    if not request.history and settings.execution_backend != "kernel":
+        cached = await asyncio.to_thread(response_cache.get, response_cache_key(
+            request.message, negotiate_render_options(plot_format=request.plot_format)))
+        if cached is not None:
+            http_response.headers["X-Cache"] = "HIT"
+            return dict(cached, request_id=request_id)
+    
+    async def run():
+        if idempotency_key is None:
+            return await _process_chat(request, request_id, http_request)
+        return await _run_idempotent(idempotency_key, request_fingerprint,
+                                     _process_chat(request, request_id, http_request))
+    
+    try:
+        if not settings.chat_single_flight:
+            return await run()
+        flight_key = f"idem:{idempotency_key}" if idempotency_key else f"chat:{client}:{request_fingerprint}"
+        response, _ = await chat_flights.do(flight_key, run)
+        return dict(response, request_id=request_id)
+    except RequestCancelled:
+        # Converted only here, so duplicates waiting on a cancelled leader take over
+        # 499: client closed request (nginx convention); usually nobody is listening
+        raise HTTPException(status_code=499, detail="Request cancelled")
+
+async def _run_idempotent(key: str, request_fingerprint: str, pipeline) -> Dict[str, Any]:
+    """Run the pipeline once per Idempotency-Key across workers and store its response"""
+    if not await asyncio.to_thread(idempotency_store.claim, key):
+        pipeline.close()
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+            headers={"Retry-After": "5"}
+        )
     try:
-        logger.info(f"Received chat request: {request.message[:50]}...")
+        response = await pipeline
+        await asyncio.to_thread(idempotency_store.save, key, request_fingerprint, response)
+        return response
+    finally:
+        await asyncio.to_thread(idempotency_store.release, key)
+
+def build_chat_response(response: Dict[str, Any], request_id: Optional[str] = None) -> Dict[str, Any]:
+    """Shape a successful agent result into the format expected by the frontend"""
+    # Extract plots from tool results
+    plots = []
+    tool_results = response.get("tool_results", [])
+    for tool_result in tool_results:
+        if tool_result.get("tool_name") == "python_execute":
+            result_data = tool_result.get("result", {})
+            if "plots" in result_data:
+                plots.extend(result_data["plots"])
+    
+    # Get response text with fallbacks
+    response_text = response.get("response", "")
+    if not response_text:
+        response_text = response.get("text", "")
+    if not response_text:
+        response_text = "No response generated"
+    
+    return {
+        "message": response_text,
+        "plots": plots,
+        "tool_results": tool_results,
+        "type": response.get("type", "assistant"),
+        "usage": response.get("usage"),
+        "request_id": request_id
+    }
+
+async def _process_chat(request: ChatRequest, request_id: str, http_request: Request) -> Dict[str, Any]:
+    """Run the agent pipeline for one chat request and shape the response"""
+    try:
+        logger.info(f"💬 Received chat request ({len(request.message)} chars, "
+                    f"{len(request.history or [])} history messages)")
         
         # Clean history to remove extra fields that might cause validation errors
         cleaned_history = []
@@ -44,54 +161,53 @@ async def chat_endpoint(request: ChatRequest):
                 }
                 cleaned_history.append(cleaned_msg)
         
-        logger.info(f"📝 Cleaned history: {len(cleaned_history)} messages")
+        logger.debug(f"📝 Cleaned history: {len(cleaned_history)} messages")
+        
+        # Negotiate plot format and DPI for this client
+        render_options = negotiate_render_options(
+            viewport_width=request.viewport_width,
+            device_pixel_ratio=request.device_pixel_ratio,
+            plot_format=request.plot_format
+        )
         
-                # Process message with Claude
-        response = await education_agent.process_message(
-            message=request.message,
-            history=cleaned_history
+        # Process message with Claude; abandoned requests stop model calls and sandbox runs
+        response = await cancellation_registry.run(
+            request_id,
+            education_agent.process_message(
+                message=request.message,
+                history=cleaned_history,
+                render_options=render_options,
+                session_id=request.session_id,
+                client_id=request.session_id or client_identity(http_request)
+            ),
+            is_disconnected=http_request.is_disconnected,
+            poll_interval=settings.disconnect_poll_interval
         )
         
-        logger.info(f"🔍 Claude response keys: {list(response.keys())}")
-        logger.info(f"🔍 Response success: {response.get('success', 'unknown')}")
+        logger.debug(f"🔍 Claude response keys: {list(response.keys())}, "
+                     f"success: {response.get('success', 'unknown')}")
         
         # Handle error responses
         if not response.get("success", False):
             error_msg = response.get("error", "Unknown error occurred")
             logger.error(f"AI processing error: {error_msg}")
+            if response.get("retryable"):
+                # Upstream is overloaded or unreachable: tell clients to come back
+                raise HTTPException(
+                    status_code=503,
+                    detail=error_msg,
+                    headers={"Retry-After": str(int(settings.claude_breaker_cooldown))}
+                )
             raise HTTPException(
                 status_code=500,
                 detail=error_msg
             )
         
-        # Extract plots from tool results
-        plots = []
-        tool_results = response.get("tool_results", [])
-        for tool_result in tool_results:
-            if tool_result.get("tool_name") == "python_execute":
-                result_data = tool_result.get("result", {})
-                if "plots" in result_data:
-                    plots.extend(result_data["plots"])
-        
-        # Get response text with fallbacks
-        response_text = response.get("response", "")
-        if not response_text:
-            response_text = response.get("text", "")
-        if not response_text:
-            response_text = "No response generated"
-        
-        # Return response in format expected by frontend
-        final_response = {
-            "message": response_text,
-            "plots": plots,
-            "tool_results": tool_results,
-            "type": response.get("type", "assistant")
-        }
-        
-        logger.info(f"✅ Returning response with {len(plots)} plots and {len(final_response['message'])} chars of text")
+        final_response = build_chat_response(response, request_id)
+        logger.info(f"✅ Returning response with {len(final_response['plots'])} plots and {len(final_response['message'])} chars of text")
         return final_response
         
-    except HTTPException:
+    except (HTTPException, RequestCancelled):
         raise
     except Exception as e:
         logger.error(f"Chat endpoint error: {e}")
@@ -101,21 +217,36 @@ async def chat_endpoint(request: ChatRequest):
         )
 
 @router.post("/chat/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request, http_response: Response):
     """
     流式聊天接口 (TODO: 实现流式响应)
     """
     # 这里可以实现Server-Sent Events (SSE)流式响应
     # 目前返回普通响应
-    return await chat_endpoint(request)
+    return await chat_endpoint(request, http_request, http_response)
+
+@router.post("/chat/{request_id}/cancel")
+async def cancel_chat(request_id: str):
+    """Cancel a running chat request by the X-Request-ID it was sent with"""
+    if not _REQUEST_ID_PATTERN.match(request_id):
+        raise HTTPException(status_code=400, detail="Invalid request ID")
+    # Also recorded in the shared store for requests running on another worker
+    local = await asyncio.to_thread(cancellation_registry.request_cancel, request_id)
+    return {"request_id": request_id, "cancelled": True, "local": local}
 
 @router.get("/chat/health")
 async def health_check():
     """Health check endpoint for the chat service"""
     try:
-        # Test Claude API connection
-        api_valid = education_agent.validate_api_key()
+        # Last result of the background Claude API probe (None until it ran)
+        api_valid = education_agent.api_status
         
+        if api_valid is None:
+            return {
+                "status": "healthy",
+                "claude_api": "unknown",
+                "message": "Chat service is operational; Claude API not checked yet"
+            }
         return {
             "status": "healthy" if api_valid else "degraded",
             "claude_api": "connected" if api_valid else "disconnected",
@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+from app.core.metrics import metrics
+from app.core.shared_store import shared_store
+
+logger = logging.getLogger(__name__)
+
+cancellations = metrics.counter(
+    "chat_cancellations_total", "Chat requests cancelled before completion")
+
+# Scope of the chat request being processed; copied into executor threads by
+# asyncio.to_thread, so blocking sandbox code can register kill callbacks
+current_scope: "contextvars.ContextVar[Optional[CancelScope]]" = contextvars.ContextVar(
+    "cancel_scope", default=None)
+
+
+class RequestCancelled(Exception):
+    """The request was cancelled by its client"""
+
+
+class CancelScope:
+    """Cancellation state of one chat request
+
+    Cancelling stops the request task (aborting in-flight upstream calls at
+    their next await) and runs the registered callbacks, which kill sandbox
+    processes running in worker threads.
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def start(self, coro: Coroutine) -> asyncio.Task:
+        """Run ``coro`` as the request task, with this scope as its context"""
+        token = current_scope.set(self)
+        try:
+            self.task = asyncio.get_running_loop().create_task(coro)
+        finally:
+            current_scope.reset(token)
+        return self.task
+
+    def cancel(self, reason: str) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        logger.info(f"🛑 Cancelling request {self.request_id} ({reason})")
+        cancellations.inc(reason=reason)
+        if self.task is not None:
+            self.task.get_loop().call_soon_threadsafe(self.task.cancel)
+        for callback in callbacks:
+            self._invoke(callback)
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """Run ``callback`` on cancellation (immediately if already cancelled)"""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        self._invoke(callback)
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @staticmethod
+    def _invoke(callback: Callable[[], None]) -> None:
+        try:
+            callback()
+        except Exception as e:
+            logger.warning(f"Cancellation callback failed: {e}")
+
+
+def is_cancelled() -> bool:
+    """Whether the current request has been cancelled"""
+    scope = current_scope.get()
+    return scope is not None and scope.cancelled
+
+
+@contextmanager
+def on_cancel(callback: Callable[[], None]):
+    """Run ``callback`` if the current request is cancelled inside the block"""
+    scope = current_scope.get()
+    if scope is None:
+        yield
+        return
+    scope.add_callback(callback)
+    try:
+        yield
+    finally:
+        scope.remove_callback(callback)
+
+
+class CancellationRegistry:
+    """Running chat requests by request ID
+
+    Cancel requests are also written to the shared store, so a cancel call
+    that lands on a different worker than the request is picked up by the
+    owning worker's watcher.
+    """
+
+    def __init__(self, store, ttl: int = 600):
+        self.store = store
+        self.ttl = ttl
+        self._scopes: Dict[str, CancelScope] = {}
+        self._lock = threading.Lock()
+
+    def open(self, request_id: str) -> CancelScope:
+        scope = CancelScope(request_id)
+        with self._lock:
+            self._scopes[request_id] = scope
+        return scope
+
+    def close(self, request_id: str) -> None:
+        with self._lock:
+            self._scopes.pop(request_id, None)
+
+    def request_cancel(self, request_id: str) -> bool:
+        """Cancel a request; returns whether it was running in this process"""
+        try:
+            self.store.set(self._key(request_id), "1", self.ttl)
+        except Exception as e:
+            logger.warning(f"Could not record cancellation of {request_id}: {e}")
+        with self._lock:
+            scope = self._scopes.get(request_id)
+        if scope is None:
+            return False
+        scope.cancel("cancel_endpoint")
+        return True
+
+    def cancel_all(self, reason: str) -> int:
+        """Cancel every request running in this process; returns how many"""
+        with self._lock:
+            scopes = list(self._scopes.values())
+        for scope in scopes:
+            scope.cancel(reason)
+        return len(scopes)
+
+    def cancel_requested(self, request_id: str) -> bool:
+        try:
+            return self.store.get(self._key(request_id)) is not None
+        except Exception:
+            return False
+
+    async def run(self, request_id: str, coro: Coroutine, is_disconnected: Callable[[], Any],
+                  poll_interval: float = 0.5) -> Any:
+        """Await ``coro``, cancelling it if the client goes away or a cancel arrives
+
+        Raises RequestCancelled when the request was cancelled.
+        """
+        scope = self.open(request_id)
+        task = scope.start(coro)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=poll_interval)
+                if done:
+                    if task.cancelled() and scope.cancelled:
+                        raise RequestCancelled(request_id)
+                    return task.result()
+                if await is_disconnected():
+                    scope.cancel("client_disconnected")
+                elif await asyncio.to_thread(self.cancel_requested, request_id):
+                    scope.cancel("cancel_endpoint")
+        except asyncio.CancelledError:
+            # The endpoint itself was cancelled by the server
+            scope.cancel("server")
+            raise
+        finally:
+            self.close(request_id)
+
+    @staticmethod
+    def _key(request_id: str) -> str:
+        return f"cancel:{request_id}"
+
+
+# Global instance
+cancellation_registry = CancellationRegistry(shared_store)
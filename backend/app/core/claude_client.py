@@ -1,18 +1,60 @@
-import anthropic
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import json
 import logging
+import threading
+import time
 from app.core.config import settings
-from app.tools.manager import get_all_tool_schemas, use_tool
+from app.core.metrics import metrics
+from app.core.resilience import ResilientClient, CircuitBreaker, CircuitOpenError
+from app.core.shared_store import shared_store
+from app.tools.manager import get_all_tool_schemas, use_tool, SIGNAL_TOOLS, create_speculation
+from app.tools.executors.sandbox.profiler import format_report
 
 logger = logging.getLogger(__name__)
 
+chat_latency = metrics.histogram(
+    "chat_request_seconds", "Chat processing time by education_context mode")
+chat_model_calls = metrics.histogram(
+    "chat_model_calls", "Model round-trips per chat request", buckets=(1, 2, 3, 4, 5, 6))
+chat_tokens = metrics.counter(
+    "chat_tokens_total", "Model tokens by direction and education_context mode")
+
+# Prompt rewrites for inline mode: the education_context stage is written in
+# the first response instead of being requested through a signal tool call
+INLINE_CONTEXT_REWRITES = {
+    "**ALWAYS call education_context tool first**, then provide:":
+        "**Write this context directly in your reply** (no tool call is needed for it), then provide:",
+    "### 1. education_context\n- Signals you to generate educational background using your knowledge\n- Always call this FIRST for any physics/math question":
+        "### 1. Educational context (no tool call)\n- Write the educational background directly in your reply, before calling python_execute",
+    "1. **MUST call education_context tool FIRST**":
+        "1. **MUST write the educational context FIRST, in the same response**",
+    "2. **MUST call python_execute tool SECOND with YOUR implementation**":
+        "2. **MUST call python_execute in that same response with YOUR implementation**",
+}
+
+# Shared-store keys for the background API probe, so one worker per
+# interval calls the API and the others adopt its result
+PROBE_CLAIM_KEY = "claude_probe:claim"
+PROBE_STATUS_KEY = "claude_probe:status"
+PROBE_FAILURES_KEY = "claude_probe:failures"
+
 class EducationAgent:
     """Education AI Agent - Clean, AI-driven approach"""
     
-    def __init__(self):
-        self.client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+    def __init__(self, upstream=None, store=None):
         self.model_name = "claude-3-5-sonnet-20241022"  # Track model version
         
+        # SDK clients are built on first use: importing anthropic costs more
+        # than the rest of the app's startup together
+        self._client = None
+        self._upstream = upstream
+        self._init_lock = threading.Lock()
+        
+        # Result of the last background API check (None until one ran)
+        self.api_status: Optional[bool] = None
+        self.api_checked_at: float = 0.0
+        self.store = store or shared_store
+        
         # Simplified, AI-driven system prompt
         self.system_prompt = """
 You are an advanced Physics and Mathematics Teaching Agent that inspires deep understanding through your own knowledge and reasoning.
@@ -72,6 +114,10 @@ You are an advanced Physics and Mathematics Teaching Agent that inspires deep un
 - Simplified tools with basic templates
 - YOU still provide the sophisticated implementation
 
+### 4. knowledge_search
+- Looks up standard derivations and formulas in a curated reference corpus
+- Use it instead of re-deriving textbook results at length; build on and cite what it returns
+
 ## DECISION-MAKING AUTHORITY:
 
 **You Decide Visualization Type**:
@@ -126,6 +172,48 @@ You are an advanced Physics and Mathematics Teaching Agent that inspires deep un
 
 Remember: You are the expert. Trust your knowledge to make the best educational and implementation choices.
 """
+        self.inline_system_prompt = self._inline_context_prompt(self.system_prompt)
+    
+    @staticmethod
+    def _inline_context_prompt(prompt: str) -> str:
+        for original, replacement in INLINE_CONTEXT_REWRITES.items():
+            if original not in prompt:
+                logger.warning(f"Inline context rewrite not applied: {original[:40]}...")
+            prompt = prompt.replace(original, replacement)
+        return prompt
+    
+    def _prompt_and_tools(self) -> Tuple[str, List[Dict[str, Any]]]:
+        """System prompt and tool list for the configured education_context mode"""
+        if settings.education_context_mode == "inline":
+            return self.inline_system_prompt, get_all_tool_schemas(exclude=SIGNAL_TOOLS)
+        return self.system_prompt, get_all_tool_schemas()
+    
+    async def _call_model(self, usage: Dict[str, Any], hedge: bool = False,
+                          speculation=None, **kwargs):
+        """Call the model and account round-trips and tokens for this request
+        
+        With a speculation the response is streamed, so python_execute can
+        start while the model is still generating.
+        """
+        if speculation is not None:
+            response = await self.upstream.stream(speculation.on_event, **kwargs)
+        else:
+            response = await self.upstream.create(hedge=hedge, **kwargs)
+        usage["model_calls"] += 1
+        response_usage = getattr(response, "usage", None)
+        if response_usage is not None:
+            usage["input_tokens"] += response_usage.input_tokens
+            usage["output_tokens"] += response_usage.output_tokens
+        return response
+    
+    def _record_usage(self, usage: Dict[str, Any], started: float) -> Dict[str, Any]:
+        usage["latency_ms"] = int((time.perf_counter() - started) * 1000)
+        mode = usage["mode"]
+        chat_latency.observe(usage["latency_ms"] / 1000, mode=mode)
+        chat_model_calls.observe(usage["model_calls"], mode=mode)
+        chat_tokens.inc(usage["input_tokens"], direction="input", mode=mode)
+        chat_tokens.inc(usage["output_tokens"], direction="output", mode=mode)
+        return usage
     
     def get_model_info(self) -> Dict[str, str]:
         """Get current model information for logging"""
@@ -135,11 +223,53 @@ Remember: You are the expert. Trust your knowledge to make the best educational
             "approach": "ai_driven_implementation"
         }
     
-    async def process_message(self, message: str, history: List[Dict] = None) -> Dict[str, Any]:
+    @property
+    def client(self):
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    import anthropic
+                    self._client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+        return self._client
+    
+    @property
+    def upstream(self):
+        """Chat traffic goes through the resilient wrapper (it owns retries);
+        any object with the same create/stream methods can stand in for it"""
+        if self._upstream is None:
+            with self._init_lock:
+                if self._upstream is None:
+                    import anthropic
+                    self._upstream = ResilientClient(
+                        anthropic.AsyncAnthropic(
+                            api_key=settings.anthropic_api_key,
+                            max_retries=0,
+                            timeout=settings.claude_timeout
+                        ),
+                        max_retries=settings.claude_max_retries,
+                        base_delay=settings.claude_retry_base_delay,
+                        max_delay=settings.claude_retry_max_delay,
+                        hedge_delay=settings.claude_hedge_delay,
+                        fallback_model=settings.claude_fallback_model,
+                        breaker=CircuitBreaker(
+                            failure_threshold=settings.claude_breaker_threshold,
+                            reset_timeout=settings.claude_breaker_cooldown
+                        )
+                    )
+        return self._upstream
+    
+    @upstream.setter
+    def upstream(self, upstream):
+        self._upstream = upstream
+    
+    async def process_message(self, message: str, history: List[Dict] = None,
+                              render_options: Optional[Dict[str, Any]] = None,
+                              session_id: Optional[str] = None,
+                              client_id: Optional[str] = None) -> Dict[str, Any]:
         """Process user message with model tracking"""
         
-        logger.info(f"🤖 Processing message with {self.model_name}")
-        logger.info(f"📝 User message: {message[:100]}...")
+        # Message text stays out of the logs; lengths are enough to correlate
+        logger.info(f"🤖 Processing message with {self.model_name} ({len(message)} chars)")
         
         try:
             messages = []
@@ -156,32 +286,67 @@ Remember: You are the expert. Trust your knowledge to make the best educational
             
             # Get model info for tool calls
             model_info = self.get_model_info()
+            if render_options:
+                model_info["render_options"] = render_options
+            if session_id:
+                model_info["session_id"] = session_id
+            if client_id:
+                model_info["client_id"] = client_id  # Fair-share identity for sandbox slots
             
-            # Call Claude API
-            response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=4000,
-                temperature=0.1,
-                system=self.system_prompt,
-                messages=messages,
-                tools=get_all_tool_schemas()
-            )
+            # Round-trips and tokens spent on this request
+            usage = {"mode": settings.education_context_mode,
+                     "model_calls": 0, "input_tokens": 0, "output_tokens": 0}
+            started = time.perf_counter()
+            system_prompt, tools = self._prompt_and_tools()
             
-            # Process response with model info
-            return await self._handle_response(response, messages, model_info)
+            # Call Claude API (hedged unless streamed: nothing has been executed yet)
+            speculation = create_speculation(model_info)
+            try:
+                response = await self._call_model(
+                    usage,
+                    hedge=True,
+                    speculation=speculation,
+                    model=self.model_name,
+                    max_tokens=4000,
+                    temperature=0.1,
+                    system=system_prompt,
+                    messages=messages,
+                    tools=tools
+                )
+                
+                # Process response with model info
+                result = await self._handle_response(response, messages, model_info, usage, speculation)
+            finally:
+                if speculation is not None:
+                    speculation.close()
+            result["usage"] = self._record_usage(usage, started)
+            logger.info(f"📈 {usage['model_calls']} model calls, {usage['input_tokens']} input / "
+                        f"{usage['output_tokens']} output tokens in {usage['latency_ms']}ms")
+            return result
             
+        except CircuitOpenError as e:
+            logger.warning(f"⚡ Failing fast: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "retryable": True,
+                "response": "The AI service is temporarily unavailable. Please try again shortly."
+            }
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             return {
                 "success": False,
                 "error": str(e),
+                "retryable": ResilientClient.is_retryable(e),
                 "response": "Sorry, I encountered an error processing your request."
             }
     
-    async def _handle_response(self, response, messages: List[Dict], model_info: Dict[str, str]) -> Dict[str, Any]:
+    async def _handle_response(self, response, messages: List[Dict], model_info: Dict[str, str],
+                               usage: Dict[str, Any], speculation=None) -> Dict[str, Any]:
         """Handle Claude response with tool execution tracking"""
         
         conversation_messages = messages.copy()
+        system_prompt, tools = self._prompt_and_tools()
         
         # Add assistant response
         conversation_messages.append({
@@ -191,6 +356,7 @@ Remember: You are the expert. Trust your knowledge to make the best educational
         
         response_text = ""
         tool_results = []
+        tool_result_blocks = []
         
         # Process response content
         for content in response.content:
@@ -199,78 +365,91 @@ Remember: You are the expert. Trust your knowledge to make the best educational
             elif content.type == "tool_use":
                 logger.info(f"🔧 Tool call detected: {content.name}")
                 
-                # Execute tool with model info
-                tool_result = await use_tool(content, model_info)
+                # Execute tool with model info (or pick up the speculative run)
+                tool_result = await self._run_tool(content, model_info, speculation)
                 tool_results.append({
                     "tool_name": content.name,
                     "result": tool_result  # Store original result for frontend
                 })
                 
                 # Add tool result to conversation (optimized for Claude)
-                conversation_messages.append({
-                    "role": "user",
-                    "content": [{
-                        "type": "tool_result",
-                        "tool_use_id": content.id,
-                        "content": self._optimize_tool_result_for_claude(tool_result)
-                    }]
+                tool_result_blocks.append({
+                    "type": "tool_result",
+                    "tool_use_id": content.id,
+                    "content": self._optimize_tool_result_for_claude(tool_result)
                 })
         
+        # Results of every tool call in one turn go back in a single message
+        if tool_result_blocks:
+            conversation_messages.append({
+                "role": "user",
+                "content": tool_result_blocks
+            })
+        
         # If tools were used, get follow-up response
         if tool_results:
             logger.info(f"🔄 Getting follow-up response after {len(tool_results)} tool calls")
             
-            follow_up_response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=4000,
-                temperature=0.1,
-                system=self.system_prompt,
-                messages=conversation_messages,
-                tools=get_all_tool_schemas()  # Important: include tools for potential additional calls
-            )
+            follow_up_speculation = create_speculation(model_info)
+            try:
+                follow_up_response = await self._call_model(
+                    usage,
+                    speculation=follow_up_speculation,
+                    model=self.model_name,
+                    max_tokens=4000,
+                    temperature=0.1,
+                    system=system_prompt,
+                    messages=conversation_messages,
+                    tools=tools  # Important: include tools for potential additional calls
+                )
             
-            # Process follow-up response - check for additional tool calls
-            for content in follow_up_response.content:
-                if content.type == "text":
-                    response_text += "\n\n" + content.text
-                elif content.type == "tool_use":
-                    logger.info(f"🔧 Additional tool call detected: {content.name}")
+                # Process follow-up response - check for additional tool calls
+                for content in follow_up_response.content:
+                    if content.type == "text":
+                        response_text += "\n\n" + content.text
+                    elif content.type == "tool_use":
+                        logger.info(f"🔧 Additional tool call detected: {content.name}")
                     
-                    # Execute additional tool
-                    additional_tool_result = await use_tool(content, model_info)
-                    tool_results.append({
-                        "tool_name": content.name,
-                        "result": additional_tool_result  # Store original result for frontend
-                    })
+                        # Execute additional tool
+                        additional_tool_result = await self._run_tool(content, model_info,
+                                                                      follow_up_speculation)
+                        tool_results.append({
+                            "tool_name": content.name,
+                            "result": additional_tool_result  # Store original result for frontend
+                        })
                     
-                    # Add additional tool result to conversation (optimized for Claude)
-                    conversation_messages.append({
-                        "role": "assistant",
-                        "content": follow_up_response.content
-                    })
-                    conversation_messages.append({
-                        "role": "user",
-                        "content": [{
-                            "type": "tool_result",
-                            "tool_use_id": content.id,
-                            "content": self._optimize_tool_result_for_claude(additional_tool_result)
-                        }]
-                    })
+                        # Add additional tool result to conversation (optimized for Claude)
+                        conversation_messages.append({
+                            "role": "assistant",
+                            "content": follow_up_response.content
+                        })
+                        conversation_messages.append({
+                            "role": "user",
+                            "content": [{
+                                "type": "tool_result",
+                                "tool_use_id": content.id,
+                                "content": self._optimize_tool_result_for_claude(additional_tool_result)
+                            }]
+                        })
                     
-                    # Get final response after additional tool
-                    logger.info(f"🔄 Getting final response after additional tool: {content.name}")
-                    final_response = self.client.messages.create(
-                        model=self.model_name,
-                        max_tokens=4000,
-                        temperature=0.1,
-                        system=self.system_prompt,
-                        messages=conversation_messages
-                    )
+                        # Get final response after additional tool
+                        logger.info(f"🔄 Getting final response after additional tool: {content.name}")
+                        final_response = await self._call_model(
+                            usage,
+                            model=self.model_name,
+                            max_tokens=4000,
+                            temperature=0.1,
+                            system=system_prompt,
+                            messages=conversation_messages
+                        )
                     
-                    # Add final response text
-                    for final_content in final_response.content:
-                        if final_content.type == "text":
-                            response_text += "\n\n" + final_content.text
+                        # Add final response text
+                        for final_content in final_response.content:
+                            if final_content.type == "text":
+                                response_text += "\n\n" + final_content.text
+            finally:
+                if follow_up_speculation is not None:
+                    follow_up_speculation.close()
         
         return {
             "success": True,
@@ -280,23 +459,75 @@ Remember: You are the expert. Trust your knowledge to make the best educational
             "model_info": model_info
         }
     
+    async def _run_tool(self, content, model_info: Dict[str, Any], speculation=None) -> Any:
+        """Run a tool call, reusing an execution started while the response streamed"""
+        if speculation is not None and content.name == "python_execute":
+            result = await speculation.result_for(content)
+            if result is not None:
+                return result
+        return await use_tool(content, model_info)
+    
     def validate_api_key(self) -> bool:
-        """Validate Anthropic API key"""
+        """Validate Anthropic API key
+
+        Lists models rather than generating, so checks are not billed.
+        Returns False when the key is rejected; transient upstream errors
+        (timeouts, 429, 5xx) are raised so callers can tell them apart.
+        """
         try:
-            # Test API key with a minimal request
-            test_response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=10,
-                messages=[{"role": "user", "content": "Hi"}]
-            )
+            self.client.models.list(limit=1)
             return True
         except Exception as e:
+            if ResilientClient.is_retryable(e):
+                raise
             logger.error(f"API key validation failed: {e}")
             return False
 
+    def probe_api(self) -> Optional[bool]:
+        """Validate the API key and remember the result for health checks
+
+        Only the worker that claims the interval calls the API; the others
+        adopt the stored result. A rejected key marks the API down at once,
+        transient errors only after claude_probe_failure_threshold probes
+        in a row.
+        """
+        interval = max(settings.claude_probe_interval, 60)
+        claimed, _ = self.store.incr(PROBE_CLAIM_KEY, ttl=interval * 0.9)
+        if claimed > 1:
+            self._adopt_stored_status()
+            return self.api_status
+
+        try:
+            status = self.validate_api_key()
+            self.store.delete(PROBE_FAILURES_KEY)
+        except Exception as e:
+            threshold = settings.claude_probe_failure_threshold
+            failures, _ = self.store.incr(PROBE_FAILURES_KEY, ttl=interval * (threshold + 1))
+            logger.warning(f"⚠️ Claude API probe failed ({failures}/{threshold}): {e}")
+            if failures < threshold:
+                self._adopt_stored_status()
+                return self.api_status
+            status = False
+
+        self.api_status = status
+        self.api_checked_at = time.time()
+        self.store.set(PROBE_STATUS_KEY, json.dumps([status, self.api_checked_at]), ttl=interval * 3)
+        return status
+
+    def _adopt_stored_status(self) -> None:
+        stored = self.store.get(PROBE_STATUS_KEY)
+        if stored is not None:
+            self.api_status, self.api_checked_at = json.loads(stored)
+
     def _optimize_tool_result_for_claude(self, tool_result: Any) -> str:
         """Optimize tool result for Claude API - remove heavy data, keep only metadata"""
         if isinstance(tool_result, dict):
+            # Profile reports are appended as text so truncation never cuts them
+            if tool_result.get("profile"):
+                summary = self._optimize_tool_result_for_claude(
+                    {k: v for k, v in tool_result.items() if k != "profile"})
+                return summary + "\n\n" + format_report(tool_result["profile"])
+            
             # If this is a python execution result with plots
             if "plots" in tool_result and tool_result["plots"]:
                 plot_count = len(tool_result["plots"])
@@ -317,6 +548,12 @@ Remember: You are the expert. Trust your knowledge to make the best educational
                 
                 return str(optimized_result)
             
+            # Retrieved passages are the payload; pass them as readable text
+            if tool_result.get("passages"):
+                return "\n\n".join(
+                    f"[{p['title']}] ({p['source']})\n{p['text']}" for p in tool_result["passages"]
+                )
+            
             # For other tool results, limit the size
             result_str = str(tool_result)
             if len(result_str) > 1000:
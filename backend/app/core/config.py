@@ -8,12 +8,30 @@ class Settings(BaseSettings):
     # Claude API Configuration
     anthropic_api_key: str = ""
     claude_model: str = "claude-3-5-sonnet-20241022"
+    claude_fallback_model: str = ""  # e.g. a faster model used when retries are exhausted
+    claude_timeout: float = 120.0  # Seconds per upstream request
+    claude_max_retries: int = 3
+    claude_retry_base_delay: float = 0.5  # Seconds, doubled per attempt with full jitter
+    claude_retry_max_delay: float = 8.0
+    claude_hedge_delay: float = 0.0  # Seconds before hedging the first call (0 disables)
+    claude_breaker_threshold: int = 5  # Consecutive failures before failing fast
+    claude_breaker_cooldown: float = 30.0  # Seconds before a half-open probe
+    education_context_mode: str = "inline"  # inline (written in the first response) or tool (extra round-trip)
+    claude_probe_interval: int = 300  # Seconds between background API key checks for /health (0: startup only)
+    claude_probe_failure_threshold: int = 3  # Consecutive failed probes (timeouts, 429, 5xx) before /health reports the API down
     
     # Application Configuration
     app_name: str = "Math & Physics Education AI"
     app_version: str = "1.0.0"
     debug: bool = False
     
+    # Logging Configuration
+    log_level: str = "INFO"
+    log_format: str = "json"  # json (one object per line) or text
+    log_sample_rates: str = ""  # e.g. app.tools=0.1,app.core.claude_client=0.5 (sub-WARNING records kept)
+    log_rate_limit: float = 50.0  # Sub-WARNING records per second per logger (0 disables)
+    log_queue_size: int = 10000  # Records buffered for the writer thread before dropping
+    
     # Server Configuration
     host: str = "0.0.0.0"
     port: int = 8000
@@ -26,23 +44,79 @@ class Settings(BaseSettings):
     
     # Database Configuration
     redis_url: str = ""  # Leave empty to disable Redis and use in-memory cache
+    shared_store_backend: str = "auto"  # auto (redis if configured, else sqlite), redis, sqlite or memory
+    shared_store_path: str = "./data/shared_state.db"  # SQLite file shared by local workers
     
     # Knowledge Base Configuration
     knowledge_cache_dir: str = "./data/knowledge_cache"
-    embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"  # "hashing" forces the offline embedder
+    knowledge_corpus_dir: str = "./app/knowledge/corpus"  # Markdown documents served by knowledge_search
+    knowledge_search_enabled: bool = True
+    knowledge_top_k: int = 3
+    knowledge_ann_threshold: int = 50000  # Chunks before an HNSW index is built (needs hnswlib)
     
     # Jupyter Configuration
     jupyter_timeout: int = 30
     jupyter_kernel: str = "python3"
     
+    # Execution Backend Configuration
+    execution_backend: str = "subprocess"  # subprocess, kernel (persistent per-session state) or queue (remote workers)
+    kernel_max_sessions: int = 8
+    kernel_idle_ttl: int = 900  # Seconds before an idle session kernel is shut down
+    kernel_max_memory_mb: int = 4096  # Total resident memory across live kernels
+    execution_queue_name: str = "edu:exec"  # Redis key prefix for queued jobs and results
+    execution_queue_grace: int = 30  # Seconds a job may wait in the queue on top of its timeout
+    execution_worker_concurrency: int = 2  # Parallel jobs per worker process
+    
     # Tools Configuration
     code_execution_timeout: int = 30
     max_output_size: int = 10 * 1024 * 1024  # 10MB
+    code_cache_dir: str = "./data/code_cache"  # Compiled sandbox scripts
+    code_cache_size: int = 256
+    sympy_cache_enabled: bool = True  # Memoize slow sympy integrate/solve/simplify/dsolve across executions
+    sympy_cache_path: str = "./data/sympy_cache.db"  # SQLite file sandboxes read; only the executor writes it
+    sympy_cache_max_mb: int = 64  # Least recently used results are evicted beyond this
+    template_fast_path: bool = True  # Render built-in physics/math templates in-process
+    sandbox_warm_pool_size: int = 2  # Pre-started sandbox processes with the preamble loaded (0 disables)
+    speculative_execution: bool = True  # Prepare and start python_execute while the model is still streaming
+    execution_slots: int = 0  # Concurrent sandbox executions per API process (0 = CPU count / WEB_CONCURRENCY)
+    execution_short_seconds: float = 5.0  # Jobs estimated at most this long are scheduled ahead of longer ones
+    execution_aging_seconds: float = 60.0  # Long jobs queued this long regain priority over short ones
+    disconnect_poll_interval: float = 0.5  # Seconds between checks for a disconnected or cancelled chat client
+    chat_single_flight: bool = True  # Concurrent identical chat requests share one pipeline run
+    idempotency_ttl: int = 600  # Seconds a response is replayed for a repeated Idempotency-Key
+    drain_timeout: int = 60  # Seconds in-flight chats get to finish on shutdown
+    temp_file_max_age: int = 3600  # Sandbox temp files older than this are purged at startup/shutdown
+    response_cache_ttl: int = 7 * 24 * 3600  # Pre-warmed first-turn chat responses (0 disables)
+    execution_cache_ttl: int = 24 * 3600  # Successful deterministic sandbox results by exact code (0 disables)
+    
+    # Animation Configuration
+    animation_format: str = "webp"  # webp, mp4 (requires ffmpeg) or gif
+    animation_max_frames: int = 120
+    animation_max_dim: int = 800  # Longest frame side in pixels
+    animation_fps: int = 15
+    
+    # Plot Rendering Configuration
+    plot_render_mode: str = "memory"  # memory (worker channel) or file (legacy sidecars)
+    plot_format: str = "png"  # png, webp or svg
+    plot_dpi: int = 150  # Upper bound when negotiating against the client viewport
+    plot_min_dpi: int = 60
+    plot_max_width: int = 2400  # Device pixels
+    plot_downsample: bool = True  # Thin series denser than the output pixels before rendering
+    plot_downsample_method: str = "minmax"  # minmax (exact envelope) or lttb
+    plot_data_export: bool = True  # Serve line/scatter/heatmap data next to static plots for client-side zoom
+    plot_data_max_points: int = 10000  # Per exported series
+    plot_precompress: bool = True  # Store .gz/.br variants of SVG plots
+    plot_variants_enabled: bool = True  # Thumbnail/medium variants for static plots
+    plot_cache_max_age: int = 31536000  # Plot URLs are immutable (1 year)
+    plot_accel_redirect_prefix: str = ""  # e.g. /internal-plots/ to let nginx send files
     
     # Security Configuration
     max_message_length: int = 10000
     rate_limit_requests: int = 100
     rate_limit_window: int = 3600  # 1 hour
+    rate_limit_enabled: bool = False  # Per-client limit on chat POSTs; see README before enabling
+    rate_limit_trust_proxy: bool = False  # Use X-Real-IP (only behind the bundled nginx)
     
     # Frontend Configuration
     react_app_api_url: str = "http://localhost:8000"
@@ -60,10 +134,5 @@ class Settings(BaseSettings):
         # Allow extra fields
         extra = 'ignore'
 
-# Manually load .env file at import time to ensure environment variables are read correctly
-from dotenv import load_dotenv
-env_path = Path(__file__).parent.parent.parent.parent / ".env"
-if env_path.exists():
-    load_dotenv(env_path)
-
+# pydantic-settings reads the .env file itself (see Config.env_file)
 settings = Settings() 
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.cancellation import RequestCancelled
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.shared_store import shared_store
+
+logger = logging.getLogger(__name__)
+
+deduplicated = metrics.counter(
+    "chat_deduplicated_total", "Chat requests answered without running the pipeline again")
+
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of a JSON-serializable request payload"""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation
+
+    Duplicates arriving while a call is in flight wait for it and share its
+    result (or error). If the leading request is cancelled by its own
+    client, the waiters are not: the next one takes over as leader.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run ``factory`` or join the call in flight; returns (result, shared)"""
+        while key in self._flights:
+            try:
+                result = await asyncio.shield(self._flights[key])
+                deduplicated.inc(kind="single_flight")
+                return result, True
+            except (RequestCancelled, asyncio.CancelledError):
+                if key in self._flights and not self._flights[key].done():
+                    raise  # This waiter itself was cancelled
+                logger.info("🔁 Leading duplicate was cancelled, taking over")
+
+        flight = asyncio.get_running_loop().create_future()
+        # Only waiters look at the outcome; don't warn when there are none
+        flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._flights[key] = flight
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            flight.set_exception(RequestCancelled(key))
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result, False
+        finally:
+            self._flights.pop(key, None)
+
+
+class IdempotencyStore:
+    """Responses of completed requests by client-supplied Idempotency-Key
+
+    Records live in the shared store so a retry landing on another worker
+    is still answered from cache. A claim marks a key as in progress, so
+    concurrent retries on different workers don't both execute.
+    """
+
+    def __init__(self, store, ttl: int = 600, lock_ttl: int = 360):
+        self.store = store
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            record = self.store.get(f"idem:{key}")
+        except Exception as e:
+            logger.warning(f"Idempotency lookup failed: {e}")
+            return None
+        return json.loads(record) if record else None
+
+    def claim(self, key: str) -> bool:
+        """Mark ``key`` as in progress; False if another request holds it"""
+        try:
+            count, _ = self.store.incr(f"idem-lock:{key}", self.lock_ttl)
+        except Exception as e:
+            logger.warning(f"Idempotency claim failed, executing anyway: {e}")
+            return True
+        return count == 1
+
+    def release(self, key: str) -> None:
+        try:
+            self.store.delete(f"idem-lock:{key}")
+        except Exception as e:
+            logger.warning(f"Idempotency release failed: {e}")
+
+    def save(self, key: str, request_fingerprint: str, response: Dict[str, Any]) -> None:
+        record = json.dumps({"fingerprint": request_fingerprint, "response": response},
+                            ensure_ascii=False, default=str)
+        try:
+            self.store.set(f"idem:{key}", record, self.ttl)
+        except Exception as e:
+            logger.warning(f"Idempotency record not saved: {e}")
+
+
+# Global instances
+chat_flights = SingleFlight()
+idempotency_store = IdempotencyStore(shared_store, ttl=settings.idempotency_ttl)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from typing import Callable, List, Tuple
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+lifecycle_state = metrics.gauge(
+    "lifecycle_ready", "1 when this worker is warm and admitting chat requests")
+in_flight_requests = metrics.gauge(
+    "chat_in_flight_requests", "Chat requests currently being processed by this worker")
+
+
+class LifecycleManager:
+    """Startup warm-up, readiness and graceful drain of one server worker
+
+    A worker starts in ``starting``, becomes ``ready`` once its warm-up
+    steps ran, and moves to ``draining`` on shutdown, where new chat
+    requests are refused (so the proxy retries them on a sibling) while
+    in-flight ones get until the drain deadline to finish.
+    """
+
+    def __init__(self):
+        self.state = "starting"
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def admitting(self) -> bool:
+        return self.state != "draining" and self.state != "stopped"
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+        in_flight_requests.set(self.in_flight)
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+        in_flight_requests.set(self.in_flight)
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def warm_up(self, steps: List[Tuple[str, Callable[[], object]]]) -> None:
+        """Run blocking warm-up steps off the event loop, then report ready
+
+        A failing step is logged and skipped: a partly warm worker still
+        serves correctly, only slower.
+        """
+        started = time.perf_counter()
+        for name, step in steps:
+            step_started = time.perf_counter()
+            try:
+                await asyncio.to_thread(step)
+                logger.info(f"🔥 Warm-up '{name}' done in {time.perf_counter() - step_started:.2f}s")
+            except Exception as e:
+                logger.warning(f"⚠️ Warm-up '{name}' failed: {e}")
+        if self.state == "starting":
+            self.state = "ready"
+            lifecycle_state.set(1)
+        logger.info(f"✅ Worker ready after {time.perf_counter() - started:.2f}s of warm-up")
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop admitting chat requests and wait for in-flight ones
+
+        Returns False if requests were still running at the deadline.
+        """
+        self.state = "draining"
+        lifecycle_state.set(0)
+        if self.in_flight:
+            logger.info(f"⏳ Draining {self.in_flight} in-flight chat requests (up to {timeout:.0f}s)")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self.in_flight} chat requests still running after the drain deadline")
+            return False
+
+    def stopped(self) -> None:
+        self.state = "stopped"
+
+
+# Global instance
+lifecycle = LifecycleManager()
@@ -0,0 +1,52 @@
+import logging
+import time
+from typing import Dict, Any
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+rate_limited_requests = metrics.counter(
+    "rate_limited_requests_total", "Requests rejected by the rate limiter")
+
+
+def client_identity(request) -> str:
+    """Client address of a request (X-Real-IP only behind the bundled proxy)"""
+    client_id = request.client.host if request.client else "unknown"
+    if settings.rate_limit_trust_proxy:
+        client_id = request.headers.get("x-real-ip", client_id)
+    return client_id
+
+
+class RateLimiter:
+    """Fixed-window per-client rate limiter backed by the shared store
+
+    Counters live in the shared store rather than process memory, so the
+    limit holds across all workers. If the store is unreachable requests
+    are let through: a broken limiter must not take the service down.
+    """
+
+    def __init__(self, store, limit: int, window: int):
+        self.store = store
+        self.limit = limit
+        self.window = window
+
+    def hit(self, client_id: str) -> Dict[str, Any]:
+        """Count one request for ``client_id`` and report whether it is allowed"""
+        window_start = int(time.time() // self.window) * self.window
+        key = f"ratelimit:{client_id}:{window_start}"
+        try:
+            count, expires_at = self.store.incr(key, self.window)
+        except Exception as e:
+            logger.warning(f"Rate limiter store unavailable, allowing request: {e}")
+            return {"allowed": True, "remaining": self.limit, "reset": self.window}
+
+        allowed = count <= self.limit
+        if not allowed:
+            rate_limited_requests.inc()
+        return {
+            "allowed": allowed,
+            "remaining": max(0, self.limit - count),
+            "reset": max(1, int(expires_at - time.time()))
+        }
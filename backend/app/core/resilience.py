@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+
+from app.core.metrics import metrics
+
+if TYPE_CHECKING:
+    import anthropic
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: timeouts, conflicts, rate limits, server errors, overloaded
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+upstream_requests = metrics.counter(
+    "upstream_requests_total", "Upstream model calls by model and outcome")
+upstream_latency = metrics.histogram(
+    "upstream_request_seconds", "Upstream model call latency in seconds")
+upstream_retries = metrics.counter(
+    "upstream_retries_total", "Upstream retries by reason")
+upstream_hedges = metrics.counter(
+    "upstream_hedges_total", "Hedged upstream requests by outcome")
+upstream_fallbacks = metrics.counter(
+    "upstream_fallbacks_total", "Calls served by the fallback model by trigger")
+circuit_state_gauge = metrics.gauge(
+    "upstream_circuit_open", "1 while the upstream circuit breaker is open")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open probe
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast for ``reset_timeout`` seconds; then a single probe is let
+    through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        circuit_state_gauge.set(0)
+
+    def end_probe(self) -> None:
+        """Let the next call probe when the last one ended without an outcome"""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            if self.opened_at is None:
+                logger.warning(f"⚡ Upstream circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+            circuit_state_gauge.set(1)
+
+
+class ResilientClient:
+    """Retrying, hedging, circuit-breaking wrapper around ``messages.create``
+
+    Retryable failures are retried with full-jitter exponential backoff,
+    honoring ``retry-after`` when upstream sends it. Hedged calls launch a
+    duplicate request if the first has not answered within ``hedge_delay``
+    and use whichever finishes first. When the breaker is open or retries
+    are exhausted, an optional faster fallback model is tried once.
+    """
+
+    def __init__(self, client: "anthropic.AsyncAnthropic",
+                 max_retries: int = 3,
+                 base_delay: float = 0.5,
+                 max_delay: float = 8.0,
+                 max_retry_after: float = 30.0,
+                 hedge_delay: float = 0.0,
+                 fallback_model: str = "",
+                 breaker: Optional[CircuitBreaker] = None):
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.hedge_delay = hedge_delay
+        self.fallback_model = fallback_model
+        self.breaker = breaker or CircuitBreaker()
+
+    async def create(self, hedge: bool = False, **kwargs) -> Any:
+        """Drop-in replacement for ``client.messages.create(**kwargs)``"""
+        return await self._resilient(
+            kwargs, lambda call_kwargs, first: self._call_once(call_kwargs, hedge=hedge and first)
+        )
+
+    async def stream(self, on_event: Callable[[Any], None], **kwargs) -> Any:
+        """Streamed ``messages.create``: raw events go to ``on_event`` as they
+        arrive and the final message is returned. Streams are never hedged."""
+        return await self._resilient(
+            kwargs, lambda call_kwargs, first: self._timed(call_kwargs, self._stream_once(call_kwargs, on_event))
+        )
+
+    async def _resilient(self, kwargs: dict, call: Callable[[dict, bool], Awaitable[Any]]) -> Any:
+        model = kwargs.get("model", "")
+
+        probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            if self._can_fall_back(model):
+                upstream_fallbacks.inc(trigger="circuit_open")
+                return await call(dict(kwargs, model=self.fallback_model), False)
+            upstream_requests.inc(model=model, outcome="circuit_open")
+            raise CircuitOpenError("Upstream model service is temporarily unavailable")
+
+        last_error: Optional[Exception] = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await call(kwargs, attempt == 0)
+                    self.breaker.record_success()
+                    return response
+                except Exception as e:
+                    if not self.is_retryable(e):
+                        if self.is_client_error(e):
+                            # Upstream answered; the request itself was rejected
+                            self.breaker.record_success()
+                        raise
+                    self.breaker.record_failure()
+                    last_error = e
+                    if attempt == self.max_retries or not self.breaker.allow():
+                        break
+                    delay = self._backoff(attempt, e)
+                    upstream_retries.inc(reason=self._reason(e))
+                    logger.warning(f"🔁 Upstream call failed ({self._reason(e)}), retry {attempt + 1} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+        finally:
+            if probe:
+                # A probe cancelled mid-call records nothing; don't stay stuck half-open
+                self.breaker.end_probe()
+
+        if self._can_fall_back(model):
+            upstream_fallbacks.inc(trigger="retries_exhausted")
+            logger.warning(f"↪️ Falling back to {self.fallback_model}")
+            return await call(dict(kwargs, model=self.fallback_model), False)
+        raise last_error
+
+    async def _call_once(self, kwargs: dict, hedge: bool) -> Any:
+        if not hedge or self.hedge_delay <= 0:
+            return await self._timed_call(kwargs)
+
+        primary = asyncio.ensure_future(self._timed_call(kwargs))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        except asyncio.CancelledError:
+            # asyncio.wait doesn't cancel what it waits on; abort the request
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        upstream_hedges.inc(outcome="launched")
+        secondary = asyncio.ensure_future(self._timed_call(kwargs))
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        upstream_hedges.inc(outcome="hedge_won" if task is secondary else "primary_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _stream_once(self, kwargs: dict, on_event: Callable[[Any], None]) -> Any:
+        async with self.client.messages.stream(**kwargs) as stream:
+            async for event in stream:
+                on_event(event)
+            return await stream.get_final_message()
+
+    async def _timed_call(self, kwargs: dict) -> Any:
+        return await self._timed(kwargs, self.client.messages.create(**kwargs))
+
+    async def _timed(self, kwargs: dict, call: Awaitable[Any]) -> Any:
+        model = kwargs.get("model", "")
+        started = time.perf_counter()
+        try:
+            response = await call
+        except asyncio.CancelledError:
+            upstream_requests.inc(model=model, outcome="cancelled")
+            raise
+        except Exception as e:
+            upstream_requests.inc(model=model, outcome=self._reason(e))
+            raise
+        upstream_latency.observe(time.perf_counter() - started, model=model)
+        upstream_requests.inc(model=model, outcome="success")
+        return response
+
+    def _can_fall_back(self, model: str) -> bool:
+        return bool(self.fallback_model) and model != self.fallback_model
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        # Full jitter keeps synchronized clients from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000.0
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except ValueError:
+            return None
+        return None
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        import anthropic  # Already loaded once the client has raised
+        if isinstance(error, anthropic.APIConnectionError):  # Includes timeouts
+            return True
+        if isinstance(error, anthropic.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES
+        return False
+
+    @staticmethod
+    def is_client_error(error: Exception) -> bool:
+        import anthropic
+        return isinstance(error, anthropic.APIStatusError) and 400 <= error.status_code < 500
+
+    @staticmethod
+    def _reason(error: Exception) -> str:
+        import anthropic
+        if isinstance(error, anthropic.APITimeoutError):
+            return "timeout"
+        if isinstance(error, anthropic.APIConnectionError):
+            return "connection"
+        if isinstance(error, anthropic.APIStatusError):
+            return str(error.status_code)
+        return type(error).__name__
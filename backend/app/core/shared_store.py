@@ -0,0 +1,154 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryStore:
+    """Process-local store; correct only with a single worker"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, ttl: float) -> Tuple[int, float]:
+        """Increment a counter, creating it with ``ttl``; returns (count, expires_at)"""
+        now = time.time()
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, 0.0))
+            if expires_at <= now:
+                value, expires_at = 0, now + ttl
+            value += 1
+            self._data[key] = (value, expires_at)
+            self._purge(now)
+            return value, expires_at
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value, expires_at = self._data.get(key, (None, 0.0))
+            return value if expires_at > time.time() else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _purge(self, now: float) -> None:
+        if len(self._data) > 10000:
+            self._data = {k: v for k, v in self._data.items() if v[1] > now}
+
+
+class SQLiteStore:
+    """Host-local store shared by all workers through one SQLite file
+
+    WAL mode lets readers proceed during writes, and each increment is a
+    single upsert, so concurrent workers never lose updates.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key: str, ttl: float) -> Tuple[int, float]:
+        now = time.time()
+        row = self._connection().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?1, '1', ?2) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ?3 THEN '1' ELSE CAST(value AS INTEGER) + 1 END, "
+            "expires_at = CASE WHEN expires_at <= ?3 THEN ?2 ELSE expires_at END "
+            "RETURNING value, expires_at",
+            (key, now + ttl, now)
+        ).fetchone()
+        if int(row[0]) == 1:
+            self._purge(now)
+        return int(row[0]), row[1]
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl)
+        )
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def _purge(self, now: float) -> None:
+        self._connection().execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+
+
+class RedisStore:
+    """Store shared across hosts through Redis"""
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, socket_timeout=1.0, decode_responses=True)
+
+    def incr(self, key: str, ttl: float) -> Tuple[int, float]:
+        pipe = self.client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, int(ttl), nx=True)
+        pipe.pttl(key)
+        count, _, remaining_ms = pipe.execute()
+        return int(count), time.time() + max(remaining_ms, 0) / 1000.0
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.client.set(key, value, ex=int(ttl))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+def create_shared_store(backend: str = None):
+    """Build the configured store: redis, sqlite or memory"""
+    backend = backend or settings.shared_store_backend
+    if backend == "auto":
+        backend = "redis" if settings.redis_url and redis is not None else "sqlite"
+
+    if backend == "redis":
+        if redis is None or not settings.redis_url:
+            logger.warning("⚠️ Redis store requested but unavailable, using SQLite")
+            return SQLiteStore(settings.shared_store_path)
+        return RedisStore(settings.redis_url)
+    if backend == "memory":
+        return MemoryStore()
+    return SQLiteStore(settings.shared_store_path)
+
+
+# Global instance
+shared_store = create_shared_store()
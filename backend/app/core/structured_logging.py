@@ -0,0 +1,224 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.core.metrics import metrics
+
+log_records_dropped = metrics.counter(
+    "log_records_dropped_total", "Log records not written (sampled, rate limited or queue full)")
+
+# Chat request being handled; copied into tasks and executor threads, so every
+# line logged on its behalf carries the same ID as the X-Request-ID header
+request_id_var: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "suppressed"}
+_traceback_formatter = logging.Formatter()
+
+
+def bind_request_id(request_id: Optional[str]) -> contextvars.Token:
+    return request_id_var.set(request_id)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the current request ID"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of sub-WARNING records from chosen loggers
+
+    Rates are per logger-name prefix (the longest match wins). Inside a
+    request the decision is a hash of its ID, so a sampled request keeps
+    all of its lines and an unsampled one none, rather than random halves.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = dict(sorted(rates.items(), key=lambda item: -len(item[0])))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        request_id = getattr(record, "request_id", None) or request_id_var.get()
+        if request_id:
+            keep = zlib.crc32(request_id.encode("utf-8")) % 10000 < rate * 10000
+        else:
+            keep = random.random() < rate
+        if not keep:
+            log_records_dropped.inc(reason="sampled")
+        return keep
+
+    def _rate(self, name: str) -> float:
+        for prefix, rate in self.rates.items():
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger for sub-WARNING records
+
+    Bursts beyond ``per_second`` are dropped; the next record let through
+    reports how many were suppressed in its ``suppressed`` field.
+    """
+
+    def __init__(self, per_second: float, burst: Optional[float] = None):
+        super().__init__()
+        self.per_second = per_second
+        self.burst = burst or max(per_second, 1.0)
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault(record.name, [self.burst, now, 0])
+            tokens, last, suppressed = bucket
+            tokens = min(self.burst, tokens + (now - last) * self.per_second)
+            if tokens < 1.0:
+                bucket[:] = [tokens, now, suppressed + 1]
+                log_records_dropped.inc(reason="rate_limited")
+                return False
+            bucket[:] = [tokens - 1.0, now, 0]
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request ID, extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "suppressed", None):
+            entry["suppressed"] = record.suppressed
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain lines for local development, with the request ID when there is one"""
+
+    def __init__(self):
+        super().__init__("%(levelname)s:%(name)s:%(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if getattr(record, "request_id", None):
+            line = f"[{record.request_id}] {line}"
+        if getattr(record, "suppressed", None):
+            line += f" (+{record.suppressed} suppressed)"
+        return line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread; drops them rather than wait when it falls behind"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc(reason="queue_full")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (arguments and frames may
+        # change later) but leave the rendering to the writer thread
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """``app.tools=0.1,app.core.claude_client=0.5`` -> {prefix: rate}"""
+    rates = {}
+    for item in spec.split(","):
+        name, sep, rate = item.partition("=")
+        if sep and name.strip():
+            try:
+                rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+            except ValueError:
+                continue
+    return rates
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", sample_rates: str = "",
+                  rate_limit: float = 0.0, queue_size: int = 10000) -> None:
+    """Route all logging through a queue to a background writer thread
+
+    Callers only pay for filtering and an enqueue; formatting and the
+    stream write happen off the event loop. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(RequestContextFilter())
+    rates = parse_sample_rates(sample_rates)
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+    if rate_limit > 0:
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if type(handler) is logging.StreamHandler:  # Synchronous console handlers (basicConfig)
+            root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
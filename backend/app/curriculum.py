@@ -0,0 +1,178 @@
+"""Curriculum pre-warm pipeline
+
+Runs the week's syllabus topics through the agent ahead of time: the
+simulations execute, their plots are stored, and each answer is loaded into
+the response cache (served for matching first-turn questions) while the
+sandbox runs land in the execution cache.
+
+    python -m app.curriculum topics.txt --concurrency 3
+    python -m app.curriculum topics.txt --model-client stub   # no API key or network
+
+Topics are one per line (``#`` starts a comment) or a JSON list. Completed
+topics are recorded in the progress file, so an interrupted run resumes
+where it stopped. Stub runs are dry runs: their canned answers are neither
+cached nor recorded as progress.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+
+from app.api.v1.chat import build_chat_response
+from app.core.claude_client import EducationAgent, education_agent
+from app.core.config import settings
+from app.core.structured_logging import setup_logging
+from app.services.plot_store import negotiate_render_options
+from app.services.result_cache import response_cache, response_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class StubModelClient:
+    """Offline stand-in for the model: one plotting tool call, then a summary
+
+    Exercises the whole pipeline (tool loop, sandbox, plot storage, caches)
+    without an API key, e.g. to check a topic list or the deployment.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, hedge: bool = False, **kwargs) -> Message:
+        self.calls += 1
+        messages = kwargs["messages"]
+        topic = messages[0]["content"] if messages else ""
+        if messages[-1]["role"] == "user" and isinstance(messages[-1]["content"], str):
+            content = [
+                TextBlock(type="text", text=f"## {topic}\n\nPre-generated overview."),
+                ToolUseBlock(type="tool_use", id=f"stub_{self.calls}", name="python_execute",
+                             input={"code": self._plot_code(topic), "include_plots": True})
+            ]
+        else:
+            content = [TextBlock(type="text", text="Explore how the parameters change the plot.")]
+        return Message(
+            id=f"msg_stub_{self.calls}", type="message", role="assistant", model=kwargs.get("model", "stub"),
+            content=content, stop_reason="end_turn", stop_sequence=None,
+            usage=Usage(input_tokens=0, output_tokens=0)
+        )
+
+    async def stream(self, on_event, **kwargs) -> Message:
+        return await self.create(**kwargs)
+
+    @staticmethod
+    def _plot_code(topic: str) -> str:
+        return (
+            "x = np.linspace(0, 2 * np.pi, 200)\n"
+            "plt.figure(figsize=(8, 4))\n"
+            "plt.plot(x, np.sin(x))\n"
+            f"plt.title({topic[:60]!r})\n"
+            "plt.show()\n"
+        )
+
+
+def load_topics(path: Path) -> List[str]:
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".json":
+        return [str(topic).strip() for topic in json.loads(text) if str(topic).strip()]
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+
+
+def load_progress(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Last recorded outcome per topic"""
+    progress = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                record = json.loads(line)
+                progress[record["topic"]] = record
+            except (ValueError, KeyError):
+                continue
+    return progress
+
+
+async def prewarm_topic(agent: EducationAgent, topic: str, render_options: Dict[str, Any],
+                        dry_run: bool = False) -> Dict[str, Any]:
+    """Answer one topic and load the answer into the response cache (unless ``dry_run``)"""
+    started = time.perf_counter()
+    response = await agent.process_message(message=topic, render_options=render_options,
+                                           client_id="curriculum")
+    record = {"topic": topic, "seconds": round(time.perf_counter() - started, 2)}
+    if not response.get("success"):
+        return dict(record, status="failed", error=response.get("error", "unknown error"))
+
+    final_response = build_chat_response(response)
+    if not dry_run:
+        await asyncio.to_thread(response_cache.put, response_cache_key(topic, render_options), final_response)
+    return dict(record, status="ok", plots=len(final_response["plots"]))
+
+
+async def run_pipeline(topics: List[str], agent: EducationAgent, progress_path: Path,
+                       concurrency: int = 3, plot_format: str = None, force: bool = False,
+                       dry_run: bool = False) -> Dict[str, int]:
+    """Pre-warm every topic not yet done, at most ``concurrency`` at a time
+
+    A ``dry_run`` exercises the pipeline without caching answers or
+    recording progress, so canned answers never reach users.
+    """
+    done = {topic for topic, record in load_progress(progress_path).items() if record.get("status") == "ok"}
+    pending = [topic for topic in dict.fromkeys(topics) if force or topic not in done]
+    logger.info(f"📚 {len(pending)} topics to pre-warm ({len(topics) - len(pending)} already done)")
+
+    render_options = negotiate_render_options(plot_format=plot_format)
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"ok": 0, "failed": 0, "skipped": len(topics) - len(pending)}
+
+    async def worker(topic: str):
+        async with semaphore:
+            try:
+                record = await prewarm_topic(agent, topic, render_options, dry_run)
+            except Exception as e:
+                record = {"topic": topic, "status": "failed", "error": str(e)}
+        counts[record["status"]] += 1
+        if not dry_run:
+            progress_path.parent.mkdir(parents=True, exist_ok=True)
+            with progress_path.open("a", encoding="utf-8") as progress_file:
+                progress_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        icon = "✅" if record["status"] == "ok" else "❌"
+        logger.info(f"{icon} {topic} ({record.get('seconds', 0)}s)")
+
+    await asyncio.gather(*(worker(topic) for topic in pending))
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-warm response and execution caches for a syllabus")
+    parser.add_argument("topics", type=Path, help="Topic list: one per line, or a JSON list")
+    parser.add_argument("--concurrency", type=int, default=3, help="Topics processed in parallel")
+    parser.add_argument("--progress", type=Path, default=Path("./data/curriculum_progress.jsonl"),
+                        help="Progress file used to resume interrupted runs")
+    parser.add_argument("--model-client", choices=["anthropic", "stub"], default="anthropic",
+                        help="'stub' runs the pipeline offline with a canned model (dry run)")
+    parser.add_argument("--plot-format", default=None, help="Plot format to cache (png/webp/svg)")
+    parser.add_argument("--force", action="store_true", help="Redo topics already completed")
+    args = parser.parse_args(argv)
+    setup_logging(settings.log_level, settings.log_format, settings.log_sample_rates,
+                  settings.log_rate_limit, settings.log_queue_size)
+
+    if not response_cache.enabled:
+        logger.error("❌ RESPONSE_CACHE_TTL is 0; pre-warmed answers would not be served")
+        return 1
+
+    stub = args.model_client == "stub"
+    agent = EducationAgent(upstream=StubModelClient()) if stub else education_agent
+    counts = asyncio.run(run_pipeline(load_topics(args.topics), agent, args.progress,
+                                      concurrency=args.concurrency, plot_format=args.plot_format,
+                                      force=args.force, dry_run=stub))
+    logger.info(f"🏁 Pre-warm finished: {counts['ok']} ok, {counts['failed']} failed, "
+                f"{counts['skipped']} already done")
+    return 0 if counts["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, PlainTextResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import logging
 import os
 from pathlib import Path
+from typing import Optional
 from app.core.config import settings
 from app.api.v1 import chat
+from app.core.cancellation import cancellation_registry
 from app.core.claude_client import education_agent
+from app.core.lifecycle import lifecycle
+from app.core.metrics import metrics
+from app.core.rate_limit import RateLimiter, client_identity
+from app.core.shared_store import shared_store
+from app.core.structured_logging import setup_logging
+from app.services.plot_store import plot_store, etag_matches, PLOT_VARIANTS
+from app.tools.executors.template_renderer import template_renderer
+from app.tools.manager import kernel_executor, python_executor, local_execution_worker
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: structured, off the event loop
+setup_logging(settings.log_level, settings.log_format, settings.log_sample_rates,
+              settings.log_rate_limit, settings.log_queue_size)
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -30,9 +42,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create plots directory if it doesn't exist
-plots_dir = Path("./data/temp")
-plots_dir.mkdir(parents=True, exist_ok=True)
+# Rate limiting shared across all workers
+rate_limiter = RateLimiter(shared_store, settings.rate_limit_requests, settings.rate_limit_window)
+
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    """Limit chat requests per client; only chat turns spend model and sandbox time"""
+    if (settings.rate_limit_enabled and request.method == "POST"
+            and request.url.path.startswith("/api/v1/chat")
+            and not request.url.path.endswith("/cancel")):
+        decision = await asyncio.to_thread(rate_limiter.hit, client_identity(request))
+        if not decision["allowed"]:
+            return Response(
+                content='{"detail":"Rate limit exceeded"}',
+                status_code=429,
+                media_type="application/json",
+                headers={"Retry-After": str(decision["reset"])}
+            )
+        response = await call_next(request)
+        response.headers["X-RateLimit-Remaining"] = str(decision["remaining"])
+        return response
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def lifecycle_middleware(request: Request, call_next):
+    """Refuse new chat turns while draining and count the ones in flight"""
+    if request.method != "POST" or not request.url.path.startswith("/api/v1/chat"):
+        return await call_next(request)
+    if not lifecycle.admitting:
+        # The proxy (or client) retries on a worker that is not shutting down
+        return Response(
+            content='{"detail":"Server is restarting"}',
+            status_code=503,
+            media_type="application/json",
+            headers={"Retry-After": "5", "Connection": "close"}
+        )
+    lifecycle.request_started()
+    try:
+        return await call_next(request)
+    finally:
+        lifecycle.request_finished()
+
 
 # Register routes
 app.include_router(chat.router, prefix="/api/v1")
@@ -50,12 +101,13 @@ async def root():
 async def health_check():
     """Health check"""
     try:
-        # Check Claude API connection
-        api_status = education_agent.validate_api_key()
+        # Claude API status comes from the background probe; a live call
+        # here would block the event loop on every health check
+        api_status = education_agent.api_status
         
         return {
-            "status": "healthy" if api_status else "degraded",
-            "claude_api": "connected" if api_status else "disconnected",
+            "status": "degraded" if api_status is False else "healthy",
+            "claude_api": _api_status_label(api_status),
             "version": settings.app_version
         }
     except Exception as e:
@@ -68,6 +120,19 @@ async def health_check():
             }
         )
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 200 only once warm-up finished and while not draining"""
+    body = {"status": lifecycle.state, "in_flight": lifecycle.in_flight}
+    if not lifecycle.ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus-format service metrics"""
+    return metrics.render()
+
 @app.on_event("startup")
 async def startup_event():
     """Application startup event"""
@@ -75,35 +140,125 @@ async def startup_event():
     logger.info(f"📖 Version: {settings.app_version}")
     logger.info(f"🔧 Debug mode: {settings.debug}")
     
-    # Validate Claude API key
-    if education_agent.validate_api_key():
+    # Warm up in the background; /health answers meanwhile, /ready once warm
+    warm_up_steps = [
+        ("claude_api", _check_claude_api),
+        ("temp_files", lambda: python_executor.purge_temp_files(settings.temp_file_max_age)),
+    ]
+    if settings.execution_backend != "queue":
+        # Boot sandbox processes ahead of the first python_execute call
+        warm_up_steps.append(("sandbox_pool", python_executor.warm_pool.start))
+    if settings.template_fast_path:
+        warm_up_steps.append(("templates", template_renderer.warm_up))
+    if settings.knowledge_search_enabled:
+        warm_up_steps.append(("knowledge_index", _load_knowledge_index))
+    asyncio.create_task(lifecycle.warm_up(warm_up_steps))
+    
+    # Periodically shut down idle session kernels
+    if settings.execution_backend == "kernel":
+        asyncio.create_task(_reap_idle_kernels())
+    
+    # Keep the health endpoints' Claude API status current
+    if settings.claude_probe_interval > 0:
+        asyncio.create_task(_probe_claude_api())
+
+def _check_claude_api():
+    """Validate the Claude API key"""
+    status = education_agent.probe_api()
+    if status:
         logger.info("✅ Claude API connection successful")
-    else:
+    elif status is False:
         logger.warning("⚠️ Claude API connection failed - please check API key")
 
+def _load_knowledge_index():
+    """Import and build the knowledge index (numpy and the embedder load here)"""
+    from app.services.knowledge_base import knowledge_base
+    knowledge_base.ensure_ready()
+
+def _api_status_label(api_status: Optional[bool]) -> str:
+    if api_status is None:
+        return "unknown"
+    return "connected" if api_status else "disconnected"
+
+async def _probe_claude_api():
+    """Background loop re-validating the Claude API key"""
+    while True:
+        await asyncio.sleep(settings.claude_probe_interval)
+        try:
+            await asyncio.to_thread(education_agent.probe_api)
+        except Exception as e:
+            logger.warning(f"Claude API probe failed: {e}")
+
+async def _reap_idle_kernels():
+    """Background loop evicting idle per-session kernels"""
+    while True:
+        await asyncio.sleep(60)
+        try:
+            await asyncio.to_thread(kernel_executor.reap_idle)
+        except Exception as e:
+            logger.warning(f"Kernel reaping failed: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event"""
     logger.info(f"🛑 {settings.app_name} shutting down...")
+    
+    # Let in-flight chats finish, then stop whatever is left
+    if not await lifecycle.drain(settings.drain_timeout):
+        cancelled = cancellation_registry.cancel_all("shutdown")
+        logger.warning(f"🛑 Cancelled {cancelled} chat requests at the drain deadline")
+        await asyncio.sleep(0.5)  # Let cancelled tasks kill their sandbox processes
+    
+    kernel_executor.shutdown_all()
+    python_executor.warm_pool.shutdown()
+    if local_execution_worker is not None:
+        local_execution_worker.stop()
+    python_executor.purge_temp_files(settings.temp_file_max_age)
+    lifecycle.stopped()
+    logger.info("👋 Shutdown complete")
 
 @app.get("/api/plots/{filename}")
-async def serve_plot(filename: str):
-    """Serve generated plot images"""
-    file_path = plots_dir / filename
+async def serve_plot(filename: str, request: Request, size: Optional[str] = None):
+    """Serve generated plot images with long-lived caching
+
+    ``size`` selects a downscaled variant (thumb, medium); omit it for full size.
+    """
+    if size is not None and size not in PLOT_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Invalid size, expected one of: {', '.join(PLOT_VARIANTS)}")
     
-    if not file_path.exists():
+    # Behind X-Accel-Redirect nginx picks precompressed files itself (gzip_static)
+    accept_encoding = "" if settings.plot_accel_redirect_prefix else request.headers.get("accept-encoding", "")
+    plot_file = plot_store.lookup(filename, accept_encoding, size)
+    if plot_file is None:
         raise HTTPException(status_code=404, detail="Plot not found")
     
-    # Security check: ensure file is within plots directory
-    try:
-        file_path.resolve().relative_to(plots_dir.resolve())
-    except ValueError:
-        raise HTTPException(status_code=403, detail="Access denied")
+    # Plot names are UUID-based and never rewritten, so they can be cached forever
+    headers = {
+        "Cache-Control": f"public, max-age={settings.plot_cache_max_age}, immutable",
+        "ETag": plot_file["etag"],
+        "Vary": "Accept-Encoding",
+        # SVGs come from sandboxed code: never run their scripts on our origin
+        "Content-Security-Policy": "sandbox",
+        "X-Content-Type-Options": "nosniff"
+    }
+    
+    if etag_matches(request.headers.get("if-none-match"), plot_file["etag"]):
+        return Response(status_code=304, headers=headers)
+    
+    # Let nginx stream the bytes (it applies gzip_static and ranges itself)
+    if settings.plot_accel_redirect_prefix:
+        headers["X-Accel-Redirect"] = settings.plot_accel_redirect_prefix.rstrip("/") + "/" + plot_file["path"].name
+        return Response(media_type=plot_file["media_type"], headers=headers)
+    
+    if plot_file["encoding"]:
+        headers["Content-Encoding"] = plot_file["encoding"]
     
+    # FileResponse handles Range requests; reuse our stat result
     return FileResponse(
-        path=file_path,
-        media_type="image/png",
-        filename=filename
+        path=plot_file["path"],
+        media_type=plot_file["media_type"],
+        headers=headers,
+        stat_result=plot_file["stat"]
     )
 
 if __name__ == "__main__":
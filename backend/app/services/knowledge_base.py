@@ -0,0 +1,355 @@
+"""Local retrieval over the curated physics/math corpus
+
+Documents are split into sections, embedded offline and stored as a
+memory-mapped float32 matrix next to a JSON manifest, so every worker
+shares one page-cached copy and a query is a single matrix-vector product.
+
+    python -m app.services.knowledge_base            # index changed documents
+    python -m app.services.knowledge_base --rebuild  # re-embed everything
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+knowledge_queries = metrics.histogram(
+    "knowledge_search_seconds", "Latency of knowledge_search queries (embedding + top-k)",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5))
+
+_TOKEN_PATTERN = re.compile(r"\\?[a-z0-9]+")
+_HEADING_PATTERN = re.compile(r"^(#{1,3})\s+(.*)$", re.MULTILINE)
+_MAX_CHUNK_CHARS = 1500
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder: deterministic, dependency-free and offline
+
+    Words, word bigrams and character trigrams are hashed into a fixed
+    number of signed buckets with sublinear term weights. Good enough for
+    keyword-heavy queries against a small curated corpus.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-v1-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts: Dict[int, float] = {}
+            for feature, weight in self._features(text):
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                index = bucket % self.dim
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                counts[index] = counts.get(index, 0.0) + sign * weight
+            for index, value in counts.items():
+                vectors[row, index] = np.sign(value) * (1.0 + np.log(abs(value))) if abs(value) >= 1 else value
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def _features(text: str):
+        words = _TOKEN_PATTERN.findall(text.lower())
+        for word in words:
+            yield "w:" + word, 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i:i + 3], 0.25
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}", 0.5
+
+
+class SentenceTransformerEmbedder:
+    """Dense embeddings from a locally cached sentence-transformers model"""
+
+    def __init__(self, model_name: str, cache_dir: str):
+        self.model = SentenceTransformer(model_name, cache_folder=cache_dir)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st:{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def create_embedder(model_name: str = None):
+    """The configured model if it can be loaded, else the hashing embedder"""
+    model_name = model_name or settings.embedding_model
+    if model_name != "hashing" and SentenceTransformer is not None:
+        try:
+            return SentenceTransformerEmbedder(model_name, settings.knowledge_cache_dir)
+        except Exception as e:
+            logger.warning(f"⚠️ Embedding model {model_name} unavailable, using hashing embedder: {e}")
+    return HashingEmbedder()
+
+
+def chunk_document(path: Path) -> List[Dict[str, str]]:
+    """Split a markdown document into one chunk per section"""
+    text = path.read_text(encoding="utf-8")
+    title_match = _HEADING_PATTERN.search(text)
+    doc_title = title_match.group(2).strip() if title_match and title_match.group(1) == "#" else path.stem
+
+    sections, last_heading, last_end = [], doc_title, 0
+    for match in _HEADING_PATTERN.finditer(text):
+        sections.append((last_heading, text[last_end:match.start()]))
+        last_heading, last_end = match.group(2).strip(), match.end()
+    sections.append((last_heading, text[last_end:]))
+
+    chunks = []
+    for heading, body in sections:
+        body = body.strip()
+        if not body:
+            continue
+        title = doc_title if heading == doc_title else f"{doc_title}: {heading}"
+        for part in _split_long(body):
+            chunks.append({"source": path.name, "title": title, "text": part})
+    return chunks
+
+
+def _split_long(body: str) -> List[str]:
+    if len(body) <= _MAX_CHUNK_CHARS:
+        return [body]
+    parts, current = [], ""
+    for paragraph in body.split("\n\n"):
+        if current and len(current) + len(paragraph) > _MAX_CHUNK_CHARS:
+            parts.append(current.strip())
+            current = ""
+        current += paragraph + "\n\n"
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+class KnowledgeIndex:
+    """Embedded corpus chunks as a memory-mapped float32 matrix
+
+    ``manifest.json`` names the current vector file, which is content
+    addressed: a rebuild writes a new file and then swaps the manifest, so
+    concurrent readers never see a manifest and matrix that disagree.
+    """
+
+    def __init__(self, cache_dir: str, embedder, ann_threshold: int = 50000):
+        self.cache_dir = Path(cache_dir)
+        self.embedder = embedder
+        self.ann_threshold = ann_threshold
+        self.chunks: List[Dict[str, Any]] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.ann = None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.cache_dir / "manifest.json"
+
+    def build(self, corpus_dir: str, rebuild: bool = False) -> Dict[str, int]:
+        """Index the corpus, re-embedding only chunks whose text changed"""
+        chunks = []
+        for path in sorted(Path(corpus_dir).glob("*.md")):
+            chunks.extend(chunk_document(path))
+        for chunk in chunks:
+            chunk["hash"] = hashlib.sha256(
+                f"{chunk['title']}\n{chunk['text']}".encode("utf-8")).hexdigest()[:16]
+
+        digest = hashlib.sha256(
+            (self.embedder.name + "".join(c["hash"] for c in chunks)).encode("utf-8")).hexdigest()[:16]
+        manifest = self._read_manifest()
+        if not rebuild and manifest and manifest.get("digest") == digest:
+            return {"chunks": len(chunks), "embedded": 0}
+
+        # Reuse vectors of unchanged chunks from the previous index
+        previous: Dict[str, np.ndarray] = {}
+        if not rebuild and manifest and manifest.get("embedder") == self.embedder.name:
+            old_vectors = self._open_vectors(manifest)
+            if old_vectors is not None:
+                previous = {c["hash"]: old_vectors[i] for i, c in enumerate(manifest["chunks"])}
+
+        missing = [c for c in chunks if c["hash"] not in previous]
+        if missing:
+            embedded = self.embedder.embed([f"{c['title']}\n{c['text']}" for c in missing])
+            previous.update({c["hash"]: embedded[i] for i, c in enumerate(missing)})
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        vector_file = f"vectors-{digest}.f32"
+        temp_vectors = self._temp_path(vector_file)
+        matrix = np.memmap(temp_vectors, dtype=np.float32, mode="w+",
+                           shape=(max(len(chunks), 1), self.embedder.dim))
+        for i, chunk in enumerate(chunks):
+            matrix[i] = previous[chunk["hash"]]
+        matrix.flush()
+        del matrix
+        os.replace(temp_vectors, self.cache_dir / vector_file)
+
+        new_manifest = {
+            "embedder": self.embedder.name,
+            "dim": self.embedder.dim,
+            "digest": digest,
+            "vectors": vector_file,
+            "chunks": chunks,
+            "built_at": time.time()
+        }
+        if hnswlib is not None and len(chunks) >= self.ann_threshold:
+            new_manifest["ann"] = self._build_ann(chunks, vector_file, digest)
+
+        temp_manifest = self._temp_path(self.manifest_path.name)
+        temp_manifest.write_text(json.dumps(new_manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_manifest, self.manifest_path)
+        self._remove_stale(new_manifest)
+        logger.info(f"📚 Indexed {len(chunks)} knowledge chunks ({len(missing)} embedded)")
+        return {"chunks": len(chunks), "embedded": len(missing)}
+
+    def load(self) -> bool:
+        manifest = self._read_manifest()
+        if not manifest or manifest.get("embedder") != self.embedder.name:
+            return False
+        vectors = self._open_vectors(manifest)
+        if vectors is None:
+            return False
+        self.chunks, self.vectors = manifest["chunks"], vectors
+        self.ann = None
+        if manifest.get("ann") and hnswlib is not None:
+            self.ann = hnswlib.Index(space="ip", dim=manifest["dim"])
+            self.ann.load_index(str(self.cache_dir / manifest["ann"]))
+            self.ann.set_ef(64)
+        return True
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        if self.vectors is None or not self.chunks:
+            return []
+        query_vector = self.embedder.embed([query])[0]
+        top_k = max(1, min(top_k, len(self.chunks)))
+        if self.ann is not None:
+            labels, distances = self.ann.knn_query(query_vector, k=top_k)
+            ranked = list(zip(labels[0], 1.0 - distances[0]))
+        else:
+            scores = self.vectors @ query_vector
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            ranked = [(i, scores[i]) for i in best[np.argsort(-scores[best])]]
+        return [
+            {
+                "title": self.chunks[i]["title"],
+                "source": self.chunks[i]["source"],
+                "score": round(float(score), 4),
+                "text": self.chunks[i]["text"]
+            }
+            for i, score in ranked
+        ]
+
+    def _build_ann(self, chunks: List[Dict[str, Any]], vector_file: str, digest: str) -> str:
+        vectors = np.memmap(self.cache_dir / vector_file, dtype=np.float32, mode="r",
+                            shape=(len(chunks), self.embedder.dim))
+        index = hnswlib.Index(space="ip", dim=self.embedder.dim)
+        index.init_index(max_elements=len(chunks), ef_construction=200, M=16)
+        index.add_items(vectors, np.arange(len(chunks)))
+        ann_file = f"ann-{digest}.hnsw"
+        temp_ann = self._temp_path(ann_file)
+        index.save_index(str(temp_ann))
+        os.replace(temp_ann, self.cache_dir / ann_file)
+        return ann_file
+
+    def _temp_path(self, name: str) -> Path:
+        """Unique temp file for ``name``; every worker builds at startup, so
+        fixed temp names would let one replace another's half-written file"""
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=f"{name}.", suffix=".tmp",
+                                         delete=False) as f:
+            return Path(f.name)
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _open_vectors(self, manifest: Dict[str, Any]) -> Optional[np.ndarray]:
+        path = self.cache_dir / manifest["vectors"]
+        if not path.exists():
+            return None
+        rows = len(manifest["chunks"])
+        vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(max(rows, 1), manifest["dim"]))
+        return vectors[:rows]
+
+    def _remove_stale(self, manifest: Dict[str, Any]) -> None:
+        keep = {manifest["vectors"], manifest.get("ann")}
+        for path in list(self.cache_dir.glob("vectors-*.f32")) + list(self.cache_dir.glob("ann-*.hnsw")):
+            if path.name not in keep:
+                try:
+                    path.unlink()  # Readers that still map it keep their pages
+                except OSError:
+                    pass
+
+
+class KnowledgeBase:
+    """Lazily loaded knowledge index behind the knowledge_search tool"""
+
+    def __init__(self, corpus_dir: str, cache_dir: str):
+        self.corpus_dir = corpus_dir
+        self.cache_dir = cache_dir
+        self.index: Optional[KnowledgeIndex] = None
+        self._lock = threading.Lock()
+
+    def ensure_ready(self) -> KnowledgeIndex:
+        """Load the index, indexing new or changed documents first"""
+        with self._lock:
+            if self.index is None:
+                index = KnowledgeIndex(self.cache_dir, create_embedder(),
+                                       ann_threshold=settings.knowledge_ann_threshold)
+                index.build(self.corpus_dir)
+                index.load()
+                self.index = index
+            return self.index
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        index = self.ensure_ready()
+        started = time.perf_counter()
+        results = index.search(query, top_k)
+        knowledge_queries.observe(time.perf_counter() - started)
+        return results
+
+
+# Global instance
+knowledge_base = KnowledgeBase(settings.knowledge_corpus_dir, settings.knowledge_cache_dir)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the knowledge_search index")
+    parser.add_argument("--corpus", default=settings.knowledge_corpus_dir, help="Directory of markdown documents")
+    parser.add_argument("--rebuild", action="store_true", help="Re-embed every chunk")
+    parser.add_argument("--query", help="Run a test query against the built index")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = KnowledgeIndex(settings.knowledge_cache_dir, create_embedder(),
+                           ann_threshold=settings.knowledge_ann_threshold)
+    stats = index.build(args.corpus, rebuild=args.rebuild)
+    print(f"{stats['chunks']} chunks indexed, {stats['embedded']} embedded with {index.embedder.name}")
+    if args.query and index.load():
+        for hit in index.search(args.query, settings.knowledge_top_k):
+            print(f"{hit['score']:.3f}  {hit['title']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
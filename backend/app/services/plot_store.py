@@ -0,0 +1,255 @@
+import gzip
+import hashlib
+import io
+import logging
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.core.config import settings
+from app.tools.executors.sandbox.channel import MEDIA_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Formats the sandbox can render static figures to
+RENDER_FORMATS = ("png", "webp", "svg")
+
+# Everything an artifact may be stored as (static figures and animations)
+ARTIFACT_FORMATS = RENDER_FORMATS + ("gif", "mp4")
+ARTIFACT_TYPES = ("static", "animation")
+
+# Served names are fully determined by the plot id, so no filesystem
+# resolution is needed to rule out path traversal
+_FILENAME_PATTERN = re.compile(
+    r"^plot_[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.(png|webp|svg|gif|mp4|plotdata)$"
+)
+
+# Formats worth storing precompressed next to the original (text, float arrays)
+COMPRESSIBLE_FORMATS = {"svg", "plotdata"}
+
+# Downscaled variants generated for static raster plots: name -> width in pixels
+PLOT_VARIANTS = {"thumb": 320, "medium": 800}
+VARIANT_FORMATS = {"png", "webp"}
+
+# Precompressed variants in order of preference: (encoding, suffix)
+_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class PlotStore:
+    """Stores rendered plot artifacts received from the execution sandbox
+
+    Artifacts arrive as bytes over the worker channel and are written exactly
+    once, atomically, under UUID-based names that never change afterwards.
+    """
+
+    def __init__(self, plots_dir: str = "./data/temp"):
+        self.plots_dir = Path(plots_dir)
+        self.plots_dir.mkdir(parents=True, exist_ok=True)
+
+    def save(self, data: bytes, fmt: str, plot_type: str = "static",
+             figure_data: Optional[bytes] = None, **extra) -> Dict[str, Any]:
+        """Persist an artifact and return the plot metadata for clients
+        
+        ``figure_data`` is the exported plot data (sandbox plotdata module)
+        the frontend redraws from for zoom and pan; it is served next to
+        the image and linked as ``data_url``. The plot id is always minted
+        here, so an artifact can never replace an existing plot.
+        """
+        if fmt not in ARTIFACT_FORMATS:
+            raise ValueError(f"Unsupported artifact format: {fmt!r}")
+        if plot_type not in ARTIFACT_TYPES:
+            raise ValueError(f"Unsupported artifact type: {plot_type!r}")
+        plot_id = str(uuid.uuid4())
+        filename = f"plot_{plot_id}.{fmt}"
+        target = self.plots_dir / filename
+
+        self._write_atomic(target, data)
+        if settings.plot_precompress and fmt in COMPRESSIBLE_FORMATS:
+            self._write_precompressed(target, data)
+
+        metadata = {
+            "url": f"/api/plots/{filename}",
+            "type": plot_type,
+            "plot_id": plot_id,
+            "format": fmt,
+            "description": "Generated visualization"
+        }
+        metadata.update(extra)
+        if figure_data:
+            data_target = self.plots_dir / f"plot_{plot_id}.plotdata"
+            self._write_atomic(data_target, figure_data)
+            if settings.plot_precompress:
+                self._write_precompressed(data_target, figure_data)
+            metadata["data_url"] = f"/api/plots/{data_target.name}"
+        if settings.plot_variants_enabled and plot_type == "static" and fmt in VARIANT_FORMATS:
+            self.add_variants(metadata, data)
+        return metadata
+
+    def add_variants(self, metadata: Dict[str, Any], data: Optional[bytes] = None) -> Dict[str, Any]:
+        """Write thumbnail/mid-size variants and add srcset-friendly URLs to the metadata"""
+        plot_id = metadata["plot_id"]
+        fmt = metadata.get("format", "png")
+        url = metadata["url"]
+        try:
+            from PIL import Image
+            
+            source = io.BytesIO(data) if data is not None else self.plots_dir / f"plot_{plot_id}.{fmt}"
+            with Image.open(source) as image:
+                image.load()
+                width, height = image.size
+                metadata.setdefault("width", width)
+                metadata.setdefault("height", height)
+                
+                variants = {}
+                srcset = []
+                for name, variant_width in PLOT_VARIANTS.items():
+                    if width <= variant_width:
+                        continue
+                    variant_height = max(1, round(height * variant_width / width))
+                    resized = image.resize((variant_width, variant_height), Image.LANCZOS)
+                    buffer = io.BytesIO()
+                    if fmt == "webp":
+                        resized.save(buffer, format="WEBP", quality=80, method=4)
+                    else:
+                        resized.save(buffer, format="PNG", optimize=True)
+                    self._write_atomic(self.plots_dir / f"plot_{plot_id}_{name}.{fmt}", buffer.getvalue())
+                    variants[name] = f"{url}?size={name}"
+                    srcset.append(f"{variants[name]} {variant_width}w")
+        except Exception as e:
+            logger.warning(f"Failed to create variants for plot {plot_id}: {e}")
+            return metadata
+        
+        if variants:
+            srcset.append(f"{url} {width}w")
+            metadata["variants"] = variants
+            metadata["srcset"] = ", ".join(srcset)
+        return metadata
+
+    def save_artifact(self, artifact: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist an artifact record decoded from the worker channel
+        
+        Records are parsed from sandbox output, which user code controls, so
+        only the payload and validated fields are taken from them; the
+        sandbox's own plot id is discarded.
+        """
+        extra = {key: int(artifact[key]) for key in ("width", "height")
+                 if isinstance(artifact.get(key), (int, float))}
+        return self.save(
+            artifact["data"],
+            artifact.get("format", "png"),
+            plot_type=artifact.get("type", "static"),
+            figure_data=artifact.get("figure_data"),
+            **extra
+        )
+
+    def lookup(self, filename: str, accept_encoding: str = "",
+               size: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Resolve a served filename to its file, stat result and strong ETag
+
+        Only one stat call is made per request for the identity file; a
+        precompressed variant is preferred when the client accepts it. A
+        ``size`` selects a downscaled variant, falling back to the original
+        when the plot was too small to need one.
+        """
+        if not _FILENAME_PATTERN.match(filename):
+            return None
+
+        path = self.plots_dir / filename
+        encoding = None
+        stat_result = None
+        if size in PLOT_VARIANTS:
+            stem, _, ext = filename.rpartition(".")
+            variant_name = f"{stem}_{size}.{ext}"
+            try:
+                stat_result = os.stat(self.plots_dir / variant_name)
+                path = self.plots_dir / variant_name
+                filename = variant_name
+            except OSError:
+                pass
+        if stat_result is None and Path(filename).suffix.lstrip(".") in COMPRESSIBLE_FORMATS and accept_encoding:
+            accepted = {token.split(";")[0].strip() for token in accept_encoding.lower().split(",")}
+            for candidate, suffix in _ENCODINGS:
+                if candidate in accepted:
+                    try:
+                        stat_result = os.stat(f"{path}{suffix}")
+                    except OSError:
+                        continue
+                    path = Path(f"{path}{suffix}")
+                    encoding = candidate
+                    break
+
+        if stat_result is None:
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                return None
+
+        return {
+            "path": path,
+            "stat": stat_result,
+            "etag": self.etag(filename, stat_result, encoding),
+            "media_type": self.media_type(filename),
+            "encoding": encoding
+        }
+
+    @staticmethod
+    def etag(filename: str, stat_result: os.stat_result, encoding: Optional[str] = None) -> str:
+        """Strong ETag; plot files are immutable once written"""
+        key = f"{filename}:{encoding or 'identity'}:{stat_result.st_size}:{stat_result.st_mtime_ns}"
+        return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+    @staticmethod
+    def _write_atomic(target: Path, data: bytes) -> None:
+        temp_path = target.with_name(f".{target.name}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, target)
+
+    def _write_precompressed(self, target: Path, data: bytes) -> None:
+        try:
+            self._write_atomic(Path(f"{target}.gz"), gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._write_atomic(Path(f"{target}.br"), brotli.compress(data, quality=11))
+        except Exception as e:
+            logger.warning(f"Failed to precompress {target.name}: {e}")
+
+    @staticmethod
+    def media_type(filename: str) -> str:
+        """Media type for a stored plot file"""
+        return MEDIA_TYPES.get(Path(filename).suffix.lower().lstrip("."), "application/octet-stream")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against a strong ETag (weak comparison per RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+
+def negotiate_render_options(viewport_width: Optional[int] = None,
+                             device_pixel_ratio: Optional[float] = None,
+                             plot_format: Optional[str] = None) -> Dict[str, Any]:
+    """Derive sandbox render options from the client's viewport and format preference"""
+    fmt = (plot_format or settings.plot_format).lower()
+    if fmt not in RENDER_FORMATS:
+        fmt = settings.plot_format
+
+    options: Dict[str, Any] = {"format": fmt, "dpi": settings.plot_dpi}
+    if viewport_width:
+        ratio = min(max(device_pixel_ratio or 1.0, 1.0), 3.0)
+        options["target_width"] = min(int(viewport_width * ratio), settings.plot_max_width)
+    return options
+
+
+# Global instance
+plot_store = PlotStore()
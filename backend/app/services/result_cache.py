@@ -0,0 +1,84 @@
+import json
+import logging
+import re
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.idempotency import fingerprint
+from app.core.metrics import metrics
+from app.core.shared_store import shared_store
+
+logger = logging.getLogger(__name__)
+
+cache_lookups = metrics.counter(
+    "result_cache_lookups_total", "Response/execution cache lookups by outcome")
+
+
+class ResultCache:
+    """JSON results in the shared store, keyed by a fingerprint of their inputs
+
+    Entries are visible to every worker. A TTL of 0 disables the cache.
+    """
+
+    def __init__(self, store, namespace: str, ttl: int):
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, payload: Any) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        try:
+            value = self.store.get(self._key(payload))
+        except Exception as e:
+            logger.warning(f"{self.namespace} cache lookup failed: {e}")
+            return None
+        cache_lookups.inc(cache=self.namespace, outcome="hit" if value else "miss")
+        return json.loads(value) if value else None
+
+    def put(self, payload: Any, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.store.set(self._key(payload), json.dumps(value, ensure_ascii=False, default=str), self.ttl)
+        except Exception as e:
+            logger.warning(f"{self.namespace} cache write failed: {e}")
+
+    def _key(self, payload: Any) -> str:
+        return f"{self.namespace}:{fingerprint(payload)}"
+
+
+def response_cache_key(message: str, render_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Cache key of a first-turn question: whitespace/case-insensitive, per plot format"""
+    return {
+        "message": " ".join(message.lower().split()),
+        "format": (render_options or {}).get("format") or settings.plot_format
+    }
+
+
+# Code whose output can change between runs: RNGs, clocks, unique ids
+_NONDETERMINISTIC_PATTERN = re.compile(r"\b(random|default_rng|time|datetime|uuid|secrets)\b")
+
+
+def is_deterministic(code: str) -> bool:
+    """Whether replaying a stored result of ``code`` is indistinguishable from running it
+
+    Conservative: any mention of a random, clock or id source opts out.
+    """
+    return _NONDETERMINISTIC_PATTERN.search(code) is None
+
+
+def execution_cache_key(code: str, include_plots: bool,
+                        render_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {"code": code, "include_plots": include_plots, "render_options": render_options or {}}
+
+
+# Global instances
+# First-turn chat responses, filled by the curriculum pre-warm pipeline
+response_cache = ResultCache(shared_store, "response", settings.response_cache_ttl)
+# Successful stateless sandbox runs of deterministic code, by exact code and render options
+execution_cache = ResultCache(shared_store, "execution", settings.execution_cache_ttl)
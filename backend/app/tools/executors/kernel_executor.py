@@ -0,0 +1,228 @@
+import importlib.util
+import logging
+import re
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from app.core.cancellation import is_cancelled, on_cancel
+from app.core.config import settings
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.sandbox.channel import new_nonce
+
+logger = logging.getLogger(__name__)
+
+# jupyter_client is imported when the first session kernel starts
+JUPYTER_AVAILABLE = importlib.util.find_spec("jupyter_client") is not None
+
+# Kernel tracebacks are colorized for terminals
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+class KernelSession:
+    """A live Jupyter kernel bound to one conversation session"""
+
+    def __init__(self, session_id: str, manager, client, channel_nonce: str):
+        self.session_id = session_id
+        self.channel_nonce = channel_nonce
+        self.manager = manager
+        self.client = client
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return getattr(self.manager.provisioner, "pid", None)
+
+    def memory_mb(self) -> float:
+        """Resident memory of the kernel process in MB (0 when unknown)"""
+        pid = self.pid
+        if not pid:
+            return 0.0
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                resident_pages = int(f.read().split()[1])
+            return resident_pages * 4096 / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            return 0.0
+
+    def shutdown(self) -> None:
+        try:
+            self.client.stop_channels()
+            self.manager.shutdown_kernel(now=True)
+        except Exception as e:
+            logger.warning(f"Failed to shut down kernel for session {self.session_id}: {e}")
+
+
+class KernelExecutor:
+    """Executes code in persistent per-session Jupyter kernels
+
+    Each conversation keeps its own kernel, started with the scientific
+    preamble already loaded, so variables computed in earlier turns are
+    reused. Idle kernels are evicted by TTL, and the least recently used
+    kernel is evicted when the live-kernel or memory caps are exceeded.
+    """
+
+    def __init__(self, executor: PythonExecutor,
+                 max_sessions: int = 8,
+                 idle_ttl: int = 900,
+                 max_memory_mb: int = 4096):
+        self.executor = executor
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_memory_mb = max_memory_mb
+        self.sessions: "OrderedDict[str, KernelSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Held while a session's kernel starts, so concurrent first requests share it
+        self._starting: Dict[str, threading.Lock] = {}
+
+    @property
+    def available(self) -> bool:
+        return JUPYTER_AVAILABLE
+
+    def execute_code(self, code: str, session_id: str, include_plots: bool = True,
+                     timeout: int = 60, user_intent: str = "",
+                     model_info: Dict[str, str] = None,
+                     render_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Execute code in the session's kernel, starting one if needed"""
+        safety_result = self.executor._safety_check(code)
+        if not safety_result["safe"]:
+            return self.executor._rejection(safety_result)
+
+        try:
+            session = self._get_session(session_id)
+        except Exception as e:
+            logger.error(f"Failed to start kernel for session {session_id}: {e}")
+            return {"success": False, "error": f"Kernel startup failed: {e}", "output": "", "plots": []}
+
+        job = self.executor._build_job(code, render_options, channel_stream="stdout")
+        with session.lock:
+            # Interrupting keeps the session's variables, unlike killing
+            with on_cancel(session.manager.interrupt_kernel):
+                result = self._run(session, job, timeout)
+            session.last_used = time.monotonic()
+        if is_cancelled():
+            return self.executor._cancelled()
+
+        response = self.executor._process_result(result, include_plots, session.channel_nonce)
+        response["session_id"] = session_id
+        self._enforce_limits()
+        return response
+
+    def reap_idle(self) -> int:
+        """Shut down kernels idle for longer than the TTL; returns how many"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [sid for sid, s in self.sessions.items() if now - s.last_used > self.idle_ttl]
+            victims = [self.sessions.pop(sid) for sid in expired]
+        for session in victims:
+            logger.info(f"🧹 Evicting idle kernel for session {session.session_id}")
+            session.shutdown()
+        return len(victims)
+
+    def shutdown_all(self) -> None:
+        with self._lock:
+            victims = list(self.sessions.values())
+            self.sessions.clear()
+        for session in victims:
+            session.shutdown()
+
+    def _get_session(self, session_id: str) -> KernelSession:
+        self.reap_idle()
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+                return session
+            start_lock = self._starting.setdefault(session_id, threading.Lock())
+
+        with start_lock:
+            # Another request may have started the kernel while we waited
+            with self._lock:
+                session = self.sessions.get(session_id)
+                if session is not None:
+                    self.sessions.move_to_end(session_id)
+                    return session
+
+            # Make room before paying for a new kernel
+            self._evict_until(lambda: len(self.sessions) < self.max_sessions)
+            session = self._start_session(session_id)
+            with self._lock:
+                self.sessions[session_id] = session
+                self._starting.pop(session_id, None)
+        return session
+
+    def _start_session(self, session_id: str) -> KernelSession:
+        logger.info(f"🚀 Starting {settings.jupyter_kernel} kernel for session {session_id}")
+        from jupyter_client import KernelManager
+        manager = KernelManager(kernel_name=settings.jupyter_kernel)
+        nonce = new_nonce()
+        manager.start_kernel(cwd=str(self.executor.output_dir),
+                             env=self.executor._get_safe_environment(nonce))
+        client = manager.client()
+        client.start_channels()
+        session = KernelSession(session_id, manager, client, nonce)
+        try:
+            client.wait_for_ready(timeout=settings.jupyter_timeout)
+            preamble = self._run(session, self.executor._build_preamble(capture_output=False),
+                                 settings.jupyter_timeout)
+            if preamble.returncode != 0:
+                raise RuntimeError(preamble.stderr[-500:])
+        except Exception:
+            session.shutdown()
+            raise
+        return session
+
+    def _run(self, session: KernelSession, code: str, timeout: int) -> subprocess.CompletedProcess:
+        """Run code and collect iopub output into a CompletedProcess-like result"""
+        stdout, stderr = [], []
+
+        def output_hook(msg):
+            msg_type = msg["header"]["msg_type"]
+            content = msg["content"]
+            if msg_type == "stream":
+                (stdout if content["name"] == "stdout" else stderr).append(content["text"])
+            elif msg_type == "error":
+                stderr.append(_ANSI_ESCAPE.sub("", "\n".join(content["traceback"])))
+
+        try:
+            reply = session.client.execute_interactive(
+                code, timeout=timeout, output_hook=output_hook,
+                store_history=False, allow_stdin=False,
+                # A failed turn must not abort the next queued request
+                stop_on_error=False
+            )
+            returncode = 0 if reply["content"]["status"] == "ok" else 1
+        except TimeoutError:
+            # Stop the runaway cell but keep the session's state
+            session.manager.interrupt_kernel()
+            stderr.append(f"Code execution timeout ({timeout} seconds)")
+            returncode = 1
+
+        return subprocess.CompletedProcess(
+            args=["kernel", session.session_id], returncode=returncode,
+            stdout="".join(stdout), stderr="".join(stderr)
+        )
+
+    def _enforce_limits(self) -> None:
+        """Evict least recently used kernels while total memory exceeds the cap"""
+        self._evict_until(
+            lambda: sum(s.memory_mb() for s in self.sessions.values()) <= self.max_memory_mb
+            or len(self.sessions) <= 1
+        )
+
+    def _evict_until(self, satisfied) -> None:
+        while True:
+            with self._lock:
+                if satisfied():
+                    return
+                # Never pull a kernel out from under a running execution
+                idle = [sid for sid, s in self.sessions.items() if not s.lock.locked()]
+                if not idle:
+                    return
+                session_id = idle[0]
+                session = self.sessions.pop(session_id)
+            logger.info(f"🧹 Evicting least recently used kernel for session {session_id}")
+            session.shutdown()
@@ -1,12 +1,23 @@
 import subprocess
 import tempfile
 import os
+import py_compile
+import secrets
 import base64
 import json
+import time
 import uuid
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 import logging
+from app.core.cancellation import is_cancelled, on_cancel
+from app.core.config import settings
+from app.services.plot_store import plot_store
+from app.tools.executors.sandbox import symcache
+from app.tools.executors.sandbox.channel import NONCE_ENV, new_nonce, parse_artifacts
+from app.tools.executors.sandbox.profiler import parse_profile
+from app.tools.executors.validator import CodeValidator
+from app.tools.executors.warm_pool import WarmPool
 
 logger = logging.getLogger(__name__)
 
@@ -20,33 +31,51 @@ class PythonExecutor:
     def __init__(self, output_dir: str = "./data/temp"):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.plot_store = plot_store
+        
+        # Directory holding the `sandbox` runtime helper package
+        self.runtime_dir = Path(__file__).resolve().parent
         
         # Allowed imports for educational purposes
         self.allowed_imports = {
             'numpy', 'np', 'matplotlib', 'plt', 'scipy', 'sympy', 'sp',
             'pandas', 'pd', 'math', 'cmath', 'random', 'statistics',
             'collections', 'itertools', 'functools', 'operator',
-            'json', 'csv', 'base64', 'io', 'pathlib', 'time', 'datetime',
+            'json', 'csv', 'base64', 'io', 'time', 'datetime',
             'fractions', 'decimal', 'copy', 'pickle', 're', 'string',
             'typing', 'dataclasses', 'enum', 'warnings', 'traceback',
-            'imageio'  # For GIF creation if needed
+            'imageio',  # For GIF creation if needed
+            'mpl_toolkits', 'seaborn', 'uuid', 'abc', 'numbers', 'bisect',
+            'heapq', 'textwrap'
         }
         
-        # Security restrictions
+        # Security restrictions: builtins that must not be referenced at all
         self.forbidden_functions = {
             'exec', 'eval', 'compile', '__import__', 'reload', 'execfile', 
-            'exit', 'quit', 'subprocess', 'os.system', 'os.popen'
+            'exit', 'quit', 'open', 'file', 'input', 'raw_input',
+            'globals', 'locals', 'vars', 'breakpoint', '__builtins__'
         }
         
-        self.dangerous_patterns = [
-            'import os', 'from os import', 'import subprocess', 
-            'from subprocess import', '__builtins__', 'globals()', 'locals()',
-            'open(', 'file(', 'input(', 'raw_input('
-        ]
+        # Single-pass AST validation, cached by code hash
+        self.validator = CodeValidator(self.allowed_imports, self.forbidden_functions)
+        
+        # Compiled scripts, reused for repeated submissions
+        self.code_cache_dir = Path(settings.code_cache_dir).resolve()
+        self.code_cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Pre-started sandbox processes (inactive until start() is called)
+        self.warm_pool = WarmPool(self, settings.sandbox_warm_pool_size)
+        
+        # Sandboxes only read the SymPy cache; results they report are written
+        # here, and only when they carry this token (printed lines can't)
+        self.sympy_cache_path = Path(settings.sympy_cache_path).resolve()
+        self._symcache_token = secrets.token_hex(16)
     
     def execute_code(self, code: str, include_plots: bool = True, 
                     timeout: int = 60, user_intent: str = "", 
-                    model_info: Dict[str, str] = None) -> Dict[str, Any]:
+                    model_info: Dict[str, str] = None,
+                    render_options: Optional[Dict[str, Any]] = None,
+                    worker=None, profile: bool = False) -> Dict[str, Any]:
         """
         Execute Python code and return results
         
@@ -56,70 +85,76 @@ class PythonExecutor:
             timeout: Execution timeout in seconds
             user_intent: User's original message for context
             model_info: Information about the models being used
+            render_options: Plot format/DPI negotiated for the client
+            worker: Warm sandbox worker reserved for this execution
+            profile: Run under the sampling profiler and attach its report
         """
         # Log model information for analysis
         if model_info:
-            logger.info(f"🤖 Agent Model: {model_info.get('agent_model', 'unknown')}")
-            logger.info(f"🔧 Tool Model: {model_info.get('tool_model', 'python_executor')}")
-            logger.info(f"📝 User Intent: {user_intent[:100]}...")
+            logger.debug(f"🤖 Agent Model: {model_info.get('agent_model', 'unknown')}, "
+                         f"Tool Model: {model_info.get('tool_model', 'python_executor')}")
         
         try:
-            # Safety check
+            # Safety check (no process is spawned for rejected code)
             safety_result = self._safety_check(code)
             if not safety_result["safe"]:
-                return {
-                    "success": False,
-                    "error": f"Code contains unsafe operations: {safety_result['reason']}",
-                    "output": "",
-                    "plots": []
-                }
+                if worker is not None:
+                    self.warm_pool.release(worker)
+                return self._rejection(safety_result)
             
-            # Let the AI model decide on visualization approach
-            # We only provide gentle guidance, not hardcoded fixes
-            enhanced_code = self._prepare_enhanced_code(code, include_plots)
+            profile_timeout = timeout if profile else None
+            worker = worker or self.warm_pool.acquire()
+            if worker is not None:
+                # Pre-started process: the preamble is already loaded
+                nonce = worker.channel_nonce
+                with on_cancel(worker.kill):
+                    job = self._build_job(code, render_options, profile_timeout=profile_timeout)
+                    result = self.warm_pool.run(job, timeout, worker)
+            else:
+                # Let the AI model decide on visualization approach
+                # We only provide gentle guidance, not hardcoded fixes
+                enhanced_code = self._prepare_enhanced_code(code, include_plots, render_options,
+                                                            profile_timeout)
+                
+                # Execute code
+                nonce = new_nonce()
+                result = self._run_script(self._materialize_script(enhanced_code), timeout, nonce)
             
-            # Execute code
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', 
-                                           delete=False, encoding='utf-8') as f:
-                f.write(enhanced_code)
-                temp_file = f.name
+            # The request was abandoned and its process killed
+            if is_cancelled():
+                return self._cancelled()
             
-            try:
-                result = subprocess.run(
-                    ['python', temp_file],
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout,
-                    cwd=self.output_dir,
-                    env=self._get_safe_environment()
-                )
-                
-                # Process execution results
-                execution_result = self._process_result(result, include_plots)
-                
-                # If execution failed, try minimal, general fixes only
-                if not execution_result.get("success", False) and result.stderr:
-                    logger.info("Code execution failed, attempting minimal general fixes...")
-                    fixed_result = self._attempt_minimal_fixes(code, result.stderr, include_plots)
-                    if fixed_result.get("success", False):
-                        logger.info("Minimal fixes successful!")
-                        return fixed_result
-                
+            # Process execution results
+            execution_result = self._process_result(result, include_plots, nonce)
+            
+            # The profiler stopped the code just before the timeout
+            if execution_result.get("profile", {}).get("timed_out"):
+                execution_result["error"] = f"Code execution timeout ({timeout} seconds)"
                 return execution_result
+            
+            # If execution failed, try minimal, general fixes only
+            if not execution_result.get("success", False) and result.stderr:
+                logger.info("Code execution failed, attempting minimal general fixes...")
+                fixed_result = self._attempt_minimal_fixes(code, result.stderr, include_plots,
+                                                           render_options)
+                if fixed_result.get("success", False):
+                    logger.info("Minimal fixes successful!")
+                    return fixed_result
+            
+            return execution_result
                 
-            finally:
-                try:
-                    os.unlink(temp_file)
-                except:
-                    pass
-                
-        except subprocess.TimeoutExpired:
-            return {
+        except subprocess.TimeoutExpired as e:
+            timeout_result = {
                 "success": False,
-                "error": f"Code execution timeout ({timeout} seconds)",
+                "error": f"Code execution timeout ({e.timeout} seconds)",
                 "output": "",
                 "plots": []
             }
+            # A profiled run reports its hotspots before the process is killed
+            _, profile_report = parse_profile(e.output or "") if profile else (None, None)
+            if profile_report:
+                timeout_result["profile"] = profile_report
+            return timeout_result
         except Exception as e:
             logger.error(f"Code execution failed: {e}")
             return {
@@ -130,22 +165,127 @@ class PythonExecutor:
             }
     
     def _safety_check(self, code: str) -> Dict[str, Any]:
-        """Basic safety check for code"""
-        for forbidden in self.forbidden_functions:
-            if forbidden in code:
-                return {"safe": False, "reason": f"Contains forbidden function: {forbidden}"}
+        """AST-based safety and syntax check for code"""
+        return self.validator.validate(code)
+    
+    @staticmethod
+    def _rejection(safety_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Tool result for code rejected before execution"""
+        if safety_result.get("syntax_error"):
+            error = safety_result["reason"]
+        else:
+            error = f"Code contains unsafe operations: {safety_result['reason']}"
+        return {
+            "success": False,
+            "error": error,
+            "output": "",
+            "plots": []
+        }
+    
+    @staticmethod
+    def _cancelled() -> Dict[str, Any]:
+        """Tool result for an execution stopped because its request was cancelled"""
+        return {
+            "success": False,
+            "error": "Code execution cancelled",
+            "output": "",
+            "plots": []
+        }
+    
+    def _run_script(self, script: Path, timeout: float, nonce: str) -> subprocess.CompletedProcess:
+        """Run a sandbox script like subprocess.run, killing it if the request is cancelled
+
+        ``nonce`` authenticates the script's channel records (see parse_artifacts).
+        """
+        with subprocess.Popen(
+            ['python', str(script)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=self.output_dir,
+            env=self._get_safe_environment(nonce)
+        ) as process:
+            with on_cancel(process.kill):
+                try:
+                    stdout, stderr = process.communicate(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    stdout, stderr = process.communicate()
+                    raise subprocess.TimeoutExpired(process.args, timeout, output=stdout, stderr=stderr)
+            return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+    
+    def _materialize_script(self, enhanced_code: str) -> Path:
+        """Write and byte-compile a script once per distinct code hash
+        
+        Repeated submissions reuse the cached bytecode; the source is kept
+        next to it so tracebacks still show the offending lines.
+        """
+        key = self.validator.code_hash(enhanced_code)
+        source_path = self.code_cache_dir / f"{key}.py"
+        bytecode_path = self.code_cache_dir / f"{key}.pyc"
+        
+        if bytecode_path.exists():
+            os.utime(bytecode_path)  # Keep recently used entries on pruning
+            return bytecode_path
         
-        for pattern in self.dangerous_patterns:
-            if pattern in code:
-                return {"safe": False, "reason": f"Contains dangerous pattern: {pattern}"}
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', dir=self.code_cache_dir,
+                                         delete=False, encoding='utf-8') as f:
+            f.write(enhanced_code)
+            temp_file = f.name
+        os.replace(temp_file, source_path)
         
-        if 'open(' in code and not any(safe in code for safe in ['StringIO', 'BytesIO']):
-            return {"safe": False, "reason": "File operations not allowed"}
+        try:
+            py_compile.compile(
+                str(source_path), cfile=str(bytecode_path), doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+            )
+        except py_compile.PyCompileError as e:
+            logger.warning(f"Bytecode compilation failed, running source: {e}")
+            return source_path
+        
+        self._prune_code_cache()
+        return bytecode_path
+    
+    def purge_temp_files(self, max_age: float) -> int:
+        """Delete sandbox leftovers older than ``max_age`` seconds; returns how many
         
-        return {"safe": True, "reason": "Code passed safety checks"}
+        Age-based, since sibling workers share the directories and may have
+        jobs running right now. Stored plots share the output directory by
+        default and are kept: their URLs stay in conversation histories.
+        """
+        cutoff = time.time() - max_age
+        plots_dir = Path(self.plot_store.plots_dir).resolve() if hasattr(self.plot_store, "plots_dir") else None
+        candidates = [
+            p for p in self.output_dir.rglob("*")
+            if p.is_file() and not (p.name.startswith("plot_") and p.parent.resolve() == plots_dir)
+        ]
+        # Interrupted writes of the compiled-script cache
+        candidates += list(self.code_cache_dir.glob("tmp*.py"))
+        removed = 0
+        for path in candidates:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"🧹 Purged {removed} stale sandbox temp files")
+        return removed
+    
+    def _prune_code_cache(self) -> None:
+        """Drop the least recently used compiled scripts beyond the cache size"""
+        entries = sorted(self.code_cache_dir.glob("*.pyc"), key=lambda p: p.stat().st_mtime)
+        for stale in entries[:max(0, len(entries) - settings.code_cache_size)]:
+            for path in (stale, stale.with_suffix(".py")):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
     
     def _attempt_minimal_fixes(self, code: str, error_message: str, 
-                              include_plots: bool) -> Dict[str, Any]:
+                              include_plots: bool,
+                              render_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Apply only minimal, general fixes - let AI handle specific issues"""
         
         fixed_code = code
@@ -166,45 +306,47 @@ class PythonExecutor:
         # Try executing the minimally fixed code
         if fixed_code != code:
             try:
-                enhanced_code = self._prepare_enhanced_code(fixed_code, include_plots)
+                enhanced_code = self._prepare_enhanced_code(fixed_code, include_plots, render_options)
                 
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.py', 
-                                               delete=False, encoding='utf-8') as f:
-                    f.write(enhanced_code)
-                    temp_file = f.name
+                nonce = new_nonce()
+                result = self._run_script(self._materialize_script(enhanced_code), 60, nonce)
+                if is_cancelled():
+                    return self._cancelled()
                 
-                try:
-                    result = subprocess.run(
-                        ['python', temp_file],
-                        capture_output=True,
-                        text=True,
-                        timeout=60,
-                        cwd=self.output_dir,
-                        env=self._get_safe_environment()
-                    )
-                    
-                    return self._process_result(result, include_plots)
-                    
-                finally:
-                    try:
-                        os.unlink(temp_file)
-                    except:
-                        pass
+                return self._process_result(result, include_plots, nonce)
                         
             except Exception as e:
                 logger.error(f"Minimal fix attempt failed: {e}")
         
         return {"success": False, "error": "Could not apply minimal fixes"}
     
-    def _get_safe_environment(self) -> Dict[str, str]:
+    def _get_safe_environment(self, channel_nonce: str) -> Dict[str, str]:
         """Get safe environment variables"""
         env = os.environ.copy()
         # Fix Unicode encoding issues on Windows
         env['PYTHONIOENCODING'] = 'utf-8'
+        env[NONCE_ENV] = channel_nonce
         return env
     
-    def _prepare_enhanced_code(self, code: str, include_plots: bool) -> str:
+    def _prepare_enhanced_code(self, code: str, include_plots: bool,
+                               render_options: Optional[Dict[str, Any]] = None,
+                               profile_timeout: Optional[float] = None) -> str:
         """Prepare enhanced code with comprehensive scientific libraries but no hardcoded logic"""
+        return self._build_preamble() + self._build_job(code, render_options,
+                                                        profile_timeout=profile_timeout)
+    
+    def _build_preamble(self, capture_output: bool = True) -> str:
+        """Scientific environment setup shared by every execution backend
+        
+        Persistent kernels run this once per session and skip the stdout
+        redirection, since the kernel already forwards output over iopub.
+        """
+        runtime_code = f"""
+from time import perf_counter as _perf_counter
+_job_started = _perf_counter()  # Reset by warm workers when the job arrives
+import sys
+sys.path.insert(0, {str(self.runtime_dir)!r})
+"""
         
         setup_code = """
 import sys
@@ -247,6 +389,10 @@ except ImportError:
 # SymPy for symbolic mathematics
 try:
     import sympy as sp
+    # integrate/solve/simplify/dsolve results are memoized across executions
+    from sandbox import symcache as _symcache
+    _symcache.install(sp)
+    del _symcache
     from sympy import symbols, diff, integrate as sp_integrate, solve, simplify
     from sympy import sin, cos, tan, exp, log, sqrt, pi, E, oo, I
     from sympy.physics import units
@@ -273,6 +419,10 @@ try:
 except ImportError:
     print("ImageIO not available - animations may be limited")
 
+# Fast animation capture: frames come straight from the Agg buffer
+from sandbox.animation import capture_frame, save_animation, pending_animation, install_hooks
+install_hooks(imageio if 'imageio' in globals() else None)
+
 # Clean matplotlib configuration
 plt.rcParams['figure.figsize'] = (12, 8)
 plt.rcParams['figure.dpi'] = 100
@@ -294,6 +444,9 @@ try:
 except ImportError:
     pass
 
+# Vectorized integrators, field grids and parameter sweeps (no import needed)
+from sandbox import simkit
+
 # Physics/Math constants (commonly used)
 g = 9.81  # gravitational acceleration (m/s²)
 c = 299792458  # speed of light (m/s)
@@ -303,34 +456,29 @@ e = 1.602176634e-19  # elementary charge (C)
 m_e = 9.1093837015e-31  # electron mass (kg)
 m_p = 1.67262192369e-27  # proton mass (kg)
 
-# Plot saving function
-def save_plot_as_base64(fig=None, filename=None, dpi=150):
+# Plot saving function: one render pass into memory, returned over the worker channel
+from sandbox.rendering import render_figure
+from sandbox import downsample as _downsample
+from sandbox import plotdata as _plotdata
+
+def set_plot_downsampling(enabled=True, method=None):
+    # Large series are thinned to the output resolution before rendering;
+    # method is "minmax" (exact envelope) or "lttb"
+    _downsample.configure(enabled=enabled, method=method)
+
+def set_plot_data_export(enabled=True, max_points=None):
+    # Line/scatter/heatmap data is sent with static plots for zooming in the browser
+    _plotdata.configure(enabled=enabled, max_points=max_points)
+
+def save_plot_as_base64(fig=None, filename=None, dpi=None):
+    # `filename` is kept for compatibility with older generated code
     if fig is None:
         fig = plt.gcf()
     
     fig.tight_layout()
     
-    # Save to server instead of returning base64
-    plot_id = str(uuid.uuid4())
-    filepath = f"plot_{plot_id}.png"
-    
-    # Save plot to the output directory
-    fig.savefig(filepath, format='png', dpi=dpi, bbox_inches='tight', 
-                facecolor='white', edgecolor='none')
-    
-    # Return plot metadata instead of base64
-    plot_info = {
-        "plot_id": plot_id,
-        "filename": filepath,
-        "url": f"/api/plots/{filepath}",
-        "type": "static"
-    }
-    
-    if filename:
-        with open(f"{filename}.json", "w") as f:
-            json.dump(plot_info, f)
-    
-    return plot_info
+    # Format and DPI are negotiated per request unless dpi is given explicitly
+    return render_figure(fig, dpi=dpi)
 
 # Enhanced plt.show() function
 original_show = plt.show
@@ -340,11 +488,17 @@ def custom_show():
     global plot_counter
     plot_counter += 1
     fig = plt.gcf()
-    save_plot_as_base64(fig, f"plot_{plot_counter}")
+    anim = pending_animation(fig)
+    if anim is not None:
+        save_animation(anim)
+    else:
+        save_plot_as_base64(fig, f"plot_{plot_counter}")
     plt.close(fig)
 
 plt.show = custom_show
-
+"""
+        
+        capture_code = """
 # Output capture system
 class OutputCapture:
     def __init__(self):
@@ -361,25 +515,74 @@ class OutputCapture:
 # Redirect output
 output_capture = OutputCapture()
 sys.stdout = output_capture
-
+"""
+        
+        banner_code = """
 print("Educational Python environment ready!")
-print("Available: numpy, matplotlib, scipy, sympy, pandas")
+print("Available: numpy, matplotlib, scipy, sympy, pandas, simkit")
 print("Let your creativity and knowledge guide the implementation!")
 
 """
         
+        if not capture_output:
+            return runtime_code + setup_code
+        return runtime_code + setup_code + capture_code + banner_code
+    
+    def _build_job(self, code: str, render_options: Optional[Dict[str, Any]] = None,
+                   channel_stream: str = "__stdout__",
+                   profile_timeout: Optional[float] = None) -> str:
+        """Per-execution configuration, user code and plot cleanup
+        
+        With ``profile_timeout`` the job runs under the sandbox profiler,
+        which reports and stops the code shortly before that timeout.
+        """
+        
+        # Animation limits and render options come from settings and the request
+        options = {"format": settings.plot_format, "dpi": settings.plot_dpi,
+                   "min_dpi": settings.plot_min_dpi}
+        options.update(render_options or {})
+        # Configured inside a function so the channel and its siblings never
+        # become names user code could call to forge artifacts
+        config_code = f"""
+def _configure_job():
+    from sandbox import channel, rendering, downsample, plotdata, symcache
+    from sandbox.animation import configure as configure_animation
+    channel.configure(mode={settings.plot_render_mode!r}, stream={channel_stream!r})
+    rendering.configure(**{options!r})
+    downsample.configure(enabled={settings.plot_downsample!r}, method={settings.plot_downsample_method!r})
+    plotdata.configure(enabled={settings.plot_data_export!r}, max_points={settings.plot_data_max_points!r})
+    symcache.configure(enabled={settings.sympy_cache_enabled!r}, path={str(self.sympy_cache_path)!r}, token={self._symcache_token!r}, stream={channel_stream!r})
+    configure_animation(max_frames={settings.animation_max_frames}, max_dim={settings.animation_max_dim}, fps={settings.animation_fps}, format={settings.animation_format!r})
+_configure_job()
+del _configure_job
+"""
+        profile_end = ""
+        if profile_timeout:
+            # Leave time for the report to get out before the hard kill
+            deadline = profile_timeout - min(2.0, profile_timeout * 0.1)
+            # User code starts 4 lines below the phase() call (see the separator below)
+            config_code += f"""from sandbox import profiler as _profiler
+_profiler.start(deadline={deadline!r}, job_started=_job_started)
+_profiler.phase("user_code", lines_ahead=4)
+"""
+            profile_end = '_profiler.phase("cleanup")\n'
+        
         # Add user code with clear separation
-        enhanced_code = setup_code + "\n\n# === USER CODE ===\n" + code
+        enhanced_code = config_code + "\n\n# === USER CODE ===\n" + code
         
         # Add cleanup
         end_code = """
 
 # === CLEANUP ===
-# Save any remaining plots
+""" + profile_end + """# Save any remaining plots
 if plt.get_fignums():
     for fig_num in plt.get_fignums():
         fig = plt.figure(fig_num)
-        save_plot_as_base64(fig, f"plot_final_{fig_num}")
+        anim = pending_animation(fig)
+        if anim is not None:
+            save_animation(anim)
+        else:
+            save_plot_as_base64(fig, f"plot_final_{fig_num}")
         plt.close(fig)
 
 print(f"\\nExecution completed! Generated {plot_counter} visualizations.")
@@ -388,17 +591,32 @@ print(f"\\nExecution completed! Generated {plot_counter} visualizations.")
         return enhanced_code + end_code
     
     def _process_result(self, result: subprocess.CompletedProcess, 
-                       include_plots: bool) -> Dict[str, Any]:
-        """Process execution results - optimized for token efficiency"""
+                       include_plots: bool, nonce: str) -> Dict[str, Any]:
+        """Process execution results - optimized for token efficiency
+        
+        ``nonce`` is the one given to the process that produced ``result``.
+        """
+        output, artifacts = parse_artifacts(result.stdout, nonce)
+        output, sympy_results = symcache.parse_records(output, self._symcache_token)
+        output, profile = parse_profile(output)
+        if sympy_results and settings.sympy_cache_enabled:
+            self._save_sympy_results(sympy_results)
         response = {
             "success": result.returncode == 0,
-            "output": result.stdout,
+            "output": output,
             "error": result.stderr if result.returncode != 0 else "",
             "plots": []
         }
         
         if include_plots:
-            # Find generated plot files and return URLs instead of Base64
+            # Artifacts rendered in memory arrive over the worker channel
+            for artifact in artifacts:
+                try:
+                    response["plots"].append(self.plot_store.save_artifact(artifact))
+                except Exception as e:
+                    logger.warning(f"Failed to store plot artifact: {e}")
+            
+            # Legacy "file" render mode: find plot sidecar files
             for json_file in self.output_dir.glob("*.json"):
                 try:
                     with open(json_file, 'r') as f:
@@ -411,6 +629,12 @@ print(f"\\nExecution completed! Generated {plot_counter} visualizations.")
                             "plot_id": plot_data.get("plot_id", ""),
                             "description": "Generated visualization"
                         }
+                        if plot_data.get("format"):
+                            plot_metadata["format"] = plot_data["format"]
+                        if plot_data.get("data_url"):
+                            plot_metadata["data_url"] = plot_data["data_url"]
+                        if settings.plot_variants_enabled and plot_metadata["type"] == "static":
+                            self.plot_store.add_variants(plot_metadata)
                         response["plots"].append(plot_metadata)
                         
                     # Delete temporary metadata file
@@ -419,8 +643,19 @@ print(f"\\nExecution completed! Generated {plot_counter} visualizations.")
                     logger.warning(f"Failed to process plot file: {e}")
                     continue
         
+        if profile:
+            response["profile"] = profile
         return response
     
+    def _save_sympy_results(self, records: List[Dict[str, Any]]) -> None:
+        """Write SymPy results reported by a sandbox to the shared cache"""
+        try:
+            self.sympy_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            symcache.save_records(str(self.sympy_cache_path), records,
+                                  settings.sympy_cache_max_mb * 2 ** 20)
+        except Exception as e:
+            logger.warning(f"Failed to store SymPy cache entries: {e}")
+    
     def get_available_libraries(self) -> list:
         """Get list of available libraries"""
         return [
@@ -433,18 +668,13 @@ print(f"\\nExecution completed! Generated {plot_counter} visualizations.")
             "statistics - Statistical functions",
             "random - Random number generation",
             "imageio - Image and animation I/O",
+            "save_animation(anim) / capture_frame(fig) - Fast animation capture (WebP/MP4/GIF)",
             "Physics constants: g, c, h, k_B, e, m_e, m_p"
         ]
     
     def validate_syntax(self, code: str) -> Dict[str, Any]:
         """Validate code syntax"""
         try:
-            compile(code, '<string>', 'exec')
-            return {"valid": True, "error": None}
-        except SyntaxError as e:
-            return {
-                "valid": False, 
-                "error": f"Syntax error: {e.msg} (line {e.lineno})"
-            }
+            return self.validator.check_syntax(code)
         except Exception as e:
             return {"valid": False, "error": str(e)} 
\ No newline at end of file
@@ -0,0 +1,329 @@
+import base64
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional, List
+
+from app.core.cancellation import CancelScope, current_scope, is_cancelled, on_cancel
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.structured_logging import request_id_var
+from app.services.plot_store import plot_store
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+queue_jobs = metrics.counter(
+    "execution_queue_jobs_total", "Queued execution jobs by outcome")
+queue_wait = metrics.histogram(
+    "execution_queue_wait_seconds", "Time jobs spent queued before a worker picked them up")
+
+
+class InProcessBroker:
+    """Broker stand-in backed by in-memory queues (single process only)
+
+    Jobs and results are still serialized to JSON so the contract matches
+    the Redis broker exactly: a result waits for its reader until it is
+    read or its TTL passes, across any number of timed waits.
+    """
+
+    # Seconds an unread result (or an idle waiter's queue) is kept by default
+    result_ttl = 300
+
+    def __init__(self):
+        self._jobs: "queue.Queue[str]" = queue.Queue()
+        self._results: Dict[str, "queue.Queue[str]"] = {}
+        self._result_expiry: Dict[str, float] = {}
+        self._cancelled: Dict[str, float] = {}  # job_id -> expiry
+        self._lock = threading.Lock()
+
+    def enqueue(self, job: Dict[str, Any]) -> None:
+        self._jobs.put(json.dumps(job))
+
+    def dequeue(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._jobs.get(timeout=timeout))
+        except queue.Empty:
+            return None
+
+    def publish_result(self, job_id: str, result: Dict[str, Any], ttl: int) -> None:
+        self._result_queue(job_id, ttl).put(json.dumps(result))
+
+    def wait_result(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            result = json.loads(self._result_queue(job_id, self.result_ttl).get(timeout=timeout))
+        except queue.Empty:
+            return None  # A later wait may still receive it
+        with self._lock:
+            self._results.pop(job_id, None)
+            self._result_expiry.pop(job_id, None)
+        return result
+
+    def cancel(self, job_id: str, ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._cancelled = {k: t for k, t in self._cancelled.items() if t > now}
+            self._cancelled[job_id] = now + ttl
+
+    def is_cancelled(self, job_id: str) -> bool:
+        with self._lock:
+            return self._cancelled.get(job_id, 0) > time.time()
+
+    def _result_queue(self, job_id: str, ttl: float) -> "queue.Queue[str]":
+        now = time.time()
+        with self._lock:
+            for expired in [k for k, t in self._result_expiry.items() if t <= now and k != job_id]:
+                self._results.pop(expired, None)
+                self._result_expiry.pop(expired, None)
+            self._result_expiry[job_id] = max(self._result_expiry.get(job_id, 0), now + ttl)
+            return self._results.setdefault(job_id, queue.Queue())
+
+
+class RedisBroker:
+    """Broker on Redis lists: one shared job list, one result list per job"""
+
+    def __init__(self, url: str, prefix: str = "edu:exec"):
+        # Blocking pops need a socket timeout longer than the pop itself
+        self.client = redis.Redis.from_url(url, socket_timeout=None)
+        self.jobs_key = f"{prefix}:jobs"
+        self.result_prefix = f"{prefix}:result:"
+        self.cancel_prefix = f"{prefix}:cancel:"
+
+    def enqueue(self, job: Dict[str, Any]) -> None:
+        self.client.lpush(self.jobs_key, json.dumps(job))
+
+    def dequeue(self, timeout: float) -> Optional[Dict[str, Any]]:
+        item = self.client.brpop([self.jobs_key], timeout=max(1, int(timeout)))
+        return json.loads(item[1]) if item else None
+
+    def publish_result(self, job_id: str, result: Dict[str, Any], ttl: int) -> None:
+        key = self.result_prefix + job_id
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps(result))
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def wait_result(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        item = self.client.blpop([self.result_prefix + job_id], timeout=max(1, int(timeout)))
+        return json.loads(item[1]) if item else None
+
+    def cancel(self, job_id: str, ttl: int) -> None:
+        self.client.set(self.cancel_prefix + job_id, 1, ex=max(1, int(ttl)))
+
+    def is_cancelled(self, job_id: str) -> bool:
+        return bool(self.client.exists(self.cancel_prefix + job_id))
+
+
+def create_broker():
+    """Redis broker when configured, otherwise the in-process stand-in"""
+    if settings.redis_url and redis is not None:
+        return RedisBroker(settings.redis_url, prefix=settings.execution_queue_name)
+    logger.warning("⚠️ No Redis broker available, execution queue runs in-process")
+    return InProcessBroker()
+
+
+class ArtifactCollector:
+    """Plot store stand-in for workers: keeps artifact bytes for the reply
+
+    Compute nodes do not share the API's plot volume, so artifacts travel
+    back with the result and are persisted by the API node.
+    """
+
+    def save_artifact(self, artifact: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(artifact)
+
+    def add_variants(self, metadata: Dict[str, Any], data: Optional[bytes] = None) -> Dict[str, Any]:
+        return metadata
+
+
+class RemoteExecutor:
+    """Runs sandbox jobs on separate executor workers through a broker
+
+    Code is validated on the API node so unsafe submissions never reach the
+    queue; accepted jobs carry a deadline and workers drop jobs the API has
+    already given up on.
+    """
+
+    def __init__(self, executor, broker, queue_grace: int = 30):
+        self.executor = executor
+        self.broker = broker
+        self.queue_grace = queue_grace
+        self.plot_store = plot_store
+
+    def execute_code(self, code: str, include_plots: bool = True,
+                     timeout: int = 60, user_intent: str = "",
+                     model_info: Dict[str, str] = None,
+                     render_options: Optional[Dict[str, Any]] = None,
+                     profile: bool = False) -> Dict[str, Any]:
+        """Enqueue code for a worker and wait for its result"""
+        safety_result = self.executor._safety_check(code)
+        if not safety_result["safe"]:
+            return self.executor._rejection(safety_result)
+
+        wait = timeout + self.queue_grace
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "request_id": request_id_var.get(),  # Correlates the worker's log lines
+            "code": code,
+            "include_plots": include_plots,
+            "timeout": timeout,
+            "user_intent": user_intent,
+            "render_options": render_options,
+            "profile": profile,
+            "enqueued_at": time.time(),
+            "deadline": time.time() + wait
+        }
+        self.broker.enqueue(job)
+        queue_jobs.inc(outcome="enqueued")
+
+        # A cancelled chat flags the job: workers skip it if still queued and kill it if running
+        with on_cancel(lambda: self.broker.cancel(job["job_id"], wait)):
+            result = self._wait_result(job["job_id"], wait)
+        if is_cancelled():
+            queue_jobs.inc(outcome="cancelled")
+            return self.executor._cancelled()
+        if result is None:
+            queue_jobs.inc(outcome="timeout")
+            return {
+                "success": False,
+                "error": f"No execution worker finished the job within {wait} seconds",
+                "output": "",
+                "plots": []
+            }
+
+        queue_jobs.inc(outcome="completed")
+        if "queued_seconds" in result:
+            queue_wait.observe(result.pop("queued_seconds"))
+        result["plots"] = self._store_plots(result.get("plots", []))
+        return result
+
+    def _wait_result(self, job_id: str, wait: float) -> Optional[Dict[str, Any]]:
+        """Wait for the job's result in short slices so a cancellation is noticed"""
+        deadline = time.monotonic() + wait
+        while not is_cancelled():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            result = self.broker.wait_result(job_id, min(remaining, 1.0))
+            if result is not None:
+                return result
+        return None
+
+    def _store_plots(self, plots: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        stored = []
+        for plot in plots:
+            if "data" not in plot:
+                stored.append(plot)
+                continue
+            try:
+                artifact = dict(plot, data=base64.b64decode(plot["data"]))
+                if plot.get("figure_data"):
+                    artifact["figure_data"] = base64.b64decode(plot["figure_data"])
+                stored.append(self.plot_store.save_artifact(artifact))
+            except Exception as e:
+                logger.warning(f"Failed to store remote plot artifact: {e}")
+        return stored
+
+
+class ExecutionWorker:
+    """Consumes execution jobs from the broker and publishes results"""
+
+    # Seconds between checks for a cancellation of the running job
+    cancel_poll_interval = 0.5
+
+    def __init__(self, broker, executor, result_ttl: int = 300):
+        self.broker = broker
+        self.executor = executor
+        # Artifacts go back over the broker instead of to local disk
+        self.executor.plot_store = ArtifactCollector()
+        self.result_ttl = result_ttl
+        self._stop = threading.Event()
+
+    def run_once(self, poll_timeout: float = 1.0) -> bool:
+        """Process at most one job; returns whether one was taken"""
+        job = self.broker.dequeue(poll_timeout)
+        if job is None:
+            return False
+
+        started = time.time()
+        if started > job["deadline"]:
+            logger.info(f"⏭️ Dropping expired job {job['job_id']}")
+            return True
+        if self.broker.is_cancelled(job["job_id"]):
+            logger.info(f"⏭️ Dropping cancelled job {job['job_id']}")
+            queue_jobs.inc(outcome="dropped_cancelled")
+            return True
+
+        # The sandbox registers its kill with this scope, which the watcher cancels
+        scope = CancelScope(job["job_id"])
+        finished = threading.Event()
+        threading.Thread(target=self._watch_cancel, args=(job["job_id"], scope, finished),
+                         name=f"cancel-watch-{job['job_id'][:8]}", daemon=True).start()
+        scope_token = current_scope.set(scope)
+        token = request_id_var.set(job.get("request_id"))
+        try:
+            result = self.executor.execute_code(
+                code=job["code"],
+                include_plots=job["include_plots"],
+                timeout=job["timeout"],
+                user_intent=job.get("user_intent", ""),
+                render_options=job.get("render_options"),
+                profile=job.get("profile", False)
+            )
+        except Exception as e:
+            logger.error(f"Job {job['job_id']} failed: {e}")
+            result = {"success": False, "error": str(e), "output": "", "plots": []}
+        finally:
+            request_id_var.reset(token)
+            current_scope.reset(scope_token)
+            finished.set()
+        if scope.cancelled:
+            return True  # Nobody is waiting for the result
+
+        for plot in result.get("plots", []):
+            for key in ("data", "figure_data"):
+                if isinstance(plot.get(key), bytes):
+                    plot[key] = base64.b64encode(plot[key]).decode("ascii")
+        result["queued_seconds"] = started - job["enqueued_at"]
+        self.broker.publish_result(job["job_id"], result, self.result_ttl)
+        return True
+
+    def _watch_cancel(self, job_id: str, scope: CancelScope, finished: threading.Event) -> None:
+        while not finished.wait(self.cancel_poll_interval):
+            try:
+                if self.broker.is_cancelled(job_id):
+                    scope.cancel("job_cancelled")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not check cancellation of job {job_id}: {e}")
+
+    def run(self, concurrency: int = 1) -> None:
+        """Serve jobs on ``concurrency`` threads until stopped"""
+        threads = [threading.Thread(target=self._loop, name=f"exec-worker-{i}", daemon=True)
+                   for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def start_background(self, concurrency: int = 1) -> None:
+        for i in range(concurrency):
+            threading.Thread(target=self._loop, name=f"exec-worker-{i}", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Execution worker error: {e}")
+                time.sleep(1.0)
@@ -0,0 +1 @@
+# Sandbox Runtime Helpers (imported inside the execution subprocess)
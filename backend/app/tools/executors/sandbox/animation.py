@@ -0,0 +1,211 @@
+"""Animation capture for the sandbox
+
+Frames are read straight from the Agg canvas buffer instead of round-tripping
+every frame through PNG, then encoded once into a compact animated format.
+This module runs inside the execution subprocess, so it must only depend on
+numpy, matplotlib and Pillow.
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from matplotlib import animation as mpl_animation
+from PIL import Image, features
+
+from . import channel
+
+# Runtime limits, overridden by the executor through configure()
+_config = {
+    "max_frames": 120,
+    "max_dim": 800,
+    "fps": 15,
+    "format": "webp",
+}
+
+# Animations created by user code that have not been captured yet
+_pending: List[mpl_animation.Animation] = []
+
+
+def configure(**options) -> None:
+    """Update animation limits (max_frames, max_dim, fps, format)"""
+    _config.update({k: v for k, v in options.items() if v is not None})
+
+
+def capture_frame(fig) -> np.ndarray:
+    """Render a figure once and return its pixels as an RGB array"""
+    _limit_resolution(fig)
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+
+
+def save_animation(source, fps: Optional[float] = None,
+                   fmt: Optional[str] = None) -> Dict[str, Any]:
+    """Capture a matplotlib Animation or a sequence of RGB frames as a plot"""
+    started = time.perf_counter()
+    if isinstance(source, mpl_animation.Animation):
+        frames, source_fps = _render_animation(source)
+        fps = fps or source_fps
+    else:
+        frames = _prepare_frames(source)
+
+    if not frames:
+        raise ValueError("Animation has no frames to save")
+
+    data, ext = encode_frames(frames, fps or _config["fps"], fmt or _config["format"])
+    channel.stats["render_seconds"] += time.perf_counter() - started
+    return _register(data, ext)
+
+
+def pending_animation(fig) -> Optional[mpl_animation.Animation]:
+    """Return an uncaptured animation attached to ``fig``, if any"""
+    for anim in _pending:
+        if anim._fig is fig:
+            return anim
+    return None
+
+
+def encode_frames(frames: Sequence[np.ndarray], fps: float, fmt: str = "webp"):
+    """Encode RGB frames, falling back from mp4 to webp to gif"""
+    fps = max(float(fps), 1.0)
+    candidates = [fmt] + [f for f in ("webp", "gif") if f != fmt]
+
+    for candidate in candidates:
+        if candidate == "mp4" and shutil.which("ffmpeg"):
+            data = _encode_mp4(frames, fps)
+            if data:
+                return data, "mp4"
+        elif candidate == "webp" and features.check("webp"):
+            return _encode_pillow(frames, fps, "WEBP", quality=80, method=4), "webp"
+        elif candidate == "gif":
+            return _encode_pillow(frames, fps, "GIF", optimize=False), "gif"
+
+    return _encode_pillow(frames, fps, "GIF", optimize=False), "gif"
+
+
+def install_hooks(imageio_module=None) -> None:
+    """Route Animation.save and imageio.mimsave through the capture path"""
+    original_init = mpl_animation.Animation.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        _pending.append(self)
+
+    def capturing_save(self, filename=None, writer=None, fps=None, *args, **kwargs):
+        save_animation(self, fps=fps)
+
+    mpl_animation.Animation.__init__ = tracking_init
+    mpl_animation.Animation.save = capturing_save
+
+    if imageio_module is not None:
+        def capturing_mimsave(uri, ims, *args, **kwargs):
+            fps = kwargs.get("fps")
+            duration = kwargs.get("duration")
+            if fps is None and duration:
+                # imageio v2 takes seconds per frame, v3 milliseconds
+                fps = 1000.0 / duration if duration > 10 else 1.0 / duration
+            return save_animation(list(ims), fps=fps)
+
+        imageio_module.mimsave = capturing_mimsave
+        imageio_module.mimwrite = capturing_mimsave
+        if hasattr(imageio_module, "v2"):
+            imageio_module.v2.mimsave = capturing_mimsave
+            imageio_module.v2.mimwrite = capturing_mimsave
+
+
+def _render_animation(anim: mpl_animation.Animation):
+    """Step through every frame but only rasterize the ones we keep"""
+    if anim in _pending:
+        _pending.remove(anim)
+
+    fig = anim._fig
+    _limit_resolution(fig)
+    frame_data = list(anim.new_saved_frame_seq())
+    keep = set(_select_indices(len(frame_data), _config["max_frames"]))
+
+    anim._init_draw()
+    frames = []
+    for index, data in enumerate(frame_data):
+        # Update functions are often stateful, so every frame is advanced
+        anim._draw_frame(data)
+        if index in keep:
+            fig.canvas.draw()
+            frames.append(np.asarray(fig.canvas.buffer_rgba())[..., :3].copy())
+
+    interval = getattr(anim, "_interval", None) or 1000.0 / _config["fps"]
+    fps = 1000.0 / interval
+    if frame_data:
+        fps *= len(frames) / len(frame_data)
+    return frames, fps
+
+
+def _prepare_frames(images) -> List[np.ndarray]:
+    """Normalize user supplied frames to capped RGB uint8 arrays"""
+    images = list(images)
+    keep = _select_indices(len(images), _config["max_frames"])
+    max_dim = _config["max_dim"]
+
+    frames = []
+    for index in keep:
+        image = Image.fromarray(np.asarray(images[index])).convert("RGB")
+        if max(image.size) > max_dim:
+            image.thumbnail((max_dim, max_dim))
+        frames.append(np.asarray(image))
+    return frames
+
+
+def _select_indices(count: int, limit: int) -> List[int]:
+    if count <= limit:
+        return list(range(count))
+    return sorted(set(np.linspace(0, count - 1, limit).round().astype(int).tolist()))
+
+
+def _limit_resolution(fig) -> None:
+    width, height = fig.get_size_inches()
+    max_dpi = _config["max_dim"] / max(width, height)
+    if fig.dpi > max_dpi:
+        fig.set_dpi(max_dpi)
+
+
+def _encode_pillow(frames, fps: float, pil_format: str, **options) -> bytes:
+    images = [Image.fromarray(frame) for frame in frames]
+    buffer = io.BytesIO()
+    images[0].save(
+        buffer, format=pil_format, save_all=True, append_images=images[1:],
+        duration=int(round(1000.0 / fps)), loop=0, **options
+    )
+    return buffer.getvalue()
+
+
+def _encode_mp4(frames, fps: float) -> Optional[bytes]:
+    height, width = frames[0].shape[:2]
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "animation.mp4")
+        command = [
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+            "-r", f"{fps:.3f}", "-i", "-",
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-movflags", "+faststart",
+            target,
+        ]
+        try:
+            process = subprocess.run(
+                command, input=b"".join(np.ascontiguousarray(f).tobytes() for f in frames),
+                capture_output=True, timeout=60
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if process.returncode != 0 or not os.path.exists(target):
+            return None
+        with open(target, "rb") as f:
+            return f.read()
+
+
+def _register(data: bytes, ext: str) -> Dict[str, Any]:
+    """Publish the encoded animation over the worker channel"""
+    return channel.publish(data, ext, "animation")
@@ -0,0 +1,123 @@
+"""Worker channel between the sandbox and the executor
+
+Rendered artifacts are written to the real stdout as single marker-prefixed
+lines, so plots travel back with the process output instead of through files
+on disk. Each line carries the nonce the executor put in the process
+environment (read and removed at import), so lines printed by user code are
+not taken for artifacts. The legacy "file" mode keeps writing the image plus a JSON sidecar.
+A static plot may carry its exported figure data (see plotdata), stored
+next to the image as ``plot_<id>.plotdata``.
+"""
+import base64
+import json
+import os
+import secrets
+import sys
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+ARTIFACT_MARKER = "@@EDU_ARTIFACT@@ "
+
+# Environment variable carrying the executor's per-process nonce
+NONCE_ENV = "EDU_CHANNEL_NONCE"
+_nonce = os.environ.pop(NONCE_ENV, "")
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+    "gif": "image/gif",
+    "mp4": "video/mp4",
+    "plotdata": "application/vnd.edu-agent.plotdata",
+}
+
+_config = {"mode": "memory", "stream": "__stdout__"}
+
+# Time spent rendering and encoding artifacts (read by the profiler)
+stats = {"render_seconds": 0.0, "artifacts": 0}
+
+
+def configure(mode: str = None, stream: str = None) -> None:
+    """Select the transport: "memory" (channel) or "file" (disk + sidecar)
+
+    ``stream`` names the sys attribute artifacts are written to; persistent
+    kernels use "stdout" so records travel over the kernel's iopub channel.
+    """
+    if mode:
+        _config["mode"] = mode
+    if stream:
+        _config["stream"] = stream
+
+
+def publish(data: bytes, fmt: str, plot_type: str = "static",
+            figure_data: Optional[bytes] = None, **extra) -> Dict[str, Any]:
+    """Hand a rendered artifact to the executor and return its metadata"""
+    plot_id = str(uuid.uuid4())
+    filepath = f"plot_{plot_id}.{fmt}"
+    plot_info = {
+        "plot_id": plot_id,
+        "filename": filepath,
+        "url": f"/api/plots/{filepath}",
+        "type": plot_type,
+        "format": fmt,
+        "media_type": MEDIA_TYPES.get(fmt, "application/octet-stream"),
+    }
+    plot_info.update(extra)
+    stats["artifacts"] += 1
+    if figure_data:
+        plot_info["data_url"] = f"/api/plots/plot_{plot_id}.plotdata"
+
+    if _config["mode"] == "file":
+        with open(filepath, "wb") as f:
+            f.write(data)
+        if figure_data:
+            with open(f"plot_{plot_id}.plotdata", "wb") as f:
+                f.write(figure_data)
+        with open(f"plot_{plot_id}.json", "w") as f:
+            json.dump(plot_info, f)
+        return plot_info
+
+    record = dict(plot_info, data=base64.b64encode(data).decode("ascii"))
+    if figure_data:
+        record["figure_data"] = base64.b64encode(figure_data).decode("ascii")
+    stream = getattr(sys, _config["stream"])
+    stream.write("\n" + ARTIFACT_MARKER + _nonce + " " + json.dumps(record) + "\n")
+    stream.flush()
+    return plot_info
+
+
+def new_nonce() -> str:
+    """Nonce for one sandbox process, passed to it as NONCE_ENV"""
+    return secrets.token_hex(16)
+
+
+def parse_artifacts(stdout: str, nonce: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """Split process output into user output and decoded artifacts
+
+    Only records carrying ``nonce`` are artifacts; other marker lines were
+    printed by user code and are dropped.
+    """
+    if ARTIFACT_MARKER not in stdout:
+        return stdout, []
+
+    prefix = ARTIFACT_MARKER + nonce + " "
+    lines = []
+    artifacts = []
+    for line in stdout.split("\n"):
+        if line.startswith(ARTIFACT_MARKER) and not (nonce and line.startswith(prefix)):
+            continue
+        if line.startswith(ARTIFACT_MARKER):
+            try:
+                record = json.loads(line[len(prefix):])
+                record["data"] = base64.b64decode(record["data"])
+                if "figure_data" in record:
+                    record["figure_data"] = base64.b64decode(record["figure_data"])
+                artifacts.append(record)
+                # Drop the blank separator written before the marker
+                if lines and lines[-1] == "":
+                    lines.pop()
+            except (ValueError, KeyError):
+                lines.append(line)
+        else:
+            lines.append(line)
+    return "\n".join(lines), artifacts
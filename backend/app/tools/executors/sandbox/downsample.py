@@ -0,0 +1,188 @@
+"""Render-time downsampling of large plotted series
+
+A line of 10^6 points drawn into an axes a thousand pixels wide spends
+nearly all of ``savefig`` rasterizing detail that ends up in the same
+pixels. Before a figure is rendered, oversized lines and scatters are
+temporarily replaced by a reduced set that draws the same picture:
+
+- lines with monotonic x keep the first, last, minimum and maximum point
+  of each pixel column (``minmax``; exact envelope) or use
+  largest-triangle-three-buckets (``lttb``; smoother for noisy data);
+- opaque scatters keep one marker per occupied pixel.
+
+Lines with non-monotonic x (orbits, phase portraits) are left alone:
+matplotlib's own path simplification already renders them quickly.
+
+The original data is restored after rendering, so user code that keeps
+working with the figure is unaffected. This module runs inside the
+execution subprocess, so it must only depend on numpy and matplotlib.
+"""
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import numpy as np
+from matplotlib.collections import PathCollection
+from matplotlib.lines import Line2D
+
+# Overridden by the executor through configure(), or by user code through
+# set_plot_downsampling() in the preamble
+_config = {
+    "enabled": True,
+    "method": "minmax",  # minmax or lttb
+    "min_points": 5000,  # Series shorter than this are never touched
+    "points_per_pixel": 4,  # Series are reduced only beyond this density
+}
+
+
+def configure(**options) -> None:
+    """Update downsampling options (enabled, method, min_points, points_per_pixel)"""
+    _config.update({k: v for k, v in options.items() if v is not None})
+
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """Indices of the first, min, max and last point of ``buckets`` equal slices"""
+    n = len(y)
+    chunk = -(-n // buckets)
+    padded = np.concatenate([y, np.full(chunk * buckets - n, y[-1])]).reshape(buckets, chunk)
+    offsets = np.arange(buckets) * chunk
+    picks = np.concatenate([
+        offsets,
+        offsets + np.argmin(padded, axis=1),
+        offsets + np.argmax(padded, axis=1),
+        np.minimum(offsets + chunk - 1, n - 1),
+    ])
+    return np.unique(np.minimum(picks, n - 1))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-triangle-three-buckets: ``threshold`` points that keep the shape"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        # Triangle area with the previous pick and the next bucket's average
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def pixel_indices(pixels: np.ndarray) -> np.ndarray:
+    """First point landing on each distinct pixel, in original order"""
+    cells = np.round(pixels).astype(np.int64)
+    _, first = np.unique(cells, axis=0, return_index=True)
+    return np.sort(first)
+
+
+def _axes_pixels(ax, dpi: float) -> Tuple[float, float]:
+    """Axes width in output pixels, and the data-to-output-pixel scale"""
+    fig = ax.figure
+    width = ax.get_position().width * fig.get_size_inches()[0] * dpi
+    return width, dpi / fig.dpi
+
+
+def _reduce_line(line: Line2D, width: float, restore: List) -> None:
+    x = np.asarray(line.get_xdata(orig=True), dtype=float)
+    y = np.asarray(line.get_ydata(orig=True), dtype=float)
+    n = len(x)
+    if n != len(y) or n < max(_config["min_points"], _config["points_per_pixel"] * width):
+        return
+    if not (np.isfinite(x).all() and np.isfinite(y).all()):
+        return  # NaN gaps are intentional breaks in the line
+    if line.get_marker() not in (None, "None", "none", "", " "):
+        return  # Every marker is visible on its own
+
+    steps = np.diff(x)
+    if not (np.all(steps >= 0) or np.all(steps <= 0)):
+        return
+    if _config["method"] == "lttb":
+        keep = lttb_indices(x, y, int(2 * width))
+    else:
+        keep = minmax_indices(y, max(int(width), 1))
+
+    if len(keep) < n:
+        restore.append(lambda line=line, x=line.get_xdata(orig=True), y=line.get_ydata(orig=True):
+                       line.set_data(x, y))
+        line.set_data(x[keep], y[keep])
+
+
+def _reduce_scatter(collection: PathCollection, width: float, scale: float, restore: List) -> None:
+    offsets = np.asarray(collection.get_offsets(), dtype=float)
+    n = len(offsets)
+    if n < max(_config["min_points"], _config["points_per_pixel"] * width):
+        return
+    alpha = collection.get_alpha()
+    facecolors = collection.get_facecolors()
+    if (alpha is not None and np.any(np.asarray(alpha) < 1)) or (len(facecolors) and np.any(facecolors[:, 3] < 1)):
+        return  # Overlapping translucent markers show density
+    if not np.isfinite(offsets).all():
+        return
+
+    ax = collection.axes
+    ax.get_xlim(), ax.get_ylim()  # Settle pending autoscaling first
+    pixels = ax.transData.transform(offsets) * scale
+    keep = pixel_indices(pixels)
+    if len(keep) == n:
+        return
+
+    state = {"offsets": collection.get_offsets(), "array": collection.get_array(),
+             "sizes": collection.get_sizes(), "facecolors": collection.get_facecolors(),
+             "edgecolors": collection.get_edgecolors(), "linewidths": collection.get_linewidths()}
+    collection.set_offsets(offsets[keep])
+    if state["array"] is not None and len(state["array"]) == n:
+        collection.set_array(np.asarray(state["array"])[keep])
+    if len(state["sizes"]) == n:
+        collection.set_sizes(state["sizes"][keep])
+    if state["array"] is None:
+        # Per-point colors only matter when they don't come from a colormap
+        if len(state["facecolors"]) == n:
+            collection.set_facecolors(state["facecolors"][keep])
+        if len(state["edgecolors"]) == n:
+            collection.set_edgecolors(state["edgecolors"][keep])
+    if len(state["linewidths"]) == n:
+        collection.set_linewidths(np.asarray(state["linewidths"])[keep])
+
+    def undo(collection=collection, state=state):
+        collection.set_offsets(state["offsets"])
+        if state["array"] is not None:
+            collection.set_array(state["array"])
+        collection.set_sizes(state["sizes"])
+        if state["array"] is None:
+            collection.set_facecolors(state["facecolors"])
+            collection.set_edgecolors(state["edgecolors"])
+        collection.set_linewidths(state["linewidths"])
+    restore.append(undo)
+
+
+@contextmanager
+def reduced(fig, dpi: float):
+    """Downsample oversized series of ``fig`` for one render at ``dpi``"""
+    restore: List = []
+    if _config["enabled"]:
+        try:
+            for ax in fig.get_axes():
+                width, scale = _axes_pixels(ax, dpi)
+                for line in ax.get_lines():
+                    _reduce_line(line, width, restore)
+                for collection in ax.collections:
+                    if type(collection) is PathCollection:
+                        _reduce_scatter(collection, width, scale, restore)
+        except Exception:
+            # Never fail a render because of an optimization
+            for undo in reversed(restore):
+                undo()
+            restore = []
+    try:
+        yield
+    finally:
+        for undo in reversed(restore):
+            undo()
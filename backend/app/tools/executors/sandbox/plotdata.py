@@ -0,0 +1,251 @@
+"""Figure data export for client-side rendering
+
+Next to the rendered image, the data behind a figure's 2D axes (lines,
+scatters and heatmaps) is exported as typed binary arrays, so the browser
+can redraw the plot for pure view changes (zoom, pan) without another
+model and sandbox round trip. Series are downsampled to a point budget
+that stays sharp when zoomed in a few times.
+
+Layout (little-endian)::
+
+    b"EDUPLOT1" | uint32 header length | JSON header (space-padded to 4 bytes) | body
+
+Every array in the header is described by ``{"offset", "length", "dtype"}``
+relative to the body start; offsets are 4-byte aligned so the client can
+view them directly as ``Float32Array`` / ``Uint8Array``. This module runs
+inside the execution subprocess, so it must only depend on numpy and
+matplotlib.
+"""
+import json
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from matplotlib.collections import PathCollection, QuadMesh
+from matplotlib.colors import LogNorm, to_hex
+from matplotlib.image import AxesImage
+
+from .downsample import minmax_indices
+
+MAGIC = b"EDUPLOT1"
+
+# Overridden by the executor through configure(), or by user code through
+# set_plot_data_export() in the preamble
+_config = {
+    "enabled": True,
+    "max_points": 10000,  # Per line or scatter
+    "max_cells": 65536,  # Per heatmap (256 x 256)
+}
+
+
+def configure(**options) -> None:
+    """Update export options (enabled, max_points, max_cells)"""
+    _config.update({k: v for k, v in options.items() if v is not None})
+
+
+class _Body:
+    """Accumulates aligned arrays and hands out their descriptors"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def add(self, array, dtype: str) -> Dict[str, Any]:
+        data = np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder("<")).tobytes()
+        descriptor = {"offset": self.size, "length": int(np.size(array)), "dtype": dtype}
+        self.chunks.append(data + b"\0" * (-len(data) % 4))
+        self.size += len(self.chunks[-1])
+        return descriptor
+
+
+def export_figure(fig) -> Optional[bytes]:
+    """Encode the plotted data of ``fig``; None when there is nothing to export"""
+    if not _config["enabled"]:
+        return None
+    body = _Body()
+    axes = []
+    for ax in fig.get_axes():
+        if ax.name != "rectilinear" or hasattr(ax, "_colorbar"):
+            continue
+        series = []
+        for line in ax.get_lines():
+            series.append(_line(line, body))
+        for collection in ax.collections:
+            if type(collection) is PathCollection:
+                series.append(_scatter(collection, body))
+            elif isinstance(collection, QuadMesh):
+                series.append(_quadmesh(collection, body))
+        for image in ax.get_images():
+            if isinstance(image, AxesImage):
+                series.append(_image(image, body))
+        series = [s for s in series if s is not None]
+        if not series:
+            continue
+        x0, y0, width, height = ax.get_position().bounds
+        axes.append({
+            "position": [x0, y0, width, height],  # Figure fraction, origin bottom left
+            "xlim": [float(v) for v in ax.get_xlim()],
+            "ylim": [float(v) for v in ax.get_ylim()],
+            "xscale": ax.get_xscale(),
+            "yscale": ax.get_yscale(),
+            "title": ax.get_title(),
+            "xlabel": ax.get_xlabel(),
+            "ylabel": ax.get_ylabel(),
+            "series": series,
+        })
+    if not axes:
+        return None
+
+    width, height = fig.get_size_inches()
+    header = json.dumps({"version": 1, "size": [float(width), float(height)], "axes": axes}).encode("utf-8")
+    header += b" " * (-len(header) % 4)
+    return MAGIC + struct.pack("<I", len(header)) + header + b"".join(body.chunks)
+
+
+def decode(data: bytes) -> Dict[str, Any]:
+    """Inverse of export_figure, with arrays materialized (for tests and tools)"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not an exported figure")
+    (length,) = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    figure = json.loads(data[start:start + length])
+    body = memoryview(data)[start + length:]
+
+    def arrays(node):
+        if isinstance(node, dict):
+            if set(node) == {"offset", "length", "dtype"}:
+                return np.frombuffer(body, dtype=np.dtype(node["dtype"]).newbyteorder("<"),
+                                     count=node["length"], offset=node["offset"])
+            return {key: arrays(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [arrays(value) for value in node]
+        return node
+    return arrays(figure)
+
+
+def _label(artist) -> Optional[str]:
+    label = artist.get_label()
+    return None if not label or label.startswith("_") else label
+
+
+def _line(line, body: _Body) -> Optional[Dict[str, Any]]:
+    try:
+        x = np.asarray(line.get_xdata(orig=False), dtype=float).ravel()
+        y = np.asarray(line.get_ydata(orig=False), dtype=float).ravel()
+    except (TypeError, ValueError):
+        return None  # Non-numeric data (e.g. categories)
+    n = len(x)
+    if n == 0 or len(y) != n or not line.get_visible():
+        return None
+
+    budget = _config["max_points"]
+    if n > budget:
+        steps = np.diff(x)
+        if np.isfinite(x).all() and np.isfinite(y).all() and (np.all(steps >= 0) or np.all(steps <= 0)):
+            keep = minmax_indices(y, max(budget // 4, 1))
+        else:
+            keep = np.unique(np.linspace(0, n - 1, budget).astype(int))
+        x, y = x[keep], y[keep]
+
+    marker = line.get_marker()
+    return {
+        "kind": "line",
+        "label": _label(line),
+        "color": to_hex(line.get_color()),
+        "alpha": line.get_alpha(),
+        "linewidth": float(line.get_linewidth()),  # Points
+        "linestyle": line.get_linestyle(),
+        "marker": None if marker in (None, "None", "none", "", " ") else str(marker),
+        "markersize": float(line.get_markersize()),
+        "points": n,
+        "x": body.add(x, "float32"),
+        "y": body.add(y, "float32"),
+    }
+
+
+def _scatter(collection: PathCollection, body: _Body) -> Optional[Dict[str, Any]]:
+    if collection.get_offset_transform() != collection.axes.transData or not collection.get_visible():
+        return None
+    offsets = np.asarray(collection.get_offsets(), dtype=float).reshape(-1, 2)
+    n = len(offsets)
+    if n == 0:
+        return None
+    collection.update_scalarmappable()  # Map the colormapped array to face colors
+    colors = np.asarray(collection.get_facecolors(), dtype=float).reshape(-1, 4)
+    sizes = np.asarray(collection.get_sizes(), dtype=float)
+
+    keep = slice(None)
+    if n > _config["max_points"]:
+        keep = np.unique(np.linspace(0, n - 1, _config["max_points"]).astype(int))
+    return {
+        "kind": "scatter",
+        "label": _label(collection),
+        "points": n,
+        "x": body.add(offsets[keep, 0], "float32"),
+        "y": body.add(offsets[keep, 1], "float32"),
+        # One entry for all markers, or one per marker
+        "sizes": body.add(sizes[keep] if len(sizes) == n else sizes[:1], "float32"),  # Points squared
+        "colors": body.add(np.round((colors[keep] if len(colors) == n else colors[:1]) * 255), "uint8"),
+    }
+
+
+def _colormap(mappable, body: _Body) -> Dict[str, Any]:
+    norm = mappable.norm
+    return {
+        "vmin": None if norm.vmin is None else float(norm.vmin),
+        "vmax": None if norm.vmax is None else float(norm.vmax),
+        "norm": "log" if isinstance(norm, LogNorm) else "linear",
+        "colormap": body.add(np.round(mappable.cmap(np.linspace(0, 1, 256)) * 255), "uint8"),
+    }
+
+
+def _cells(values: np.ndarray, x_edges: np.ndarray, y_edges: np.ndarray,
+           mappable, body: _Body) -> Dict[str, Any]:
+    """Heatmap of rows x columns cells; row i spans y_edges[i]..y_edges[i + 1]"""
+    rows, columns = values.shape[:2]
+    step = max(int(np.ceil(np.sqrt(rows * columns / _config["max_cells"]))), 1)
+    if step > 1:
+        row_keep, column_keep = np.arange(0, rows, step), np.arange(0, columns, step)
+        values = values[row_keep][:, column_keep]
+        y_edges = y_edges[np.append(row_keep, rows)]
+        x_edges = x_edges[np.append(column_keep, columns)]
+
+    series = {"kind": "heatmap", "rows": int(values.shape[0]), "columns": int(values.shape[1]),
+              "x_edges": body.add(x_edges, "float32"), "y_edges": body.add(y_edges, "float32")}
+    if values.ndim == 3:
+        # Already colored (RGB/RGBA images)
+        series["rgba"] = body.add(mappable.to_rgba(values, bytes=True), "uint8")
+    else:
+        series["values"] = body.add(np.ma.filled(np.ma.masked_invalid(values).astype(float), np.nan), "float32")
+        series.update(_colormap(mappable, body))
+    return series
+
+
+def _image(image: AxesImage, body: _Body) -> Optional[Dict[str, Any]]:
+    values = image.get_array()
+    if values is None or values.ndim not in (2, 3) or not image.get_visible():
+        return None
+    rows, columns = values.shape[:2]
+    left, right, bottom, top = image.get_extent()
+    # Row 0 is drawn at the top for origin="upper"
+    y_start, y_end = (top, bottom) if image.origin == "upper" else (bottom, top)
+    return _cells(values, np.linspace(left, right, columns + 1), np.linspace(y_start, y_end, rows + 1),
+                  image, body)
+
+
+def _quadmesh(mesh: QuadMesh, body: _Body) -> Optional[Dict[str, Any]]:
+    coordinates = mesh.get_coordinates()
+    values = mesh.get_array()
+    if values is None or not mesh.get_visible():
+        return None
+    rows, columns = coordinates.shape[0] - 1, coordinates.shape[1] - 1
+    x_edges, y_edges = coordinates[0, :, 0], coordinates[:, 0, 1]
+    # Only rectilinear grids; curvilinear meshes stay image-only
+    if not (np.allclose(coordinates[:, :, 0], x_edges) and np.allclose(coordinates[:, :, 1], y_edges[:, None])):
+        return None
+    values = np.ma.asarray(values)
+    if values.ndim == 1 and values.size == rows * columns:
+        values = values.reshape(rows, columns)
+    if values.shape[:2] != (rows, columns):
+        return None
+    return _cells(values, np.asarray(x_edges, dtype=float), np.asarray(y_edges, dtype=float), mesh, body)
@@ -0,0 +1,215 @@
+"""Opt-in sampling profiler for sandboxed user code
+
+A daemon thread samples the main thread's stack every few milliseconds
+(no tracing hooks, so the code runs at close to full speed) and tracks the
+peak resident memory. ``tracemalloc`` is deliberately not used: it slows
+integer-heavy Python loops down more than tenfold, which would distort the
+very timings being reported. The report is written to stdout as a marker
+line when the process exits. Shortly before the execution timeout
+the profiler reports early and interrupts the user code, so a run that
+would have been killed still says where its time went.
+
+This module runs inside the execution subprocess, so it must only depend
+on the standard library.
+"""
+import _thread
+import atexit
+import json
+import linecache
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+PROFILE_MARKER = "@@EDU_PROFILE@@ "
+
+_state: Dict[str, Any] = {}
+
+
+def start(deadline: Optional[float] = None, job_started: Optional[float] = None,
+          interval: float = 0.005) -> None:
+    """Begin profiling
+
+    ``job_started`` is the perf_counter() time the job's clock started
+    (process start, or job hand-off for a pre-started worker); the time
+    before now counts as the preamble. ``deadline`` is measured from it.
+    """
+    now = time.perf_counter()
+    job_started = job_started or now
+    _state.update({
+        "started": job_started,
+        "phase": "setup",
+        "phase_started": now,
+        "phases": Counter({"preamble": now - job_started}),
+        "user_file": None,
+        "first_line": 0,
+        "last_line": None,
+        "samples": 0,
+        "lines": Counter(),
+        "functions": Counter(),
+        "timed_out": False,
+        "reported": False,
+        "stop": threading.Event(),
+        "deadline": job_started + deadline if deadline else None,
+    })
+    _state["baseline_rss"] = _state["peak_rss"] = _resident_bytes()
+    threading.Thread(target=_sample, args=(threading.main_thread().ident, interval),
+                     name="sandbox-profiler", daemon=True).start()
+    atexit.register(report)
+
+
+def phase(name: str, lines_ahead: int = 0) -> None:
+    """Start a named phase; ``user_code`` begins ``lines_ahead`` lines below the call"""
+    if not _state:
+        return
+    now = time.perf_counter()
+    _state["phases"][_state["phase"]] += now - _state["phase_started"]
+    _state["phase"], _state["phase_started"] = name, now
+    caller = sys._getframe(1)
+    if name == "user_code":
+        _state["user_file"] = caller.f_code.co_filename
+        _state["first_line"] = caller.f_lineno + lines_ahead
+    elif name == "cleanup" and _state["user_file"] == caller.f_code.co_filename:
+        _state["last_line"] = caller.f_lineno
+
+
+def _resident_bytes() -> int:
+    """Current resident set size (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def _sample(thread_id: int, interval: float) -> None:
+    stop = _state["stop"]
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            continue
+        _state["samples"] += 1
+        code = frame.f_code
+        _state["functions"][(code.co_filename, code.co_name, code.co_firstlineno)] += 1
+        if _state["samples"] % 10 == 0:
+            _state["peak_rss"] = max(_state["peak_rss"], _resident_bytes())
+
+        # Attribute the sample to the innermost line of the user's own code
+        user_file, first, last = _state["user_file"], _state["first_line"], _state["last_line"]
+        while frame is not None:
+            if (frame.f_code.co_filename == user_file and frame.f_lineno >= first
+                    and (last is None or frame.f_lineno < last)):
+                _state["lines"][(frame.f_lineno, frame.f_code.co_name)] += 1
+                break
+            frame = frame.f_back
+
+        deadline = _state["deadline"]
+        if deadline is not None and time.perf_counter() >= deadline and not _state["timed_out"]:
+            _state["timed_out"] = True
+            report()  # In case the interrupt lands too late (inside a long C call)
+            _thread.interrupt_main()
+
+
+def _function_label(filename: str, name: str, first_line: int) -> str:
+    last = _state["last_line"]
+    if filename == _state["user_file"] and (name == "<module>" or (
+            first_line >= _state["first_line"] and (last is None or first_line < last))):
+        return f"{name} (your code)"
+    parts = filename.replace("\\", "/").split("/")
+    if "site-packages" in parts:
+        parts = parts[parts.index("site-packages") + 1:]
+    module = "/".join(parts[-2:]) if len(parts) > 1 else parts[-1]
+    return f"{name} ({module.rsplit('.', 1)[0]})"
+
+
+def build_report(top: int = 5) -> Dict[str, Any]:
+    """Hotspots, phase timings and memory of the run so far"""
+    now = time.perf_counter()
+    phases = Counter(_state["phases"])
+    phases[_state["phase"]] += now - _state["phase_started"]
+    samples = max(_state["samples"], 1)
+
+    lines: List[Dict[str, Any]] = []
+    for (lineno, function), count in _state["lines"].most_common(top):
+        user_line = lineno - _state["first_line"] + 1
+        source = linecache.getline(_state["user_file"] or "", lineno).strip()
+        lines.append({"line": user_line, "function": function, "share": round(count / samples, 3),
+                      "source": source[:80]})
+
+    functions = [{"function": _function_label(*key), "share": round(count / samples, 3)}
+                 for key, count in _state["functions"].most_common(top)]
+
+    peak = max(_state["peak_rss"], _resident_bytes())
+    if not peak:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except (ImportError, OSError):
+            pass
+    channel = sys.modules.get("sandbox.channel")
+    return {
+        "job_seconds": round(now - _state["started"], 3),
+        "phases": {name: round(seconds, 3) for name, seconds in phases.items() if name != "setup"},
+        # Overlaps the phases: plt.show() renders during user code, leftovers at cleanup
+        "plot_render_seconds": round(channel.stats["render_seconds"], 3) if channel else 0.0,
+        "samples": _state["samples"],
+        "hot_lines": lines,
+        "hot_functions": functions,
+        "peak_memory_mb": round(peak / 2 ** 20, 1),
+        # Memory the job added on top of the loaded libraries
+        "memory_growth_mb": round(max(peak - _state["baseline_rss"], 0) / 2 ** 20, 1),
+        "timed_out": _state["timed_out"],
+    }
+
+
+def report() -> None:
+    """Write the report once (at exit, or early when the deadline passes)"""
+    if not _state or _state["reported"]:
+        return
+    _state["reported"] = True
+    try:
+        record = json.dumps(build_report())
+        os.write(sys.__stdout__.fileno(), ("\n" + PROFILE_MARKER + record + "\n").encode("utf-8"))
+    except Exception:
+        pass
+
+
+def format_report(profile: Dict[str, Any]) -> str:
+    """Compact text version of a report for the model"""
+    if profile.get("unavailable"):
+        return f"Profile unavailable: {profile['unavailable']}"
+    phases = ", ".join(f"{name.replace('_', ' ')} {seconds:.2f}s" for name, seconds in profile.get("phases", {}).items())
+    header = "Profile"
+    if profile.get("timed_out"):
+        header += " (stopped at the timeout; these are the hotspots so far)"
+    lines = [f"{header}: {phases}; plot rendering {profile.get('plot_render_seconds', 0):.2f}s; "
+             f"peak memory {profile.get('peak_memory_mb', 0)} MB "
+             f"(+{profile.get('memory_growth_mb', 0)} MB during the job)"]
+    if profile.get("hot_lines"):
+        lines.append("Hot lines of your code (share of samples):")
+        lines.extend(f"  {spot['share']:.0%} line {spot['line']} in {spot['function']}: {spot['source']}"
+                     for spot in profile["hot_lines"])
+    if profile.get("hot_functions"):
+        lines.append("Innermost functions: " + ", ".join(
+            f"{spot['function']} {spot['share']:.0%}" for spot in profile["hot_functions"]))
+    return "\n".join(lines)
+
+
+def parse_profile(stdout: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Split process output into user output and the profile report"""
+    if PROFILE_MARKER not in stdout:
+        return stdout, None
+    lines, profile = [], None
+    for line in stdout.split("\n"):
+        if line.startswith(PROFILE_MARKER):
+            try:
+                profile = json.loads(line[len(PROFILE_MARKER):])
+                if lines and lines[-1] == "":
+                    lines.pop()
+                continue
+            except ValueError:
+                pass
+        lines.append(line)
+    return "\n".join(lines), profile
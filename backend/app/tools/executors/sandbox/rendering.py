@@ -0,0 +1,67 @@
+"""Single-pass figure rendering for the sandbox
+
+Figures are rendered once into memory in the negotiated format and DPI and
+handed to the worker channel. ``bbox_inches='tight'`` is avoided because it
+forces a second full draw; ``tight_layout`` already trims the margins.
+Oversized series are downsampled to the output resolution first, and the
+full-resolution figure data is exported alongside for client-side zoom.
+"""
+import io
+import time
+from typing import Any, Dict, Optional
+
+from . import channel, downsample, plotdata
+
+# Render options, overridden per request by the executor through configure()
+_config = {
+    "format": "png",
+    "dpi": 150,
+    "min_dpi": 60,
+    "target_width": None,  # Client viewport width in device pixels
+}
+
+SUPPORTED_FORMATS = ("png", "webp", "svg")
+
+
+def configure(**options) -> None:
+    """Update render options (format, dpi, min_dpi, target_width)"""
+    _config.update({k: v for k, v in options.items() if v is not None})
+
+
+def negotiate_dpi(fig, dpi: Optional[float] = None) -> float:
+    """Pick a DPI so the figure fills the client viewport without oversampling"""
+    if dpi:
+        return float(dpi)
+    target_width = _config.get("target_width")
+    if not target_width:
+        return float(_config["dpi"])
+    width_inches = fig.get_size_inches()[0]
+    fitted = target_width / width_inches
+    return float(max(_config["min_dpi"], min(_config["dpi"], fitted)))
+
+
+def render_figure(fig, dpi: Optional[float] = None, fmt: Optional[str] = None) -> Dict[str, Any]:
+    """Render ``fig`` once and publish it as a static plot"""
+    started = time.perf_counter()
+    fmt = (fmt or _config["format"]).lower()
+    if fmt not in SUPPORTED_FORMATS:
+        fmt = "png"
+
+    buffer = io.BytesIO()
+    options = {"format": fmt, "dpi": negotiate_dpi(fig, dpi),
+               "facecolor": "white", "edgecolor": "none"}
+    if fmt == "webp":
+        options["pil_kwargs"] = {"quality": 85, "method": 4}
+    # Series denser than the output pixels are thinned for this render only
+    with downsample.reduced(fig, options["dpi"]):
+        fig.savefig(buffer, **options)
+
+    try:
+        figure_data = plotdata.export_figure(fig)
+    except Exception:
+        figure_data = None  # The image alone is still a complete result
+
+    width, height = fig.get_size_inches() * options["dpi"]
+    channel.stats["render_seconds"] += time.perf_counter() - started
+    return channel.publish(buffer.getvalue(), fmt, "static", figure_data=figure_data,
+                           width=int(round(width)), height=int(round(height)))
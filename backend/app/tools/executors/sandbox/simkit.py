@@ -0,0 +1,143 @@
+"""Vectorized simulation helpers preloaded in the sandbox as ``simkit``
+
+Generated simulations tend to step ODEs and particle systems in Python
+loops over scalars. These helpers keep the time loop in Python but advance
+whole NumPy state arrays per step, so a batch of initial conditions, a
+parameter sweep or an N-body system costs about as much as one scalar
+trajectory. This module runs inside the execution subprocess, so it must
+only depend on numpy.
+
+    t = np.linspace(0, 10, 1001)
+    theta0 = np.linspace(0.1, 3.0, 50)              # 50 pendulums at once
+    y = simkit.rk4(lambda t, y: np.stack([y[1], -g * np.sin(y[0])]),
+                   np.stack([theta0, np.zeros_like(theta0)]), t)
+"""
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Coulomb constant (N⋅m²/C²)
+K_E = 8.9875517923e9
+
+
+def rk4(f: Callable, y0, t, args: Tuple = ()) -> np.ndarray:
+    """Classic fixed-step Runge-Kutta over an array state
+
+    ``f(t, y, *args)`` returns dy/dt with the shape of ``y``, which may
+    hold any batch of systems. Returns the states at every time in ``t``,
+    shape ``(len(t),) + y0.shape``.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.array(y0, dtype=float)
+    out = np.empty((len(t),) + y.shape)
+    out[0] = y
+    for i in range(len(t) - 1):
+        ti, dt = t[i], t[i + 1] - t[i]
+        k1 = f(ti, y, *args)
+        k2 = f(ti + dt / 2, y + dt / 2 * k1, *args)
+        k3 = f(ti + dt / 2, y + dt / 2 * k2, *args)
+        k4 = f(ti + dt, y + dt * k3, *args)
+        y = y + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        out[i + 1] = y
+    return out
+
+
+def verlet(accel: Callable, x0, v0, t, args: Tuple = ()) -> Tuple[np.ndarray, np.ndarray]:
+    """Velocity Verlet for position-dependent forces
+
+    Symplectic: energy stays bounded over long runs (orbits, oscillators,
+    molecular dynamics), where RK4 slowly drifts. ``accel(x, *args)``
+    returns accelerations with the shape of ``x``. Returns positions and
+    velocities at every time in ``t``.
+    """
+    t = np.asarray(t, dtype=float)
+    x = np.array(x0, dtype=float)
+    v = np.array(v0, dtype=float)
+    xs = np.empty((len(t),) + x.shape)
+    vs = np.empty((len(t),) + v.shape)
+    xs[0], vs[0] = x, v
+    a = accel(x, *args)
+    for i in range(len(t) - 1):
+        dt = t[i + 1] - t[i]
+        x = x + v * dt + 0.5 * a * dt * dt
+        a_next = accel(x, *args)
+        v = v + 0.5 * (a + a_next) * dt
+        a = a_next
+        xs[i + 1], vs[i + 1] = x, v
+    return xs, vs
+
+
+def pairwise_gravity(positions, masses, G: float = 1.0, softening: float = 1e-3) -> np.ndarray:
+    """Accelerations of N gravitating bodies, positions shape (N, dim)
+
+    All pairs are computed at once by broadcasting; ``softening`` keeps
+    close encounters finite.
+    """
+    positions = np.asarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    delta = positions[np.newaxis, :, :] - positions[:, np.newaxis, :]
+    dist2 = np.sum(delta ** 2, axis=-1) + softening ** 2
+    np.fill_diagonal(dist2, np.inf)  # No self-interaction
+    inv_r3 = dist2 ** -1.5
+    return G * np.einsum("ij,ijk->ik", inv_r3 * masses[np.newaxis, :], delta)
+
+
+def grid(x_range: Sequence[float], y_range: Sequence[float], n: int = 200) -> Tuple[np.ndarray, np.ndarray]:
+    """Meshgrid over ``x_range`` x ``y_range`` with ``n`` points per axis"""
+    x = np.linspace(x_range[0], x_range[1], n)
+    y = np.linspace(y_range[0], y_range[1], n)
+    return np.meshgrid(x, y)
+
+
+def point_charge_field(charges, positions, X, Y, k: float = K_E,
+                       softening: float = 1e-9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Electric field (Ex, Ey) and potential V of point charges on a 2D grid
+
+    Every charge is evaluated over the whole grid at once; pass
+    ``k=1`` for dimensionless units.
+    """
+    charges = np.asarray(charges, dtype=float)
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    dx = X[..., np.newaxis] - positions[:, 0]
+    dy = Y[..., np.newaxis] - positions[:, 1]
+    r2 = dx ** 2 + dy ** 2 + softening ** 2
+    r = np.sqrt(r2)
+    scale = k * charges / (r2 * r)
+    Ex = np.sum(scale * dx, axis=-1)
+    Ey = np.sum(scale * dy, axis=-1)
+    V = np.sum(k * charges / r, axis=-1)
+    return Ex, Ey, V
+
+
+def sweep(func: Callable, **params) -> Dict[str, np.ndarray]:
+    """Evaluate ``func`` over the Cartesian product of parameter arrays
+
+    Parameters are broadcast against each other, so a NumPy-aware ``func``
+    runs once for the whole sweep. Returns the meshed parameters plus the
+    result under ``"result"``, each shaped ``(len(p1), len(p2), ...)``.
+
+        out = simkit.sweep(lambda v0, angle: v0**2 * np.sin(2*angle) / g,
+                           v0=np.linspace(5, 30, 26), angle=np.radians(np.arange(5, 90, 5)))
+    """
+    names = list(params)
+    meshed = np.meshgrid(*(np.asarray(params[name], dtype=float) for name in names), indexing="ij")
+    grids = dict(zip(names, meshed))
+    try:
+        result = np.asarray(func(**grids))
+    except (TypeError, ValueError):
+        result = None
+    if result is None or result.shape != meshed[0].shape:
+        # Not array-aware (math.sin, if/else on values): evaluate point by point
+        result = np.vectorize(func)(**grids)
+    grids["result"] = result
+    return grids
+
+
+def energy_drift(energy: np.ndarray, axis: Optional[int] = 0) -> np.ndarray:
+    """Largest relative deviation of a conserved quantity from its initial value"""
+    energy = np.asarray(energy, dtype=float)
+    initial = np.take(energy, [0], axis=axis)
+    return np.max(np.abs(energy - initial), axis=axis) / np.maximum(np.abs(np.squeeze(initial, axis=axis)), 1e-300)
+
+
+__all__ = ["rk4", "verlet", "pairwise_gravity", "grid", "point_charge_field", "sweep", "energy_drift", "K_E"]
@@ -0,0 +1,339 @@
+"""Persistent memoization of expensive SymPy operations
+
+``integrate``, ``solve``, ``simplify`` and ``dsolve`` often dominate math
+executions, and the same expressions come back across students. The
+preamble wraps these functions on the ``sympy`` module before binding its
+short names (``sp_integrate``, ``solve``, ``simplify``), so both
+``sp.integrate(...)`` and the pre-imported names are cached transparently.
+
+Calls are keyed by the ``srepr`` of their arguments (which includes symbol
+assumptions) plus the SymPy version. Results are kept as ``srepr`` text in a
+SQLite file shared by every sandbox process on the host, bounded in size by
+evicting the least recently used entries. Only calls that took longer than
+``min_seconds`` are stored, so trivial operations don't churn the store.
+Any failure of the cache falls back to calling SymPy directly.
+
+Sandboxes only read the file. New results and hits leave the process as
+marker lines carrying the executor's token, and the executor writes them
+(see parse_records and save_records). Entries are rebuilt by walking their
+text and calling whitelisted SymPy constructors, never by ``eval``.
+
+This module runs inside the execution subprocess, so it must only depend on
+the standard library and SymPy.
+"""
+import ast
+import functools
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Functions wrapped by install(); methods such as expr.simplify() are not cached
+CACHED_FUNCTIONS = ("integrate", "solve", "simplify", "dsolve")
+
+RECORD_MARKER = "@@EDU_SYMCACHE@@ "
+
+# Constructors that take string arguments (names and float digits); other
+# constructors may sympify strings, which parses them as code
+STRING_CONSTRUCTORS = {"Symbol", "Dummy", "Wild", "Function", "WildFunction", "Float", "Str"}
+
+# Overridden by the executor through configure()
+_config = {
+    "enabled": True,
+    "path": None,  # SQLite file; None disables the cache
+    "token": None,  # Records without the executor's token are ignored
+    "stream": "__stdout__",
+    "min_seconds": 0.05,  # Cheaper calls are not worth a write
+}
+
+stats = {"hits": 0, "misses": 0, "stored": 0, "saved_seconds": 0.0}
+
+_connection: Optional[sqlite3.Connection] = None
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def configure(**options) -> None:
+    """Update cache options (enabled, path, token, stream, min_seconds)"""
+    global _connection
+    if options.get("path") and options["path"] != _config["path"] and _connection is not None:
+        _connection.close()
+        _connection = None
+    _config.update({k: v for k, v in options.items() if v is not None})
+
+
+def install(module) -> None:
+    """Replace the cached functions on ``module`` (normally ``sympy``) with memoized versions"""
+    for name in CACHED_FUNCTIONS:
+        function = getattr(module, name, None)
+        if function is not None and not hasattr(function, "__wrapped__"):
+            setattr(module, name, memoize(function))
+
+
+def memoize(function: Callable) -> Callable:
+    """Wrap a SymPy function with the persistent cache"""
+    @functools.wraps(function)
+    def cached(*args, **kwargs):
+        try:
+            call = _call(function.__name__, args, kwargs)
+        except Exception:
+            call = None
+        try:
+            stored = _lookup(call)
+        except Exception:
+            stored = None  # e.g. nothing has been written yet
+        if stored is not None:
+            try:
+                value = _load(stored[0])
+                stats["hits"] += 1
+                stats["saved_seconds"] += stored[1]
+                _publish({"touch": _key(call)})
+                return value
+            except Exception:
+                pass
+
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        stats["misses"] += 1
+        if call is not None and elapsed >= _config["min_seconds"]:
+            try:
+                _publish({"call": call, "value": _dump(result), "seconds": elapsed})
+                stats["stored"] += 1
+            except Exception:
+                pass
+        return result
+    return cached
+
+
+def _canonical(value) -> str:
+    from sympy import Basic, srepr
+    from sympy.matrices import MatrixBase
+
+    if isinstance(value, (Basic, MatrixBase)):
+        return srepr(value)
+    if value is None or isinstance(value, (bool, int, float, complex, str)):
+        return repr(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_canonical(item) for item in value]
+        if isinstance(value, (set, frozenset)):
+            items.sort()
+        return f"{type(value).__name__}({', '.join(items)})"
+    if isinstance(value, dict):
+        items = sorted(f"{_canonical(k)}: {_canonical(v)}" for k, v in value.items())
+        return "{" + ", ".join(items) + "}"
+    raise _Uncacheable(type(value).__name__)  # e.g. lambdas, numpy arrays
+
+
+def _call(name: str, args, kwargs) -> Optional[str]:
+    """Text identifying a call; stored next to its result and hashed into the key"""
+    import sympy
+    from sympy.assumptions import global_assumptions
+
+    if not _config["enabled"] or not _config["path"] or not _config["token"] or global_assumptions:
+        return None  # Assumptions set with `assuming` are invisible to the key
+    return "|".join([sympy.__version__, name, _canonical(args), _canonical(kwargs)])
+
+
+def _key(call: str) -> str:
+    return hashlib.sha256(call.encode("utf-8")).hexdigest()
+
+
+def _dump(value) -> str:
+    """Python source rebuilding ``value`` from SymPy constructors"""
+    from sympy import Basic, srepr
+    from sympy.matrices import MatrixBase
+
+    if isinstance(value, (Basic, MatrixBase)):
+        return srepr(value)
+    if value is None or isinstance(value, (bool, int)):
+        return repr(value)
+    if isinstance(value, list):
+        return "[" + ", ".join(_dump(item) for item in value) + "]"
+    if isinstance(value, tuple):
+        return "(" + "".join(_dump(item) + ", " for item in value) + ")"
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{_dump(k)}: {_dump(v)}" for k, v in value.items()) + "}"
+    raise _Uncacheable(type(value).__name__)
+
+
+def _load(text: str):
+    """Rebuild a stored value; it must serialize back to exactly ``text``"""
+    value = _build(ast.parse(text, mode="eval").body)
+    if _dump(value) != text:
+        raise ValueError("Cache entry does not round-trip")
+    return value
+
+
+def _build(node: ast.AST, construct: bool = True):
+    """Evaluate literals, containers and calls of whitelisted SymPy constructors
+
+    With ``construct=False`` the text is only checked (the executor validates
+    records this way without building SymPy objects).
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float, str, type(None))):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) \
+            and isinstance(node.operand, ast.Constant) and type(node.operand.value) in (int, float):
+        return -node.operand.value
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_build(item, construct) for item in node.elts]
+        return (list(items) if isinstance(node, ast.List) else tuple(items)) if construct else None
+    if isinstance(node, ast.Dict) and None not in node.keys:
+        pairs = [(_build(k, construct), _build(v, construct)) for k, v in zip(node.keys, node.values)]
+        return dict(pairs) if construct else None
+    if isinstance(node, ast.Name) and node.id in _constructors():
+        return _constructors()[node.id] if construct else None
+    if isinstance(node, ast.Call):
+        # Function('f')(x) applies the class built by the inner call
+        name = node.func.id if isinstance(node.func, ast.Name) else None
+        if name is None and not (isinstance(node.func, ast.Call) and isinstance(node.func.func, ast.Name)
+                                 and node.func.func.id == "Function"):
+            raise ValueError("Unexpected callee in cache entry")
+        for arg in list(node.args) + [k.value for k in node.keywords]:
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and name not in STRING_CONSTRUCTORS:
+                raise ValueError("Unexpected string in cache entry")
+        if any(isinstance(arg, ast.Starred) for arg in node.args) or any(k.arg is None for k in node.keywords):
+            raise ValueError("Unexpected unpacking in cache entry")
+        constructor = _build(node.func, construct)
+        args = [_build(arg, construct) for arg in node.args]
+        kwargs = {k.arg: _build(k.value, construct) for k in node.keywords}
+        return constructor(*args, **kwargs) if construct else None
+    raise ValueError(f"Unexpected {type(node).__name__} in cache entry")
+
+
+@functools.lru_cache(maxsize=1)
+def _constructors() -> Dict[str, Any]:
+    """SymPy classes and singleton constants, by the names srepr uses"""
+    import sympy
+    from sympy import Basic, matrices
+    from sympy.matrices import MatrixBase
+
+    names = {name: getattr(sympy, name) for name in dir(sympy) if not name.startswith("_")}
+    names.update({name: getattr(matrices, name) for name in dir(matrices) if name.endswith("Matrix")})
+    names.update(Str=sympy.core.symbol.Str)
+    return {name: value for name, value in names.items()
+            if isinstance(value, Basic)
+            or (isinstance(value, type) and issubclass(value, (Basic, MatrixBase)))}
+
+
+def _publish(record: Dict[str, Any]) -> None:
+    record["token"] = _config["token"]
+    stream = getattr(sys, _config["stream"])
+    stream.write("\n" + RECORD_MARKER + json.dumps(record) + "\n")
+    stream.flush()
+
+
+def _db() -> sqlite3.Connection:
+    """Read-only connection; only the executor writes the file"""
+    global _connection
+    if _connection is None:
+        uri = Path(_config["path"]).resolve().as_uri() + "?mode=ro"
+        _connection = sqlite3.connect(uri, uri=True, timeout=1.0)
+    return _connection
+
+
+def _lookup(call: Optional[str]):
+    if call is None:
+        return None
+    row = _db().execute(
+        "SELECT value, compute_seconds, call FROM results WHERE key = ?", (_key(call),)
+    ).fetchone()
+    # A row answers only the exact call it was stored for
+    return row if row is not None and row[2] == call else None
+
+
+# Executor side -------------------------------------------------------------
+
+def parse_records(stdout: str, token: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """Split process output into user output and records carrying ``token``
+
+    Marker lines with another token are dropped too: they were printed by
+    user code.
+    """
+    if RECORD_MARKER not in stdout:
+        return stdout, []
+
+    lines = []
+    records = []
+    for line in stdout.split("\n"):
+        if not line.startswith(RECORD_MARKER):
+            lines.append(line)
+            continue
+        try:
+            record = json.loads(line[len(RECORD_MARKER):])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and record.get("token") == token:
+            records.append(record)
+        # Drop the blank separator written before the marker
+        if lines and lines[-1] == "":
+            lines.pop()
+    return "\n".join(lines), records
+
+
+def save_records(path: str, records: List[Dict[str, Any]], max_bytes: int) -> int:
+    """Write new results and hit times from ``records``; returns results stored"""
+    db = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+    try:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, call TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "compute_seconds REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        stored = 0
+        for record in records:
+            if isinstance(record.get("touch"), str):
+                db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), record["touch"]))
+            elif _valid_result(record, max_bytes):
+                _store(db, record["call"], record["value"], float(record["seconds"]), max_bytes)
+                stored += 1
+        return stored
+    finally:
+        db.close()
+
+
+def _valid_result(record: Dict[str, Any], max_bytes: int) -> bool:
+    call, value = record.get("call"), record.get("value")
+    if not isinstance(call, str) or not isinstance(value, str) \
+            or not isinstance(record.get("seconds"), (int, float)):
+        return False
+    if len(call) + len(value) > max_bytes // 10:
+        return False  # One giant result shouldn't flush the whole store
+    try:
+        _build(ast.parse(value, mode="eval").body, construct=False)
+        return True
+    except (SyntaxError, ValueError, RecursionError):
+        return False
+
+
+def _store(db: sqlite3.Connection, call: str, value: str, elapsed: float, max_bytes: int) -> None:
+    key = _key(call)
+    size = len(key) + len(call) + len(value)
+    db.execute(
+        "INSERT OR REPLACE INTO results (key, call, value, size, compute_seconds, last_used) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (key, call, value, size, elapsed, time.time())
+    )
+    total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+    if total > max_bytes:
+        _evict(db, total - int(max_bytes * 0.9))
+
+
+def _evict(db: sqlite3.Connection, excess: int) -> None:
+    """Drop least recently used entries until ``excess`` bytes are freed"""
+    victims, freed = [], 0
+    rows = db.execute("SELECT key, size FROM results ORDER BY last_used")
+    for key, size in rows:
+        if freed >= excess:
+            break
+        victims.append((key,))
+        freed += size
+    rows.close()
+    db.executemany("DELETE FROM results WHERE key = ?", victims)
@@ -0,0 +1,259 @@
+import inspect
+import io
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.plot_store import plot_store
+
+logger = logging.getLogger(__name__)
+
+
+def _number(parameters: Dict[str, Any], name: str, default: float) -> float:
+    try:
+        value = float(parameters.get(name, default))
+        return value if np.isfinite(value) else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _x_range(parameters: Dict[str, Any], default_start: float, default_end: float):
+    bounds = parameters.get("range")
+    try:
+        start, end = float(bounds[0]), float(bounds[1])
+        if np.isfinite(start) and np.isfinite(end) and start < end:
+            return start, end
+    except (TypeError, ValueError, IndexError):
+        pass
+    return default_start, default_end
+
+
+def _projectile(ax, parameters):
+    g = _number(parameters, "gravity", 9.81)
+    duration = _number(parameters, "time_duration", 10)
+    vx, vy = 10.0, 50.0
+    if "initial_velocity" in parameters:
+        v0 = _number(parameters, "initial_velocity", 50.0)
+        angle = np.radians(_number(parameters, "angle", 45.0))
+        vx, vy = v0 * np.cos(angle), v0 * np.sin(angle)
+    t = np.linspace(0, duration, 100)
+    ax.plot(vx * t, _number(parameters, "height", 0.0) + vy * t - 0.5 * g * t**2)
+    ax.set_title('Projectile Motion')
+    ax.set_xlabel('Horizontal Distance (m)')
+    ax.set_ylabel('Height (m)')
+
+
+def _pendulum(ax, parameters):
+    g = _number(parameters, "gravity", 9.81)
+    t = np.linspace(0, _number(parameters, "time_duration", 10), 1000)
+    ax.plot(t, 0.2 * np.cos(np.sqrt(g / 1.0) * t))
+    ax.set_title('Simple Pendulum Motion')
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Angle (rad)')
+
+
+def _wave(ax, parameters):
+    x = np.linspace(0, 4 * np.pi, 1000)
+    ax.plot(x, np.sin(x))
+    ax.set_title('Simple Wave')
+    ax.set_xlabel('Position')
+    ax.set_ylabel('Amplitude')
+
+
+def _generic_physics(ax, parameters):
+    x = np.linspace(0, 10, 100)
+    ax.plot(x, x**2)
+    ax.set_title('Physics Visualization')
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+
+
+def _derivative(ax, parameters):
+    x = np.linspace(*_x_range(parameters, -5, 5), 1000)
+    ax.plot(x, x**2, label='f(x) = x²')
+    ax.plot(x, 2 * x, label="f'(x) = 2x")
+    ax.set_title(parameters.get("title") or 'Function and Derivative')
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+    ax.legend()
+
+
+def _integral(ax, parameters):
+    x = np.linspace(*_x_range(parameters, 0, 5), 1000)
+    y = x**2
+    ax.plot(x, y, label='f(x) = x²')
+    ax.fill_between(x[:500], y[:500], alpha=0.3, label='Integral area')
+    ax.set_title(parameters.get("title") or 'Function and Integral')
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+    ax.legend()
+
+
+def _function(ax, parameters):
+    x = np.linspace(*_x_range(parameters, -10, 10), 1000)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.sin(x) / x
+    y[x == 0] = 1  # Handle division by zero
+    ax.plot(x, y)
+    ax.set_title(parameters.get("title") or 'Mathematical Function')
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+
+
+def _generic_math(ax, parameters):
+    x = np.linspace(*_x_range(parameters, -5, 5), 1000)
+    ax.plot(x, np.exp(-x**2))
+    ax.set_title(parameters.get("title") or 'Mathematical Visualization')
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+
+
+# Built-in scenarios of physics_simulate and math_visualize ("default" catches the rest)
+PHYSICS_SCENARIOS: Dict[str, Callable] = {
+    "projectile_motion": _projectile,
+    "pendulum": _pendulum,
+    "wave": _wave,
+    "default": _generic_physics,
+}
+
+MATH_CONCEPTS: Dict[str, Callable] = {
+    "derivative": _derivative,
+    "integral": _integral,
+    "function": _function,
+    "default": _generic_math,
+}
+
+
+class TemplateRenderer:
+    """Trusted in-process renderer for the built-in tool templates
+
+    The template scenarios are fixed NumPy computations, so there is nothing
+    to sandbox: they are drawn straight onto an Agg canvas in the API process
+    and memoized per (scenario, parameters, render options). Plot URLs are
+    immutable, so a memo hit returns the already stored plot.
+    """
+
+    def __init__(self, cache_size: int = 128):
+        self.cache_size = cache_size
+        self.plot_store = plot_store
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, tool: str, scenario: str, parameters: Optional[Dict[str, Any]] = None,
+               render_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Render a built-in scenario and return an executor-shaped result"""
+        cached = self.cached(tool, scenario, parameters, render_options)
+        if cached is not None:
+            return cached
+
+        name, draw = self._select(tool, scenario)
+        parameters = parameters or {}
+        render_options = render_options or {}
+        result = {
+            "success": True,
+            "output": "",
+            "error": "",
+            "plots": [self._draw(draw, parameters, render_options)],
+            "renderer": "in_process"
+        }
+        with self._lock:
+            self._cache[self._key(tool, name, parameters, render_options)] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return {**result, "plots": [dict(p) for p in result["plots"]]}
+
+    def cached(self, tool: str, scenario: str, parameters: Optional[Dict[str, Any]] = None,
+               render_options: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Memoized result whose plot files still exist, if any"""
+        name, _ = self._select(tool, scenario)
+        key = self._key(tool, name, parameters or {}, render_options or {})
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None or not self._still_stored(cached):
+                return None
+            self._cache.move_to_end(key)
+            return {**cached, "plots": [dict(p) for p in cached["plots"]]}
+
+    def sandbox_code(self, tool: str, scenario: str, parameters: Optional[Dict[str, Any]] = None) -> str:
+        """The same scenario as a sandbox script, for when the fast path is off or fails
+
+        The script carries the source of the drawing function itself, so
+        both paths interpret ``parameters`` identically.
+        """
+        _, draw = self._select(tool, scenario)
+        helpers = "\n\n".join(inspect.getsource(f) for f in (_number, _x_range, draw))
+        return f"""from typing import Any, Dict
+
+{helpers}
+
+fig, ax = plt.subplots(figsize=(10, 6))
+{draw.__name__}(ax, {parameters or {}!r})
+ax.grid(True)
+plt.show()
+"""
+
+    @staticmethod
+    def _select(tool: str, scenario: str):
+        scenarios = PHYSICS_SCENARIOS if tool == "physics_simulate" else MATH_CONCEPTS
+        name = scenario if scenario in scenarios else "default"
+        return name, scenarios[name]
+
+    @staticmethod
+    def _key(tool: str, name: str, parameters: Dict[str, Any], render_options: Dict[str, Any]) -> str:
+        return json.dumps([tool, name, parameters, render_options], sort_keys=True, default=str)
+
+    def warm_up(self) -> None:
+        """Import matplotlib and build the font cache before the first request"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=(2, 2))
+        FigureCanvasAgg(fig)
+        _generic_math(fig.add_subplot(), {})
+        fig.canvas.draw()
+
+    def _draw(self, draw: Callable, parameters: Dict[str, Any],
+              render_options: Dict[str, Any]) -> Dict[str, Any]:
+        # Imported lazily: only these tools need matplotlib in the API process
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=(10, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        draw(ax, parameters)
+        ax.grid(True)
+        fig.tight_layout()
+
+        fmt = render_options.get("format") or settings.plot_format
+        if fmt not in ("png", "webp", "svg"):
+            fmt = "png"
+        dpi = float(render_options.get("dpi") or settings.plot_dpi)
+        if render_options.get("target_width"):
+            fitted = render_options["target_width"] / fig.get_size_inches()[0]
+            dpi = max(float(render_options.get("min_dpi") or settings.plot_min_dpi), min(dpi, fitted))
+
+        options = {"format": fmt, "dpi": dpi, "facecolor": "white", "edgecolor": "none"}
+        if fmt == "webp":
+            options["pil_kwargs"] = {"quality": 85, "method": 4}
+        buffer = io.BytesIO()
+        fig.savefig(buffer, **options)
+
+        width, height = fig.get_size_inches() * dpi
+        return self.plot_store.save(buffer.getvalue(), fmt, "static",
+                                    width=int(round(width)), height=int(round(height)))
+
+    def _still_stored(self, result: Dict[str, Any]) -> bool:
+        return all(
+            (self.plot_store.plots_dir / p["url"].rsplit("/", 1)[-1]).exists()
+            for p in result["plots"]
+        )
+
+
+# Global instance
+template_renderer = TemplateRenderer()
@@ -0,0 +1,153 @@
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional
+
+
+class CodeValidator:
+    """Single-pass AST pre-flight validator for sandboxed code
+
+    Code is parsed once and every import, call and attribute access is
+    checked against allow/deny lists, so harmless identifiers such as
+    ``evaluate`` pass while ``getattr(x, '__globals__')`` does not. Syntax
+    errors are reported with line numbers before any process is spawned.
+    Results are cached by code hash so repeated submissions are validated
+    only once.
+    """
+
+    # Attributes that expose interpreter internals or the OS. Dunder
+    # attributes are rejected wholesale (see SAFE_DUNDER_ATTRIBUTES)
+    FORBIDDEN_ATTRIBUTES = {
+        'f_globals', 'f_locals', 'f_back', 'gi_frame', 'cr_frame', 'tb_frame',
+        # Process and module access reachable through allowed libraries,
+        # e.g. np.os.system(...) or matplotlib.sys.modules['os']
+        'os', 'sys', 'subprocess', 'system', 'popen', 'modules', 'builtins',
+        # File access through io, e.g. io.FileIO(...)
+        'FileIO', 'open_code'
+    }
+
+    # Dunders that classes written by user code legitimately touch
+    SAFE_DUNDER_ATTRIBUTES = {'__init__', '__name__', '__doc__', '__qualname__'}
+
+    # Builtins also reachable as attributes, e.g. print.__self__.eval or io.open
+    FORBIDDEN_BUILTIN_ATTRIBUTES = {'eval', 'exec', 'open', '__import__', 'compile'}
+
+    # Module attributes sharing a builtin's name but harmless
+    SAFE_MODULE_ATTRIBUTES = {('re', 'compile')}
+
+    # Modules the preamble itself imports; user code must not name them
+    FORBIDDEN_NAMES = {'os', 'sys', 'subprocess', 'builtins'}
+
+    def __init__(self, allowed_imports: Iterable[str], forbidden_calls: Iterable[str],
+                 cache_size: int = 256):
+        self.allowed_imports = set(allowed_imports)
+        self.forbidden_calls = set(forbidden_calls)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def code_hash(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    def validate(self, code: str) -> Dict[str, Any]:
+        """Return {"safe", "reason", "line", "syntax_error", "code_hash"} for ``code``"""
+        key = self.code_hash(code)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        result = self._analyze(code)
+        result["code_hash"] = key
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def check_syntax(self, code: str) -> Dict[str, Any]:
+        """Syntax-only view of the validation result"""
+        result = self.validate(code)
+        if result.get("syntax_error"):
+            return {"valid": False, "error": result["reason"]}
+        return {"valid": True, "error": None}
+
+    def _analyze(self, code: str) -> Dict[str, Any]:
+        try:
+            tree = ast.parse(code, filename="<user_code>")
+        except SyntaxError as e:
+            return self._syntax_error(e)
+
+        for node in ast.walk(tree):
+            reason = self._check_node(node)
+            if reason:
+                line = getattr(node, "lineno", None)
+                return {
+                    "safe": False,
+                    "reason": f"{reason} (line {line})" if line else reason,
+                    "line": line,
+                    "syntax_error": False
+                }
+
+        # Some errors (e.g. 'return' outside function) only surface at compile time
+        try:
+            compile(tree, "<user_code>", "exec")
+        except SyntaxError as e:
+            return self._syntax_error(e)
+
+        return {
+            "safe": True,
+            "reason": "Code passed safety checks",
+            "line": None,
+            "syntax_error": False
+        }
+
+    def _check_node(self, node: ast.AST) -> Optional[str]:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] not in self.allowed_imports:
+                    return f"Import of module '{alias.name}' is not allowed"
+        elif isinstance(node, ast.ImportFrom):
+            if node.level or not node.module:
+                return "Relative imports are not allowed"
+            if node.module.split(".")[0] not in self.allowed_imports:
+                return f"Import of module '{node.module}' is not allowed"
+            for alias in node.names:
+                if self._forbidden_attribute(alias.name):
+                    return f"Import of '{alias.name}' from '{node.module}' is not allowed"
+        elif isinstance(node, ast.Name):
+            if node.id in self.forbidden_calls or node.id in self.FORBIDDEN_NAMES:
+                return f"Use of '{node.id}' is not allowed"
+        elif isinstance(node, ast.Attribute):
+            owner = node.value.id if isinstance(node.value, ast.Name) else None
+            if (owner, node.attr) not in self.SAFE_MODULE_ATTRIBUTES and self._forbidden_attribute(node.attr):
+                return f"Access to attribute '{node.attr}' is not allowed"
+        elif isinstance(node, ast.Call):
+            # getattr(obj, "__globals__") and friends reach internals by name
+            if isinstance(node.func, ast.Name) and node.func.id in ("getattr", "setattr", "delattr", "hasattr"):
+                if len(node.args) < 2:
+                    return None
+                name = node.args[1]
+                if not (isinstance(name, ast.Constant) and isinstance(name.value, str)):
+                    if node.func.id != "hasattr":
+                        return f"{node.func.id}() needs a literal attribute name"
+                elif name.value.startswith("__") or self._forbidden_attribute(name.value):
+                    return f"Access to attribute '{name.value}' is not allowed"
+        return None
+
+    def _forbidden_attribute(self, name: str) -> bool:
+        if name.startswith("__") and name.endswith("__") and name not in self.SAFE_DUNDER_ATTRIBUTES:
+            return True
+        return name in self.FORBIDDEN_ATTRIBUTES or name in self.FORBIDDEN_BUILTIN_ATTRIBUTES
+
+    @staticmethod
+    def _syntax_error(error: SyntaxError) -> Dict[str, Any]:
+        return {
+            "safe": False,
+            "reason": f"Syntax error: {error.msg} (line {error.lineno})",
+            "line": error.lineno,
+            "syntax_error": True
+        }
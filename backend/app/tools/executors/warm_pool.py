@@ -0,0 +1,211 @@
+import logging
+import subprocess
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.core.metrics import metrics
+from app.tools.executors.sandbox.channel import new_nonce
+
+logger = logging.getLogger(__name__)
+
+warm_acquires = metrics.counter(
+    "sandbox_warm_acquires_total", "Sandbox workers handed out by whether one was pre-started")
+
+# Appended to the preamble: block until the executor sends commands on stdin.
+# "import <module>" primes modules while the code is still being generated;
+# "run <path>" executes the job script in the preamble's namespace.
+_WAIT_FOR_JOB = """
+# === WARM WORKER: wait for the job ===
+import importlib as _importlib
+while True:
+    _command = sys.stdin.readline()
+    if not _command:
+        sys.exit(0)
+    _verb, _, _argument = _command.strip().partition(" ")
+    if _verb == "import":
+        try:
+            _importlib.import_module(_argument)
+        except Exception:
+            pass
+    elif _verb == "run":
+        _job_started = _perf_counter()
+        break
+with open(_argument, encoding="utf-8") as _job_file:
+    _job_code = compile(_job_file.read(), _argument, "exec")
+del _command, _verb, _argument, _job_file
+exec(_job_code, globals())
+"""
+
+
+class WarmWorker:
+    """A sandbox process that has loaded the preamble and waits for one job
+
+    Workers are single-use, like cold runs: each job still gets a fresh
+    process, only the interpreter start and library imports happen ahead
+    of time.
+    """
+
+    def __init__(self, process: subprocess.Popen, channel_nonce: str):
+        self.process = process
+        self.channel_nonce = channel_nonce
+        self.started_at = time.monotonic()
+        self.deadline: Optional[float] = None
+        self._run_started: Optional[float] = None
+        self._timeout: Optional[float] = None
+        self._primed = set()
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def prime(self, modules: Iterable[str]) -> None:
+        """Import modules ahead of the job (ignored once the job was sent)"""
+        with self._lock:
+            if self.deadline is not None or not self.alive:
+                return
+            commands = "".join(f"import {m}\n" for m in modules if m not in self._primed)
+            if not commands:
+                return
+            try:
+                self.process.stdin.write(commands)
+                self.process.stdin.flush()
+                self._primed.update(modules)
+            except (BrokenPipeError, OSError):
+                pass
+
+    def set_timeout(self, timeout: float) -> None:
+        """Override the job timeout, measured from when the job was sent
+
+        May arrive before or after ``run``; a running job's deadline moves.
+        """
+        with self._lock:
+            self._timeout = timeout
+            if self._run_started is not None:
+                self.deadline = self._run_started + timeout
+
+    def run(self, job_path: Path, timeout: float) -> subprocess.CompletedProcess:
+        """Send the job and wait for the process to finish"""
+        with self._lock:
+            self._run_started = time.monotonic()
+            self.deadline = self._run_started + (self._timeout or timeout)
+        command = f"run {job_path}\n"
+        while True:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                self.process.kill()
+                try:
+                    stdout, stderr = self.process.communicate(timeout=5)
+                except (subprocess.TimeoutExpired, ValueError, OSError):
+                    stdout = stderr = None
+                raise subprocess.TimeoutExpired(self.process.args, round(self.deadline - self._run_started),
+                                                output=stdout, stderr=stderr)
+            try:
+                stdout, stderr = self.process.communicate(input=command, timeout=min(remaining, 0.5))
+                return subprocess.CompletedProcess(self.process.args, self.process.returncode,
+                                                   stdout, stderr)
+            except subprocess.TimeoutExpired:
+                command = None  # Input is sent only once; retrying loses no output
+
+    def kill(self) -> None:
+        if self.alive:
+            self.process.kill()
+        try:
+            self.process.communicate(timeout=5)
+        except (subprocess.TimeoutExpired, ValueError, OSError):
+            pass
+
+
+class WarmPool:
+    """Keeps a few sandbox processes booted with the scientific preamble
+
+    Interpreter start plus the numpy/matplotlib/scipy/sympy imports dominate
+    short executions; taking a pre-started worker removes them from the
+    request path. The pool refills in the background as workers are used.
+    """
+
+    def __init__(self, executor, size: int = 2):
+        self.executor = executor
+        self.size = size
+        self.active = False
+        self._idle: "deque[WarmWorker]" = deque()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Begin keeping ``size`` workers ready"""
+        if self.size <= 0:
+            return
+        self.active = True
+        self._refill()
+        logger.info(f"🔥 Sandbox warm pool started with {self.size} workers")
+
+    def shutdown(self) -> None:
+        self.active = False
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for worker in idle:
+            worker.kill()
+
+    def acquire(self) -> Optional[WarmWorker]:
+        """Take a pre-started worker (None when the pool is inactive)"""
+        if not self.active:
+            return None
+        worker = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.popleft()
+                if candidate.alive:
+                    worker = candidate
+                    break
+        warm_acquires.inc(warm=str(worker is not None).lower())
+        if worker is None:
+            worker = self.spawn()
+        self._refill()
+        return worker
+
+    def release(self, worker: WarmWorker) -> None:
+        """Return an unused worker, e.g. after an abandoned speculation"""
+        with self._lock:
+            if self.active and worker.alive and worker.deadline is None and len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        worker.kill()
+
+    def run(self, job_code: str, timeout: float,
+            worker: Optional[WarmWorker] = None) -> subprocess.CompletedProcess:
+        """Run a job script (see PythonExecutor._build_job) on a warm worker"""
+        worker = worker or self.acquire() or self.spawn()
+        try:
+            job_path = self.executor._materialize_script(job_code).with_suffix(".py")
+        except Exception:
+            worker.kill()
+            raise
+        return worker.run(job_path, timeout)
+
+    def _refill(self) -> None:
+        while self.active:
+            with self._lock:
+                if len(self._idle) >= self.size:
+                    return
+            worker = self.spawn()
+            with self._lock:
+                self._idle.append(worker)
+
+    def spawn(self) -> WarmWorker:
+        """Start a worker outside the pool (it boots in the background)"""
+        bootstrap = self.executor._build_preamble() + _WAIT_FOR_JOB
+        nonce = new_nonce()
+        process = subprocess.Popen(
+            ['python', str(self.executor._materialize_script(bootstrap))],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=self.executor.output_dir,
+            env=self.executor._get_safe_environment(nonce)
+        )
+        return WarmWorker(process, nonce)
@@ -1,15 +1,50 @@
+import asyncio
 import json
 import logging
 from pathlib import Path
-from typing import Dict, Any, List
-from anthropic.types import ToolUseBlock
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 
+from app.core.config import settings
+from app.services.result_cache import execution_cache, execution_cache_key, is_deterministic
 from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.kernel_executor import KernelExecutor
+from app.tools.executors.template_renderer import template_renderer
+from app.tools.scheduler import execution_scheduler, client_key
+from app.tools.speculation import Speculation
+from app.tools.executors.remote_executor import (
+    RemoteExecutor, ExecutionWorker, InProcessBroker, create_broker
+)
+
+if TYPE_CHECKING:
+    from anthropic.types import ToolUseBlock
 
 logger = logging.getLogger(__name__)
 
 # Tool instances
 python_executor = PythonExecutor()
+kernel_executor = KernelExecutor(
+    python_executor,
+    max_sessions=settings.kernel_max_sessions,
+    idle_ttl=settings.kernel_idle_ttl,
+    max_memory_mb=settings.kernel_max_memory_mb
+)
+remote_executor = None
+local_execution_worker = None
+if settings.execution_backend == "queue":
+    remote_executor = RemoteExecutor(python_executor, create_broker(),
+                                     queue_grace=settings.execution_queue_grace)
+    if isinstance(remote_executor.broker, InProcessBroker):
+        # Without a shared broker, consume the queue from this process
+        local_execution_worker = ExecutionWorker(remote_executor.broker, PythonExecutor())
+        local_execution_worker.start_background(settings.execution_worker_concurrency)
+
+def create_speculation(model_info: Dict[str, str] = None) -> Optional[Speculation]:
+    """Speculation for a streamed model call, when python_execute runs locally"""
+    if not settings.speculative_execution or remote_executor is not None:
+        return None
+    if settings.execution_backend == "kernel" and (model_info or {}).get("session_id"):
+        return None
+    return Speculation(python_executor, model_info)
 
 def load_tool_schema(schema_name: str) -> Dict[str, Any]:
     """Load tool schema from JSON file"""
@@ -21,37 +56,44 @@ def load_tool_schema(schema_name: str) -> Dict[str, Any]:
         logger.error(f"Failed to load tool schema {schema_name}: {e}")
         return {}
 
-def get_all_tool_schemas() -> List[Dict[str, Any]]:
-    """Get all available tool schemas (excluding knowledge_search)"""
+# Tools whose result is a fixed instruction payload; they can be resolved
+# locally instead of costing the model a round-trip
+SIGNAL_TOOLS = {"education_context"}
+
+def get_all_tool_schemas(exclude: Optional[set] = None) -> List[Dict[str, Any]]:
+    """Get all available tool schemas"""
     tool_names = [
         "education_context",
         "python_execute", 
         "physics_simulate",
         "math_visualize"
     ]
+    if settings.knowledge_search_enabled:
+        tool_names.append("knowledge_search")
     
     schemas = []
     for tool_name in tool_names:
+        if exclude and tool_name in exclude:
+            continue
         schema = load_tool_schema(tool_name)
         if schema:
             schemas.append(schema)
-            logger.info(f"✅ Loaded tool schema: {tool_name}")
+            logger.debug(f"✅ Loaded tool schema: {tool_name}")
         else:
             logger.warning(f"❌ Failed to load tool schema: {tool_name}")
     
-    logger.info(f"📦 Total loaded tools: {len(schemas)}")
+    logger.debug(f"📦 Total loaded tools: {len(schemas)}")
     return schemas
 
-async def use_tool(tool_use_content: ToolUseBlock, model_info: Dict[str, str] = None) -> Any:
+async def use_tool(tool_use_content: "ToolUseBlock", model_info: Dict[str, str] = None) -> Any:
     """Execute tool based on tool use content"""
     tool_name = tool_use_content.name
     tool_input = tool_use_content.input
     
     logger.info(f"🔧 Executing tool: {tool_name}")
     if model_info:
-        logger.info(f"🤖 Agent Model: {model_info.get('agent_model', 'unknown')}")
-        logger.info(f"🔧 Tool Backend: {tool_name}")
-        logger.info(f"📊 Tool Call Context: {model_info.get('context', 'unknown')}")
+        logger.debug(f"🤖 Agent Model: {model_info.get('agent_model', 'unknown')}, "
+                     f"Tool Call Context: {model_info.get('context', 'unknown')}")
     
     # Route to appropriate tool function
     if tool_name == "education_context":
@@ -62,6 +104,8 @@ async def use_tool(tool_use_content: ToolUseBlock, model_info: Dict[str, str] =
         return await _simulate_physics(tool_input, model_info)
     elif tool_name == "math_visualize":
         return await _visualize_math(tool_input, model_info)
+    elif tool_name == "knowledge_search":
+        return await _search_knowledge(tool_input, model_info)
     else:
         logger.error(f"Unknown tool: {tool_name}")
         return {
@@ -114,19 +158,58 @@ async def _execute_python_code(tool_input: Dict[str, Any], model_info: Dict[str,
     include_plots = tool_input.get("include_plots", True)
     timeout = tool_input.get("timeout", 30)
     user_intent = tool_input.get("user_intent", "")
+    profile = tool_input.get("profile", False)
     
     if not code.strip():
         return {"error": "Code cannot be empty", "success": False}
     
+    session_id = (model_info or {}).get("session_id")
+    client = client_key(model_info)
+    
     try:
-        result = python_executor.execute_code(
-            code=code,
-            include_plots=include_plots,
-            timeout=timeout,
-            user_intent=user_intent,
-            model_info=model_info
-        )
+        # Persistent kernels keep variables from earlier turns of the same session
+        if settings.execution_backend == "kernel" and session_id and kernel_executor.available:
+            async with execution_scheduler.slot(client, code, timeout):
+                result = await asyncio.to_thread(kernel_executor.execute_code,
+                    code=code,
+                    session_id=session_id,
+                    include_plots=include_plots,
+                    timeout=timeout,
+                    user_intent=user_intent,
+                    model_info=model_info,
+                    render_options=(model_info or {}).get("render_options")
+                )
+            if profile:
+                # The profiler reports at process exit and interrupts the main thread at the
+                # deadline, neither of which fits a kernel that outlives the run
+                logger.warning(f"⚠️ Profiling is not supported on the kernel backend (session {session_id})")
+                result["profile"] = {"unavailable": "profiling is not supported on the persistent "
+                                                    "kernel backend; the code ran without it"}
+            return result
         
+        # Stateless runs of identical deterministic code (e.g. pre-warmed curriculum) reuse the
+        # stored result (profiled runs always execute: the timings are the point)
+        cacheable = not profile and is_deterministic(code)
+        cache_key = execution_cache_key(code, include_plots, (model_info or {}).get("render_options"))
+        cached = await asyncio.to_thread(execution_cache.get, cache_key) if cacheable else None
+        if cached is not None:
+            return cached
+        
+        # Queued jobs run on separate compute workers
+        executor = remote_executor if remote_executor is not None else python_executor
+        async with execution_scheduler.slot(client, code, timeout):
+            result = await asyncio.to_thread(executor.execute_code,
+                code=code,
+                include_plots=include_plots,
+                timeout=timeout,
+                user_intent=user_intent,
+                model_info=model_info,
+                render_options=(model_info or {}).get("render_options"),
+                profile=profile
+            )
+        
+        if result.get("success") and cacheable:
+            await asyncio.to_thread(execution_cache.put, cache_key, result)
         return result
     
     except Exception as e:
@@ -138,6 +221,26 @@ async def _execute_python_code(tool_input: Dict[str, Any], model_info: Dict[str,
             "plots": []
         }
 
+async def _search_knowledge(tool_input: Dict[str, Any], model_info: Dict[str, str] = None) -> Dict[str, Any]:
+    """Retrieve reference passages from the local knowledge index"""
+    query = tool_input.get("query", "")
+    top_k = tool_input.get("top_k", settings.knowledge_top_k)
+    
+    if not query.strip():
+        return {"error": "Query cannot be empty", "success": False}
+    if not isinstance(top_k, int) or top_k < 1:
+        top_k = settings.knowledge_top_k
+    
+    # Loaded on first use: the index pulls in numpy and the embedder
+    from app.services.knowledge_base import knowledge_base
+    try:
+        passages = await asyncio.to_thread(knowledge_base.search, query, min(top_k, 8))
+        logger.info(f"📚 Knowledge search '{query[:50]}' returned {len(passages)} passages")
+        return {"success": True, "query": query, "passages": passages}
+    except Exception as e:
+        logger.error(f"Knowledge search failed: {e}")
+        return {"error": str(e), "success": False}
+
 async def _simulate_physics(tool_input: Dict[str, Any], model_info: Dict[str, str] = None) -> Dict[str, Any]:
     """Physics simulation - simplified, let AI decide the approach"""
     scenario = tool_input.get("scenario", "")
@@ -150,17 +253,13 @@ async def _simulate_physics(tool_input: Dict[str, Any], model_info: Dict[str, st
     if not scenario.strip():
         return {"error": "Scenario cannot be empty", "success": False}
     
+    fast_result = await _render_template("physics_simulate", scenario, parameters, model_info)
+    if fast_result is not None:
+        return fast_result
+    
     try:
-        # Simple mapping - let AI handle the complexity
-        code_templates = {
-            "projectile_motion": _get_simple_projectile_template(),
-            "pendulum": _get_simple_pendulum_template(),
-            "wave": _get_simple_wave_template(),
-            "default": _get_generic_physics_template()
-        }
-        
-        template = code_templates.get(scenario, code_templates["default"])
-        code = template.format(**parameters) if parameters else template
+        # The same drawing code the fast path uses, run in the sandbox
+        code = template_renderer.sandbox_code("physics_simulate", scenario, parameters)
         
         # Execute using python_execute
         return await _execute_python_code({
@@ -185,17 +284,13 @@ async def _visualize_math(tool_input: Dict[str, Any], model_info: Dict[str, str]
     if not concept.strip():
         return {"error": "Concept cannot be empty", "success": False}
     
+    fast_result = await _render_template("math_visualize", concept, parameters, model_info)
+    if fast_result is not None:
+        return fast_result
+    
     try:
-        # Simple templates - let AI provide the sophistication
-        code_templates = {
-            "derivative": _get_simple_derivative_template(),
-            "integral": _get_simple_integral_template(),
-            "function": _get_simple_function_template(),
-            "default": _get_generic_math_template()
-        }
-        
-        template = code_templates.get(concept, code_templates["default"])
-        code = template.format(**parameters) if parameters else template
+        # The same drawing code the fast path uses, run in the sandbox
+        code = template_renderer.sandbox_code("math_visualize", concept, parameters)
         
         return await _execute_python_code({
             "code": code,
@@ -207,164 +302,24 @@ async def _visualize_math(tool_input: Dict[str, Any], model_info: Dict[str, str]
         logger.error(f"Math visualization failed: {e}")
         return {"error": str(e), "success": False}
 
-def _get_simple_projectile_template() -> str:
-    """Simple projectile motion template"""
-    return """
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Simple projectile motion simulation
-t = np.linspace(0, 10, 100)
-x = 10 * t
-y = 50 * t - 0.5 * 9.81 * t**2
-
-plt.figure(figsize=(10, 6))
-plt.plot(x, y)
-plt.title('Projectile Motion')
-plt.xlabel('Horizontal Distance (m)')
-plt.ylabel('Height (m)')
-plt.grid(True)
-plt.show()
-"""
-
-def _get_simple_pendulum_template() -> str:
-    """Simple pendulum template"""
-    return """
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Simple pendulum motion
-t = np.linspace(0, 10, 1000)
-theta = 0.2 * np.cos(np.sqrt(9.81/1.0) * t)
-
-plt.figure(figsize=(10, 6))
-plt.plot(t, theta)
-plt.title('Simple Pendulum Motion')
-plt.xlabel('Time (s)')
-plt.ylabel('Angle (rad)')
-plt.grid(True)
-plt.show()
-"""
-
-def _get_simple_wave_template() -> str:
-    """Simple wave template"""
-    return """
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Simple wave
-x = np.linspace(0, 4*np.pi, 1000)
-y = np.sin(x)
-
-plt.figure(figsize=(10, 6))
-plt.plot(x, y)
-plt.title('Simple Wave')
-plt.xlabel('Position')
-plt.ylabel('Amplitude')
-plt.grid(True)
-plt.show()
-"""
-
-def _get_generic_physics_template() -> str:
-    """Generic physics template"""
-    return """
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Generic physics visualization
-x = np.linspace(0, 10, 100)
-y = x**2
-
-plt.figure(figsize=(10, 6))
-plt.plot(x, y)
-plt.title('Physics Visualization')
-plt.xlabel('X')
-plt.ylabel('Y')
-plt.grid(True)
-plt.show()
-"""
-
-def _get_simple_derivative_template() -> str:
-    """Simple derivative template"""
-    return """
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Function and its derivative
-x = np.linspace(-5, 5, 1000)
-f = x**2
-df = 2*x
-
-plt.figure(figsize=(10, 6))
-plt.plot(x, f, label='f(x) = x²')
-plt.plot(x, df, label="f'(x) = 2x")
-plt.title('Function and Derivative')
-plt.xlabel('x')
-plt.ylabel('y')
-plt.legend()
-plt.grid(True)
-plt.show()
-"""
-
-def _get_simple_integral_template() -> str:
-    """Simple integral template"""
-    return """
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Function and area under curve
-x = np.linspace(0, 5, 1000)
-y = x**2
-
-plt.figure(figsize=(10, 6))
-plt.plot(x, y, label='f(x) = x²')
-plt.fill_between(x[:500], y[:500], alpha=0.3, label='Integral area')
-plt.title('Function and Integral')
-plt.xlabel('x')
-plt.ylabel('y')
-plt.legend()
-plt.grid(True)
-plt.show()
-"""
-
-def _get_simple_function_template() -> str:
-    """Simple function template"""
-    return """
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Simple function
-x = np.linspace(-10, 10, 1000)
-y = np.sin(x)/x
-y[x==0] = 1  # Handle division by zero
-
-plt.figure(figsize=(10, 6))
-plt.plot(x, y)
-plt.title('Mathematical Function')
-plt.xlabel('x')
-plt.ylabel('y')
-plt.grid(True)
-plt.show()
-"""
-
-def _get_generic_math_template() -> str:
-    """Generic math template"""
-    return """
-import numpy as np
-import matplotlib.pyplot as plt
-
-# Generic mathematical visualization
-x = np.linspace(-5, 5, 1000)
-y = np.exp(-x**2)
-
-plt.figure(figsize=(10, 6))
-plt.plot(x, y)
-plt.title('Mathematical Visualization')
-plt.xlabel('x')
-plt.ylabel('y')
-plt.grid(True)
-plt.show()
-"""
+async def _render_template(tool: str, scenario: str, parameters: Dict[str, Any],
+                           model_info: Dict[str, str] = None) -> Optional[Dict[str, Any]]:
+    """Render a built-in template in-process; None falls back to the sandbox"""
+    if not settings.template_fast_path:
+        return None
+    render_options = (model_info or {}).get("render_options")
+    try:
+        cached = template_renderer.cached(tool, scenario, parameters, render_options)
+        if cached is not None:
+            return cached
+        # Rendering takes a few hundred ms of CPU: keep it off the event loop and count it
+        # against the same execution slots as sandbox runs
+        async with execution_scheduler.slot(client_key(model_info), f"template:{tool}:{scenario}"):
+            return await asyncio.to_thread(template_renderer.render, tool, scenario, parameters,
+                                           render_options)
+    except Exception as e:
+        logger.warning(f"In-process template rendering failed, using sandbox: {e}")
+        return None
 
 def get_tool_info() -> Dict[str, Any]:
     """Get information about available tools"""
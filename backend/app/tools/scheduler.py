@@ -0,0 +1,212 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.idempotency import fingerprint
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+queue_wait = metrics.histogram(
+    "execution_slot_wait_seconds", "Time code executions waited for a slot by cost class")
+queued_jobs = metrics.gauge(
+    "execution_slot_queue_depth", "Code executions waiting for a slot by cost class")
+
+# Numbers and whitespace are ignored when matching code to earlier runs, so
+# a re-run with other parameters is estimated from its predecessor
+_NUMBER_PATTERN = re.compile(r"\b\d+(?:\.\d*)?(?:[eE][-+]?\d+)?\b")
+_ANIMATION_PATTERN = re.compile(r"FuncAnimation|ArtistAnimation|save_animation|capture_frame|mimsave")
+
+
+class _Ticket:
+    def __init__(self, client: str, cost_class: str, cost: float, finish: float, similar: str):
+        self.client = client
+        self.cost_class = cost_class
+        self.cost = cost
+        self.finish = finish
+        self.similar = similar
+        self.enqueued = time.monotonic()
+        self.started: Optional[float] = None
+        self.future: Optional[asyncio.Future] = None
+
+
+class ExecutionScheduler:
+    """Fair-share admission of code executions to a fixed number of slots
+
+    Each job is costed from the measured runtime of similar code (falling
+    back to its requested timeout, with animations assumed heavy) and
+    classified as short or long. Within a class, self-clocked weighted fair
+    queuing orders jobs by a per-client virtual finish time, so a client
+    submitting many or expensive jobs is served after clients who asked
+    for less. Short jobs are dispatched before queued long ones, and long
+    jobs never hold the last slot, so a quick plot doesn't wait behind a
+    classroom's animations; long jobs waiting past ``aging_seconds`` regain
+    priority so they can't starve.
+
+    Slots and fairness are per API process: under gunicorn each worker
+    schedules its own share of the host's CPUs (see default_capacity).
+    """
+
+    def __init__(self, capacity: int = 0, short_seconds: float = 5.0,
+                 aging_seconds: float = 60.0, history_size: int = 4096):
+        self.capacity = capacity or default_capacity()
+        self.short_seconds = short_seconds
+        self.aging_seconds = aging_seconds
+        self.history_size = history_size
+        self._queues: Dict[str, List] = {"short": [], "long": []}
+        self._running = {"short": 0, "long": 0}
+        self._virtual_time = 0.0
+        self._client_finish: Dict[str, float] = {}
+        self._runtimes: "OrderedDict[str, float]" = OrderedDict()
+        self._sequence = itertools.count()
+
+    @property
+    def long_limit(self) -> int:
+        """Slots long jobs may occupy; one is always left for short jobs"""
+        return max(self.capacity - 1, 1)
+
+    def estimate(self, code: str, timeout: Optional[float] = None) -> float:
+        """Expected runtime in seconds of ``code``"""
+        known = self._runtimes.get(self._similarity_key(code))
+        if known is not None:
+            return known
+        timeout = timeout or settings.code_execution_timeout
+        if _ANIMATION_PATTERN.search(code):
+            return timeout / 2
+        return timeout / 10
+
+    def _similarity_key(self, code: str) -> str:
+        return fingerprint(" ".join(_NUMBER_PATTERN.sub("0", code).split()))
+
+    def _ticket(self, client: str, code: str, timeout: Optional[float]) -> _Ticket:
+        cost = self.estimate(code, timeout)
+        cost_class = "short" if cost <= self.short_seconds else "long"
+        # Equal weights: a client's jobs are spaced by their cost in virtual time
+        start = max(self._virtual_time, self._client_finish.get(client, 0.0))
+        return _Ticket(client, cost_class, cost, start + cost, self._similarity_key(code))
+
+    def _charge(self, ticket: _Ticket) -> None:
+        self._client_finish[ticket.client] = ticket.finish
+        if len(self._client_finish) > self.history_size:
+            # Clients whose last job is behind virtual time have no head start left to keep
+            self._client_finish = {c: f for c, f in self._client_finish.items() if f > self._virtual_time}
+
+    async def acquire(self, client: str, code: str, timeout: Optional[float] = None) -> _Ticket:
+        """Wait for a slot; the returned ticket must be released"""
+        ticket = self._ticket(client, code, timeout)
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._charge(ticket)
+        heapq.heappush(self._queues[ticket.cost_class], (ticket.finish, next(self._sequence), ticket))
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                self.release(ticket, record=False)
+            else:
+                ticket.future.cancel()  # Dropped when it reaches the front
+                self._update_depth()
+            raise
+        return ticket
+
+    def try_acquire(self, client: str, code: str, timeout: Optional[float] = None) -> Optional[_Ticket]:
+        """Take a slot only if one is free and nobody of the same class waits"""
+        ticket = self._ticket(client, code, timeout)
+        if self._front(ticket.cost_class) is not None or not self._has_room(ticket.cost_class):
+            return None
+        self._charge(ticket)
+        self._start(ticket)
+        return ticket
+
+    def release(self, ticket: _Ticket, record: bool = True) -> None:
+        """Free the ticket's slot and learn from its runtime"""
+        self._running[ticket.cost_class] -= 1
+        if record and ticket.started is not None:
+            elapsed = time.monotonic() - ticket.started
+            previous = self._runtimes.pop(ticket.similar, None)
+            # Exponentially weighted, so one unusually slow run doesn't stick
+            self._runtimes[ticket.similar] = elapsed if previous is None else 0.5 * previous + 0.5 * elapsed
+            while len(self._runtimes) > self.history_size:
+                self._runtimes.popitem(last=False)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, client: str, code: str, timeout: Optional[float] = None):
+        ticket = await self.acquire(client, code, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _has_room(self, cost_class: str) -> bool:
+        if sum(self._running.values()) >= self.capacity:
+            return False
+        return cost_class == "short" or self._running["long"] < self.long_limit
+
+    def _start(self, ticket: _Ticket) -> None:
+        ticket.started = time.monotonic()
+        self._running[ticket.cost_class] += 1
+        self._virtual_time = max(self._virtual_time, ticket.finish - ticket.cost)
+        waited = ticket.started - ticket.enqueued
+        queue_wait.observe(waited, cost_class=ticket.cost_class)
+        if waited > 1:
+            logger.info(f"⏳ {ticket.cost_class.capitalize()} execution waited {waited:.1f}s for a slot")
+
+    def _front(self, cost_class: str) -> Optional[_Ticket]:
+        queue = self._queues[cost_class]
+        while queue and queue[0][2].future.done():
+            heapq.heappop(queue)  # Cancelled while waiting
+        return queue[0][2] if queue else None
+
+    def _dispatch(self) -> None:
+        while True:
+            short, long = self._front("short"), self._front("long")
+            aged = long is not None and time.monotonic() - long.enqueued > self.aging_seconds
+            if aged and sum(self._running.values()) < self.capacity:
+                ticket = long
+            elif short is not None and self._has_room("short"):
+                ticket = short
+            elif long is not None and self._has_room("long"):
+                ticket = long
+            else:
+                break
+            heapq.heappop(self._queues[ticket.cost_class])
+            self._start(ticket)
+            ticket.future.set_result(None)
+        self._update_depth()
+
+    def _update_depth(self) -> None:
+        for cost_class, queue in self._queues.items():
+            queued_jobs.set(sum(1 for *_, t in queue if not t.future.done()), cost_class=cost_class)
+
+
+def default_capacity() -> int:
+    """This process's share of the host's CPUs
+
+    gunicorn.conf.py exports WEB_CONCURRENCY with its worker count, so the
+    workers together run about one sandbox per CPU.
+    """
+    workers = max(int(os.getenv("WEB_CONCURRENCY") or 1), 1)
+    return max((os.cpu_count() or 1) // workers, 1)
+
+
+def client_key(model_info: Optional[Dict[str, Any]]) -> str:
+    """Fairness identity of a tool call: the chat client, else its session"""
+    model_info = model_info or {}
+    return model_info.get("client_id") or model_info.get("session_id") or "anonymous"
+
+
+# Global instance
+execution_scheduler = ExecutionScheduler(
+    capacity=settings.execution_slots,
+    short_seconds=settings.execution_short_seconds,
+    aging_seconds=settings.execution_aging_seconds
+)
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Dict, Any, Optional, Set
+
+from app.core.metrics import metrics
+from app.tools.scheduler import execution_scheduler, client_key
+
+logger = logging.getLogger(__name__)
+
+speculations = metrics.counter(
+    "speculative_executions_total", "Streamed python_execute blocks by speculation outcome")
+
+# Import statements inside the still-encoded JSON string ("\n" is escaped)
+# and only once the module name is terminated, so a chunk boundary can't cut it
+_IMPORT_PATTERN = re.compile(r'(?:^|\\n)[ \t]*(?:from|import)[ \t]+([A-Za-z_][\w.]*)(?=[ \t,;\\])')
+_CODE_KEY_PATTERN = re.compile(r'"code"\s*:\s*"')
+
+# Longest timeout python_execute accepts; narrowed once the real value streams in
+_MAX_TIMEOUT = 300
+
+
+class StreamedCode:
+    """Incremental scanner for the "code" argument of a streamed tool input"""
+
+    def __init__(self):
+        self.raw = ""
+        self.code: Optional[str] = None
+        self.modules: Set[str] = set()
+        self._start: Optional[int] = None
+        self._pos = 0
+        self._escaped = False
+
+    def feed(self, partial_json: str) -> Set[str]:
+        """Add a JSON fragment; returns modules newly seen in import statements"""
+        self.raw += partial_json
+        if self.code is not None:
+            return set()
+
+        if self._start is None:
+            match = _CODE_KEY_PATTERN.search(self.raw)
+            if not match:
+                return set()
+            self._start = self._pos = match.end()
+
+        # Find the closing quote of the JSON string, honoring escapes
+        end = None
+        while self._pos < len(self.raw):
+            char = self.raw[self._pos]
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                end = self._pos
+                break
+            self._pos += 1
+
+        encoded = self.raw[self._start:self._pos] + ("\\n" if end is not None else "")
+        found = {m for m in _IMPORT_PATTERN.findall(encoded)} - self.modules
+        self.modules |= found
+        if end is not None:
+            self.code = json.loads('"' + self.raw[self._start:end] + '"')
+        return found
+
+
+class _Block:
+    def __init__(self, tool_id: str):
+        self.tool_id = tool_id
+        self.scanner = StreamedCode()
+        self.worker = None
+        self.spawning: Optional[asyncio.Task] = None  # Cold worker starting off the event loop
+        self.timeout: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.declined = False  # No free execution slot when the code was complete
+        self.consumed = False  # Its result was handed to the tool call, or nothing will use it
+        self.retired = False  # Stopped or released; a worker still booting is given back
+
+
+class Speculation:
+    """Overlaps sandbox preparation with a streaming model response
+
+    When a python_execute block starts, a warm sandbox worker is reserved;
+    modules imported by the streamed code are pre-imported in it; and the
+    execution starts as soon as the "code" string closes, while the model is
+    still emitting the remaining arguments. The finished tool call then
+    picks up the already running (or finished) result.
+    """
+
+    def __init__(self, executor, model_info: Dict[str, Any] = None):
+        self.executor = executor
+        self.model_info = model_info or {}
+        self.blocks: Dict[int, _Block] = {}
+
+    def on_event(self, event) -> None:
+        """Handle one raw stream event"""
+        try:
+            if event.type == "content_block_start":
+                block = event.content_block
+                if block.type == "tool_use" and block.name == "python_execute":
+                    previous = self.blocks.get(event.index)
+                    if previous is not None:
+                        # A retried stream replays its blocks from the start
+                        self._retire(previous)
+                    speculative = _Block(block.id)
+                    self.blocks[event.index] = speculative
+                    self._reserve_worker(speculative)
+            elif event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                speculative = self.blocks.get(event.index)
+                if speculative is not None:
+                    self._feed(speculative, event.delta.partial_json)
+            elif event.type == "content_block_stop":
+                speculative = self.blocks.get(event.index)
+                if speculative is not None and speculative.task is not None:
+                    self._apply_final_timeout(speculative)
+        except Exception as e:
+            logger.warning(f"Speculative execution disabled for this block: {e}")
+
+    async def result_for(self, tool_use) -> Optional[Dict[str, Any]]:
+        """Result of a speculatively started execution for ``tool_use``, if any"""
+        speculative = next((b for b in self.blocks.values() if b.tool_id == tool_use.id), None)
+        if speculative is None or speculative.task is None:
+            return None
+        if speculative.scanner.code != tool_use.input.get("code"):
+            # The real call runs separately; don't let this one hold a slot until its timeout
+            self._discard(speculative)
+            speculations.inc(outcome="mismatch")
+            return None
+        if tool_use.input.get("profile"):
+            # Started without the profiler; stop it and run again profiled
+            self._discard(speculative)
+            speculations.inc(outcome="profiled")
+            return None
+
+        speculative.consumed = True
+        result = await speculative.task
+        speculations.inc(outcome="used")
+        if not tool_use.input.get("include_plots", True):
+            result["plots"] = []
+        return result
+
+    def close(self) -> None:
+        """Give back workers that were reserved but never used
+
+        Executions started for blocks the turn never used are stopped.
+        """
+        for speculative in self.blocks.values():
+            self._retire(speculative)
+
+    def _retire(self, speculative: _Block) -> None:
+        """Release a block's worker, or stop its execution if nothing used it"""
+        if speculative.task is None:
+            speculative.consumed = speculative.retired = True
+            if speculative.worker is not None:
+                self.executor.warm_pool.release(speculative.worker)
+            speculations.inc(outcome="abandoned")
+        elif not speculative.consumed and not speculative.task.done():
+            self._discard(speculative)
+            speculations.inc(outcome="discarded")
+
+    @staticmethod
+    def _discard(speculative: _Block) -> None:
+        speculative.consumed = speculative.retired = True  # Nothing will use it any more
+        if not speculative.task.done() and speculative.worker is not None:
+            speculative.worker.kill()
+
+    def _reserve_worker(self, speculative: _Block) -> None:
+        """Take a warm worker, or start one that boots while the model writes the code"""
+        pool = self.executor.warm_pool
+        speculative.worker = pool.acquire()
+        if speculative.worker is None:
+            # Spawning writes the bootstrap script and forks: keep it off the event loop
+            speculative.spawning = asyncio.get_running_loop().create_task(asyncio.to_thread(pool.spawn))
+            speculative.spawning.add_done_callback(lambda task: self._spawned(speculative, task))
+
+    def _spawned(self, speculative: _Block, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is not None:
+            return  # _execute falls back to another worker or a cold run
+        worker = task.result()
+        if speculative.retired:
+            self.executor.warm_pool.release(worker)  # Retired while booting
+            return
+        speculative.worker = worker
+        self._prime(speculative, speculative.scanner.modules)
+        if speculative.timeout is not None:
+            worker.set_timeout(speculative.timeout)
+
+    def _prime(self, speculative: _Block, modules: Set[str]) -> None:
+        allowed = {m for m in modules if m.split(".")[0] in self.executor.allowed_imports}
+        if allowed and speculative.worker is not None:
+            speculative.worker.prime(sorted(allowed))
+
+    async def _execute(self, speculative: _Block) -> Dict[str, Any]:
+        if speculative.worker is None and speculative.spawning is not None:
+            try:
+                await speculative.spawning
+            except Exception:
+                pass  # execute_code falls back to another worker or a cold run
+        if speculative.retired:
+            return self.executor._cancelled()  # Discarded before its worker booted
+        return await asyncio.to_thread(
+            self.executor.execute_code,
+            code=speculative.scanner.code,
+            include_plots=True,
+            timeout=_MAX_TIMEOUT,
+            model_info=self.model_info,
+            render_options=self.model_info.get("render_options"),
+            worker=speculative.worker
+        )
+
+    def _feed(self, speculative: _Block, partial_json: str) -> None:
+        # Modules seen before a cold worker boots are primed once it has
+        self._prime(speculative, speculative.scanner.feed(partial_json))
+
+        if speculative.scanner.code is not None and speculative.task is None and not speculative.declined:
+            # Speculation only uses idle capacity; a busy pool queues the real call fairly
+            ticket = execution_scheduler.try_acquire(client_key(self.model_info), speculative.scanner.code)
+            if ticket is None:
+                speculative.declined = True
+                speculations.inc(outcome="no_slot")
+                return
+            logger.info("⚡ Code argument complete, starting execution while the model streams")
+            speculative.task = asyncio.get_running_loop().create_task(self._execute(speculative))
+            speculative.task.add_done_callback(lambda _: execution_scheduler.release(ticket))
+            speculations.inc(outcome="started")
+
+    def _apply_final_timeout(self, speculative: _Block) -> None:
+        try:
+            tool_input = json.loads(speculative.scanner.raw or "{}")
+        except ValueError:
+            return
+        timeout = tool_input.get("timeout", 30)
+        if isinstance(timeout, (int, float)):
+            speculative.timeout = min(timeout, _MAX_TIMEOUT)
+            if speculative.worker is not None:
+                speculative.worker.set_timeout(speculative.timeout)
@@ -0,0 +1,53 @@
+"""Execution worker entrypoint for EXECUTION_BACKEND=queue
+
+Runs on compute nodes, consuming sandbox jobs from the Redis broker:
+
+    python -m app.worker --concurrency 4
+"""
+import argparse
+import logging
+import signal
+import sys
+
+from app.core.config import settings
+from app.core.structured_logging import setup_logging
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.remote_executor import ExecutionWorker, RedisBroker, redis
+
+setup_logging(settings.log_level, settings.log_format, settings.log_sample_rates,
+              settings.log_rate_limit, settings.log_queue_size)
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sandbox execution worker")
+    parser.add_argument("--concurrency", type=int, default=settings.execution_worker_concurrency,
+                        help="Jobs executed in parallel (one sandbox process each)")
+    args = parser.parse_args()
+
+    if not settings.redis_url or redis is None:
+        logger.error("❌ Execution workers need REDIS_URL and the redis package")
+        return 1
+    if settings.plot_render_mode != "memory":
+        logger.warning("⚠️ PLOT_RENDER_MODE=file leaves plots on the worker; use memory")
+
+    executor = PythonExecutor()
+    executor.warm_pool.size = max(settings.sandbox_warm_pool_size, args.concurrency)
+    executor.warm_pool.start()
+    worker = ExecutionWorker(
+        RedisBroker(settings.redis_url, prefix=settings.execution_queue_name),
+        executor
+    )
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: worker.stop())
+
+    logger.info(f"🚀 Execution worker consuming '{settings.execution_queue_name}' "
+                f"with concurrency {args.concurrency}")
+    worker.run(args.concurrency)
+    executor.warm_pool.shutdown()
+    logger.info("🛑 Execution worker stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Gunicorn configuration for multi-worker serving
+
+Each worker is a separate process running the FastAPI app under uvicorn's
+worker class, so Python-level work in one request never blocks the others.
+State that must agree across workers (rate limits, caches) lives in the
+shared store; plots are files on a shared volume.
+"""
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Session kernels are process-local, so kernel mode defaults to one worker
+_kernel_backend = os.getenv("EXECUTION_BACKEND", "subprocess") == "kernel"
+workers = int(os.getenv("WEB_CONCURRENCY") or (1 if _kernel_backend else multiprocessing.cpu_count()))
+# Inherited by the workers, which split the host's sandbox slots between them
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Chat turns wait on the model and the sandbox; keep well above both timeouts
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+# On SIGTERM workers stop accepting and let in-flight chats finish (app drain)
+graceful_timeout = int(os.getenv("DRAIN_TIMEOUT", "60")) + 10
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth from plotting libraries
+# (not in kernel mode, where recycling would drop every live session)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0" if _kernel_backend else "1000"))
+max_requests_jitter = 100
+
+accesslog = "-"
+errorlog = "-"
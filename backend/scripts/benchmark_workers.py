@@ -0,0 +1,165 @@
+"""Throughput benchmark for multi-worker serving
+
+Starts the API with 1..N worker processes and drives it with a fixed load
+of concurrent clients, reporting requests/second and latency per worker
+count. The workload exercises the request path the API process itself
+spends CPU on (plot serving with ETag handling, metrics rendering); model
+calls and sandbox runs happen outside the API process and are excluded.
+
+    cd backend
+    python scripts/benchmark_workers.py --workers 1 2 4 --duration 15
+
+Run the load generator on separate cores (or a separate host) from the
+server, otherwise both compete for the same CPUs and scaling flattens.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def start_server(workers: int, port: int, workdir: Path) -> subprocess.Popen:
+    env = dict(os.environ,
+               PYTHONPATH=str(BACKEND_DIR),
+               WEB_CONCURRENCY=str(workers),
+               PORT=str(port),
+               RATE_LIMIT_ENABLED="false",
+               SHARED_STORE_BACKEND="sqlite")
+    if shutil.which("gunicorn"):
+        command = ["gunicorn", "-c", str(BACKEND_DIR / "gunicorn.conf.py"),
+                   "--access-logfile", "/dev/null", "app.main:app"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                   "--workers", str(workers), "--no-access-log"]
+    return subprocess.Popen(command, cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def _drive(base_url: str, paths, connections: int, duration: float):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=connections)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=10.0) as client:
+        async def worker(offset: int):
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(paths[i % len(paths)])
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+                i += 1
+
+        await asyncio.gather(*(worker(i) for i in range(connections)))
+    return latencies, errors
+
+
+def _client_process(base_url, paths, connections, duration, queue):
+    queue.put(asyncio.run(_drive(base_url, paths, connections, duration)))
+
+
+def run_load(base_url: str, paths, clients: int, connections: int, duration: float):
+    queue = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_client_process,
+                                     args=(base_url, paths, connections, duration, queue))
+             for _ in range(clients)]
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    return latencies, errors
+
+
+def seed_plot(workdir: Path) -> str:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app.services.plot_store import PlotStore
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import io
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.plot(range(100), [x * x for x in range(100)])
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    metadata = PlotStore(plots_dir=str(workdir / "data" / "temp")).save(buffer.getvalue(), "png")
+    return metadata["url"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--clients", type=int, default=2, help="Load generator processes")
+    parser.add_argument("--connections", type=int, default=32, help="Connections per client")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="edu-bench-"))
+    plot_url = seed_plot(workdir)
+    paths = [plot_url, f"{plot_url}?size=thumb", "/metrics"]
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print(f"CPUs: {os.cpu_count()}  duration: {args.duration}s  "
+          f"load: {args.clients}x{args.connections} connections")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'scaling':>8}")
+
+    baseline = None
+    try:
+        for workers in args.workers:
+            server = start_server(workers, args.port, workdir)
+            try:
+                wait_ready(base_url)
+                run_load(base_url, paths, args.clients, args.connections, 2.0)  # Warm-up
+                latencies, errors = run_load(base_url, paths, args.clients,
+                                             args.connections, args.duration)
+            finally:
+                os.killpg(server.pid, signal.SIGTERM)
+                server.wait()
+
+            throughput = len(latencies) / args.duration
+            baseline = baseline or throughput
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+            print(f"{workers:>8} {throughput:>10.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7} "
+                  f"{throughput / baseline:>7.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Tests for the sandbox animation capture path"""
+import json
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.animation as mpl_animation
+import numpy as np
+
+from app.tools.executors.sandbox import animation, channel
+
+
+def test_encode_frames_falls_back_to_gif():
+    """Unknown formats fall back to an animated image format"""
+    frames = [np.full((20, 30, 3), value, dtype=np.uint8) for value in (0, 128, 255)]
+    data, ext = animation.encode_frames(frames, fps=10, fmt="unknown")
+    assert ext in ("webp", "gif")
+    assert len(data) > 0
+
+
+def test_save_animation_caps_frames_and_registers_plot(tmp_path, monkeypatch):
+    """FuncAnimation frames are subsampled and registered as an animation plot"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(animation, "_config", dict(animation._config))
+    monkeypatch.setattr(channel, "_config", {"mode": "file", "stream": "__stdout__"})
+    animation.configure(max_frames=10, max_dim=200, format="gif")
+
+    fig, ax = plt.subplots(figsize=(4, 3))
+    line, = ax.plot([0, 1], [0, 1])
+    calls = []
+
+    def update(i):
+        calls.append(i)
+        line.set_ydata([0, i])
+        return line,
+
+    anim = mpl_animation.FuncAnimation(fig, update, frames=50, interval=20)
+    info = animation.save_animation(anim)
+    plt.close(fig)
+
+    assert info["type"] == "animation"
+    assert info["format"] == "gif"
+    assert len(calls) >= 50  # every frame is advanced, only some are rasterized
+    assert (tmp_path / info["filename"]).exists()
+    sidecar = json.loads((tmp_path / f"plot_{info['plot_id']}.json").read_text())
+    assert sidecar["url"] == info["url"]
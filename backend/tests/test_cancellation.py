@@ -0,0 +1,74 @@
+"""Tests for cancelling chat requests when the client goes away"""
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.cancellation import CancellationRegistry, RequestCancelled
+from app.core.shared_store import MemoryStore
+from app.main import app
+from app.services.plot_store import PlotStore
+from app.tools.executors.python_executor import PythonExecutor
+
+
+def test_disconnect_cancels_the_request_and_kills_the_sandbox(tmp_path):
+    """A gone client stops the pipeline and its running subprocess"""
+    executor = PythonExecutor(output_dir=str(tmp_path / "temp"))
+    executor.plot_store = PlotStore(str(tmp_path / "plots"))
+    registry = CancellationRegistry(MemoryStore())
+    results = []
+
+    async def pipeline():
+        results.append(await asyncio.to_thread(
+            executor.execute_code, "import time\ntime.sleep(30)", timeout=60))
+
+    async def scenario():
+        disconnected_at = time.monotonic() + 2.0
+
+        async def is_disconnected():
+            return time.monotonic() > disconnected_at
+
+        try:
+            await registry.run("req-1", pipeline(), is_disconnected, poll_interval=0.1)
+        except RequestCancelled:
+            return True
+        return False
+
+    # asyncio.run also waits for the executor thread, i.e. for the killed process
+    started = time.monotonic()
+    assert asyncio.run(scenario())
+    assert time.monotonic() - started < 10
+    assert results == []
+
+
+def test_cancel_endpoint_reaches_requests_on_other_workers():
+    """Cancels are recorded in the shared store for the owning worker to see"""
+    store = MemoryStore()
+    owner, other = CancellationRegistry(store), CancellationRegistry(store)
+    started = []
+
+    async def slow():
+        started.append(True)
+        await asyncio.sleep(30)
+
+    async def scenario():
+        async def connected():
+            return False
+        task = asyncio.ensure_future(owner.run("req-2", slow(), connected, poll_interval=0.05))
+        await asyncio.sleep(0.1)
+        assert other.request_cancel("req-2") is False
+        try:
+            await asyncio.wait_for(task, 5)
+        except RequestCancelled:
+            return True
+        return False
+
+    assert asyncio.run(scenario())
+    assert started
+
+
+def test_cancel_endpoint_validates_request_ids():
+    """The HTTP cancel endpoint accepts plain IDs only"""
+    client = TestClient(app)
+    assert client.post("/api/v1/chat/abc-123/cancel").json()["cancelled"]
+    assert client.post("/api/v1/chat/bad%20id/cancel").status_code == 400
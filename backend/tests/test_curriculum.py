@@ -0,0 +1,79 @@
+"""Tests for the curriculum pre-warm pipeline"""
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app import curriculum
+from app.api.v1 import chat
+from app.core.claude_client import EducationAgent
+from app.core.shared_store import MemoryStore
+from app.main import app
+from app.services.plot_store import negotiate_render_options
+from app.services.result_cache import ResultCache, execution_cache_key, is_deterministic, response_cache_key
+from app.tools import manager
+
+
+def test_prewarmed_topics_are_served_from_cache(tmp_path, monkeypatch):
+    """Answers land in the response cache, runs in the execution cache, progress resumes"""
+    responses = ResultCache(MemoryStore(), "response", 3600)
+    executions = ResultCache(MemoryStore(), "execution", 3600)
+    monkeypatch.setattr(curriculum, "response_cache", responses)
+    monkeypatch.setattr(chat, "response_cache", responses)
+    monkeypatch.setattr(manager, "execution_cache", executions)
+
+    progress = tmp_path / "progress.jsonl"
+    progress.write_text(json.dumps({"topic": "Simple pendulum", "status": "ok"}) + "\n")
+    agent = EducationAgent(upstream=curriculum.StubModelClient())
+
+    counts = asyncio.run(curriculum.run_pipeline(
+        ["Projectile motion", "Simple pendulum"], agent, progress, concurrency=2))
+    assert counts == {"ok": 1, "failed": 0, "skipped": 1}
+    assert agent.upstream.calls == 2  # Tool call + follow-up for the one pending topic
+
+    code = curriculum.StubModelClient._plot_code("Projectile motion")
+    assert executions.get(execution_cache_key(code, True, negotiate_render_options())) is not None
+
+    async def fail(**kwargs):
+        raise AssertionError("cached topics must not reach the model")
+    monkeypatch.setattr(chat.education_agent, "process_message", fail)
+    # The frontend always sends its session id; first turns are still served from cache
+    response = TestClient(app).post("/api/v1/chat", json={"message": "  projectile   MOTION",
+                                                          "session_id": "tab-1"})
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "HIT"
+    assert len(response.json()["plots"]) == 1
+
+
+def test_stub_runs_leave_caches_and_progress_untouched(tmp_path, monkeypatch):
+    """Canned stub answers must never be served to users or mark topics done"""
+    responses = ResultCache(MemoryStore(), "response", 3600)
+    monkeypatch.setattr(curriculum, "response_cache", responses)
+    monkeypatch.setattr(manager, "execution_cache", ResultCache(MemoryStore(), "execution", 3600))
+    topics = tmp_path / "topics.txt"
+    topics.write_text("Projectile motion\n")
+    progress = tmp_path / "progress.jsonl"
+
+    assert curriculum.main([str(topics), "--model-client", "stub", "--progress", str(progress)]) == 0
+    assert responses.get(response_cache_key("Projectile motion", negotiate_render_options())) is None
+    assert not progress.exists()
+
+
+def test_topic_files_skip_comments_and_blank_lines(tmp_path):
+    topics = tmp_path / "week3.txt"
+    topics.write_text("# Week 3\nFourier series\n\n  Wave interference \n")
+    assert curriculum.load_topics(topics) == ["Fourier series", "Wave interference"]
+
+
+def test_nondeterministic_runs_are_not_replayed(monkeypatch):
+    """Only code without random, clock or id sources goes into the execution cache"""
+    assert is_deterministic(curriculum.StubModelClient._plot_code("Waves"))
+    assert not is_deterministic("noise = np.random.normal(size=100)")
+    assert not is_deterministic("import time\nprint(time.time())")
+
+    executions = ResultCache(MemoryStore(), "execution", 3600)
+    monkeypatch.setattr(manager, "execution_cache", executions)
+    code = "print(np.random.rand())"
+    first = asyncio.run(manager._execute_python_code({"code": code, "include_plots": False}))
+    assert first["success"], first["error"]
+    assert executions.get(execution_cache_key(code, False)) is None
@@ -0,0 +1,73 @@
+"""Tests for render-time downsampling of large plotted series"""
+import io
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from app.tools.executors.sandbox import downsample
+
+
+def _pixels(fig, dpi=100):
+    buffer = io.BytesIO()
+    with downsample.reduced(fig, dpi):
+        fig.savefig(buffer, format="png", dpi=dpi)
+    buffer.seek(0)
+    return plt.imread(buffer)
+
+
+def test_minmax_keeps_the_envelope():
+    y = np.random.default_rng(0).normal(size=1_000_003)
+    keep = downsample.minmax_indices(y, 800)
+
+    assert len(keep) <= 4 * 800
+    assert keep[0] == 0 and keep[-1] == len(y) - 1
+    assert y[keep].min() == y.min() and y[keep].max() == y.max()
+
+
+def test_lttb_picks_threshold_points():
+    x = np.linspace(0, 10, 50_000)
+    keep = downsample.lttb_indices(x, np.sin(x) + (x > 5), 500)
+    assert len(keep) == 500 and keep[0] == 0 and keep[-1] == 49_999
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_dense_line_renders_the_same_picture(monkeypatch):
+    """The reduced line draws (almost) the same pixels and the data comes back"""
+    monkeypatch.setattr(downsample, "_config", dict(downsample._config))
+    x = np.linspace(0, 20, 300_000)
+    y = np.sin(x) + 0.3 * np.random.default_rng(1).normal(size=x.size)
+    fig, ax = plt.subplots(figsize=(6, 4))
+    line, = ax.plot(x, y, linewidth=1)
+
+    reduced = _pixels(fig)
+    assert len(line.get_xdata()) == x.size  # Restored after the render
+    downsample.configure(enabled=False)
+    full = _pixels(fig)
+    plt.close(fig)
+
+    assert reduced.shape == full.shape
+    assert np.mean(np.abs(reduced - full)) < 0.01
+
+
+def test_opaque_scatter_is_thinned_per_pixel():
+    t = np.linspace(0, 200 * np.pi, 200_000)
+    fig, ax = plt.subplots(figsize=(4, 4))
+    line, = ax.plot(np.cos(t), np.sin(t))
+    points = ax.scatter(*np.random.default_rng(2).uniform(size=(2, 100_000)), s=1, c="k")
+    faded = ax.scatter(*np.random.default_rng(3).uniform(size=(2, 100_000)), s=1, alpha=0.1)
+
+    restore = []
+    width, scale = downsample._axes_pixels(ax, 100)
+    downsample._reduce_line(line, width, restore)
+    downsample._reduce_scatter(points, width, scale, restore)
+    downsample._reduce_scatter(faded, width, scale, restore)
+
+    assert len(line.get_xdata()) == 200_000  # Left to matplotlib's path simplification
+    assert len(points.get_offsets()) < 100_000
+    assert len(faded.get_offsets()) == 100_000  # Translucent markers encode density
+    for undo in restore:
+        undo()
+    assert len(line.get_xdata()) == 200_000 and len(points.get_offsets()) == 100_000
+    plt.close(fig)
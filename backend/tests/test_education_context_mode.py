@@ -0,0 +1,76 @@
+"""Tests for resolving the education_context signal without a model round-trip"""
+import asyncio
+from types import SimpleNamespace
+
+from app.core import claude_client
+from app.core.claude_client import education_agent
+from app.core.config import settings
+
+
+def _response(*content, input_tokens=100, output_tokens=50):
+    return SimpleNamespace(content=list(content),
+                           usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens))
+
+
+def _text(text):
+    return SimpleNamespace(type="text", text=text)
+
+
+def _tool_use(name, tool_id, tool_input):
+    return SimpleNamespace(type="tool_use", name=name, id=tool_id, input=tool_input)
+
+
+class ScriptedUpstream:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def create(self, hedge=False, **kwargs):
+        self.calls.append(kwargs)
+        return self.responses.pop(0)
+
+    async def stream(self, on_event, **kwargs):
+        return await self.create(**kwargs)
+
+
+def _run(monkeypatch, mode, responses):
+    upstream = ScriptedUpstream(responses)
+    monkeypatch.setattr(settings, "education_context_mode", mode)
+    monkeypatch.setattr(education_agent, "upstream", upstream)
+
+    async def fake_use_tool(content, model_info=None):
+        return {"success": True, "tool": content.name, "plots": []}
+    monkeypatch.setattr(claude_client, "use_tool", fake_use_tool)
+
+    return asyncio.run(education_agent.process_message("Explain projectile motion")), upstream
+
+
+def test_inline_mode_writes_context_and_executes_in_one_turn(monkeypatch):
+    """Inline mode hides the signal tool and needs one round-trip less"""
+    result, upstream = _run(monkeypatch, "inline", [
+        _response(_text("Galileo first described..."),
+                  _tool_use("python_execute", "t1", {"code": "print(1)"})),
+        _response(_text("Synthesis and follow-up questions")),
+    ])
+
+    assert result["success"]
+    assert result["usage"]["model_calls"] == 2
+    assert result["usage"]["input_tokens"] == 200
+    tool_names = [tool["name"] for tool in upstream.calls[0]["tools"]]
+    assert "education_context" not in tool_names and "python_execute" in tool_names
+    assert "education_context" not in upstream.calls[0]["system"]
+    assert "Galileo" in result["response"] and "Synthesis" in result["response"]
+
+
+def test_tool_mode_keeps_the_signal_round_trip(monkeypatch):
+    """Legacy mode still offers education_context and pays the extra call"""
+    result, upstream = _run(monkeypatch, "tool", [
+        _response(_tool_use("education_context", "t1", {"topic": "projectiles"})),
+        _response(_text("Galileo first described..."),
+                  _tool_use("python_execute", "t2", {"code": "print(1)"})),
+        _response(_text("Synthesis")),
+    ])
+
+    assert result["success"]
+    assert result["usage"]["model_calls"] == 3
+    assert "education_context" in [tool["name"] for tool in upstream.calls[0]["tools"]]
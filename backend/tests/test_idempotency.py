@@ -0,0 +1,126 @@
+"""Tests for coalescing duplicate chat requests"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from fastapi.testclient import TestClient
+
+from app.api.v1 import chat
+from app.core.cancellation import RequestCancelled
+from app.core.idempotency import IdempotencyStore, SingleFlight
+from app.core.shared_store import MemoryStore
+from app.main import app
+
+
+def test_concurrent_duplicates_share_one_computation():
+    """Followers get the leader's result without running the factory"""
+    flights = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"message": "done"}
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("k", compute) for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True]
+    assert all(result == {"message": "done"} for result, _ in results)
+
+
+def test_follower_takes_over_when_the_leader_is_cancelled():
+    """A cancelled leader does not cancel the duplicates waiting on it"""
+    flights = SingleFlight()
+    calls = []
+
+    async def leader():
+        calls.append("leader")
+        await asyncio.sleep(0.05)
+        raise RequestCancelled("leader")
+
+    async def follower():
+        calls.append("follower")
+        return "ok"
+
+    async def scenario():
+        first = asyncio.ensure_future(flights.do("k", leader))
+        await asyncio.sleep(0)
+        second = await flights.do("k", follower)
+        try:
+            await first
+        except RequestCancelled:
+            pass
+        return second
+
+    assert asyncio.run(scenario()) == ("ok", False)
+    assert calls == ["leader", "follower"]
+
+
+def test_idempotency_key_replays_the_stored_response(monkeypatch):
+    """Retries with the same key are answered from the store"""
+    calls = []
+
+    async def fake_process_message(**kwargs):
+        calls.append(kwargs["message"])
+        return {"success": True, "response": f"answer {len(calls)}", "tool_results": []}
+
+    monkeypatch.setattr(chat.education_agent, "process_message", fake_process_message)
+    monkeypatch.setattr(chat, "idempotency_store", IdempotencyStore(MemoryStore()))
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/v1/chat", json={"message": "hi"}, headers=headers)
+    second = client.post("/api/v1/chat", json={"message": "hi"}, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json()["message"] == first.json()["message"] == "answer 1"
+    assert calls == ["hi"]
+
+    conflict = client.post("/api/v1/chat", json={"message": "other"}, headers=headers)
+    assert conflict.status_code == 422
+
+
+class _ClientConnection:
+    """Just enough of a Starlette request for chat_endpoint"""
+
+    def __init__(self):
+        self.headers = {}
+        self.client = SimpleNamespace(host="10.0.0.7")
+        self.gone = asyncio.Event()
+
+    async def is_disconnected(self):
+        return self.gone.is_set()
+
+
+def test_follower_answers_when_the_leader_disconnects(monkeypatch):
+    """A leader's disconnect ends only the leader's HTTP request with 499"""
+    calls = []
+
+    async def fake_process_message(**kwargs):
+        calls.append(kwargs["message"])
+        await asyncio.sleep(0.3)
+        return {"success": True, "response": "answer", "tool_results": []}
+
+    monkeypatch.setattr(chat.education_agent, "process_message", fake_process_message)
+    monkeypatch.setattr(chat.settings, "disconnect_poll_interval", 0.02)
+
+    async def scenario():
+        leader, follower = _ClientConnection(), _ClientConnection()
+        request = chat.ChatRequest(message="what is a derivative (disconnect test)?")
+        first = asyncio.ensure_future(chat.chat_endpoint(request, leader, Response()))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(chat.chat_endpoint(request, follower, Response()))
+        await asyncio.sleep(0.05)
+        leader.gone.set()
+        with pytest.raises(HTTPException) as cancelled:
+            await first
+        return cancelled.value.status_code, await second
+
+    status, answer = asyncio.run(scenario())
+    assert status == 499
+    assert answer["message"] == "answer"
+    assert len(calls) == 2
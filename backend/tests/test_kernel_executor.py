@@ -0,0 +1,71 @@
+"""Tests for the persistent per-session kernel backend"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("jupyter_client")
+pytest.importorskip("ipykernel")
+
+from app.core.config import settings
+from app.services.plot_store import PlotStore
+from app.tools import manager
+from app.tools.executors.sandbox.profiler import format_report
+from app.tools.executors.kernel_executor import KernelExecutor, KernelSession
+from app.tools.executors.python_executor import PythonExecutor
+
+
+@pytest.fixture
+def kernels(tmp_path):
+    executor = PythonExecutor(str(tmp_path / "work"))
+    executor.plot_store = PlotStore(str(tmp_path / "plots"))
+    kernel_executor = KernelExecutor(executor, max_sessions=1)
+    yield kernel_executor
+    kernel_executor.shutdown_all()
+
+
+def test_state_persists_within_session_and_lru_evicts(kernels):
+    """Variables survive across turns; a new session evicts the old kernel"""
+    first = kernels.execute_code("values = np.arange(4) ** 2", session_id="a")
+    assert first["success"], first["error"]
+
+    second = kernels.execute_code("print(values.sum())", session_id="a")
+    assert second["success"], second["error"]
+    assert second["output"].startswith("14")
+
+    failed = kernels.execute_code("1 / 0", session_id="a")
+    assert not failed["success"]
+    assert "ZeroDivisionError" in failed["error"]
+
+    kernels.execute_code("print('other')", session_id="b")
+    assert list(kernels.sessions) == ["b"]
+
+
+def test_concurrent_first_requests_share_one_kernel(kernels, monkeypatch):
+    """Two requests racing to open a session start a single kernel"""
+    started = []
+
+    def start_session(session_id):
+        started.append(session_id)
+        time.sleep(0.2)
+        return KernelSession(session_id, manager=None, client=None, channel_nonce="")
+
+    monkeypatch.setattr(kernels, "_start_session", start_session)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        sessions = list(pool.map(kernels._get_session, ["a", "a"]))
+    assert started == ["a"]
+    assert sessions[0] is sessions[1]
+    kernels.sessions.clear()
+
+
+def test_profile_request_is_reported_as_unavailable(kernels, monkeypatch):
+    """A profiled run on the kernel backend says the profile is missing"""
+    monkeypatch.setattr(settings, "execution_backend", "kernel")
+    monkeypatch.setattr(manager, "kernel_executor", kernels)
+    result = asyncio.run(manager._execute_python_code(
+        {"code": "print(6 * 7)", "include_plots": False, "profile": True},
+        model_info={"session_id": "a"}))
+    assert result["success"], result["error"]
+    assert result["output"].startswith("42")
+    assert format_report(result["profile"]).startswith("Profile unavailable: ")
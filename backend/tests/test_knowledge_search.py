@@ -0,0 +1,66 @@
+"""Tests for the local knowledge_search index"""
+import asyncio
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.services import knowledge_base
+from app.services.knowledge_base import HashingEmbedder, KnowledgeBase, KnowledgeIndex
+from app.tools import manager
+
+CORPUS = Path(__file__).resolve().parent.parent / "app" / "knowledge" / "corpus"
+
+
+def test_index_is_incremental_and_queries_are_fast(tmp_path):
+    """Only changed sections are re-embedded; top-k stays well under 10 ms"""
+    corpus = tmp_path / "corpus"
+    shutil.copytree(CORPUS, corpus)
+    index = KnowledgeIndex(str(tmp_path / "cache"), HashingEmbedder())
+
+    first = index.build(str(corpus))
+    assert first["embedded"] == first["chunks"] > 10
+    assert index.build(str(corpus))["embedded"] == 0
+
+    doc = corpus / "waves.md"
+    doc.write_text(doc.read_text(encoding="utf-8") + "\n## Group velocity\n$v_g = d\\omega/dk$\n",
+                   encoding="utf-8")
+    assert index.build(str(corpus))["embedded"] == 1  # Only the new section
+
+    assert index.load()
+    assert index.search("Gibbs phenomenon overshoot at a jump")[0]["title"] == "Fourier Analysis: Gibbs phenomenon"
+
+    timings = []
+    for _ in range(50):
+        started = time.perf_counter()
+        index.search("charging a capacitor time constant", top_k=3)
+        timings.append(time.perf_counter() - started)
+    assert sorted(timings)[len(timings) // 2] < 0.01
+
+
+def test_concurrent_builds_leave_a_consistent_index(tmp_path):
+    """Workers building the same index at startup don't share temp files"""
+    cache = str(tmp_path / "cache")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        builds = list(pool.map(lambda _: KnowledgeIndex(cache, HashingEmbedder()).build(str(CORPUS), rebuild=True),
+                               range(4)))
+    assert len({build["chunks"] for build in builds}) == 1
+    index = KnowledgeIndex(cache, HashingEmbedder())
+    assert index.load() and len(index.chunks) == builds[0]["chunks"]
+    assert not list((tmp_path / "cache").glob("*.tmp"))
+
+
+def test_knowledge_search_tool(tmp_path, monkeypatch):
+    """The tool is offered to the model and returns ranked passages"""
+    monkeypatch.setattr(settings, "embedding_model", "hashing")
+    monkeypatch.setattr(knowledge_base, "knowledge_base", KnowledgeBase(str(CORPUS), str(tmp_path)))
+    assert "knowledge_search" in [schema["name"] for schema in manager.get_all_tool_schemas()]
+
+    tool_call = SimpleNamespace(name="knowledge_search",
+                                input={"query": "RC circuit time constant", "top_k": 2})
+    result = asyncio.run(manager.use_tool(tool_call))
+    assert result["success"]
+    assert len(result["passages"]) == 2
+    assert result["passages"][0]["source"] == "electric_circuits.md"
@@ -0,0 +1,63 @@
+"""Tests for warm-up, readiness and graceful drain"""
+import asyncio
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.lifecycle import LifecycleManager
+from app.main import app
+from app.services.plot_store import PlotStore
+from app.tools.executors.python_executor import PythonExecutor
+
+
+def test_ready_only_after_warm_up_and_not_while_draining():
+    """Readiness follows warm-up; draining waits for in-flight requests"""
+    lifecycle = LifecycleManager()
+    warmed = []
+
+    async def scenario():
+        assert not lifecycle.ready
+        await lifecycle.warm_up([("ok", lambda: warmed.append(1)), ("broken", lambda: 1 / 0)])
+        assert lifecycle.ready and warmed == [1]
+
+        lifecycle.request_started()
+        asyncio.get_running_loop().call_later(0.1, lifecycle.request_finished)
+        drained = await lifecycle.drain(timeout=5)
+        assert drained and not lifecycle.admitting
+
+        lifecycle.request_started()
+        return await lifecycle.drain(timeout=0.1)
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_draining_worker_refuses_new_chats(monkeypatch):
+    """Chat requests get 503 with Retry-After once draining starts"""
+    from app import main
+    draining = LifecycleManager()
+    draining.state = "draining"
+    monkeypatch.setattr(main, "lifecycle", draining)
+
+    client = TestClient(app)
+    response = client.post("/api/v1/chat", json={"message": "hi"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert client.get("/ready").status_code == 503
+    assert client.get("/").status_code == 200
+
+
+def test_purge_removes_only_stale_temp_files(tmp_path):
+    """Files still possibly in use by sibling workers are kept"""
+    executor = PythonExecutor(output_dir=str(tmp_path / "temp"))
+    executor.plot_store = PlotStore(str(tmp_path / "temp"))
+    stale, fresh = tmp_path / "temp" / "old.csv", tmp_path / "temp" / "new.csv"
+    plot = tmp_path / "temp" / "plot_1234.png"
+    for path in (stale, fresh, plot):
+        path.write_text("x")
+    an_hour_ago = time.time() - 3600
+    os.utime(stale, (an_hour_ago, an_hour_ago))
+    os.utime(plot, (an_hour_ago, an_hour_ago))
+
+    assert executor.purge_temp_files(max_age=600) == 1
+    assert not stale.exists() and fresh.exists() and plot.exists()
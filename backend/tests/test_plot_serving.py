@@ -0,0 +1,63 @@
+"""Tests for cached plot serving"""
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.plot_store import plot_store
+
+client = TestClient(app)
+
+
+def test_plot_served_with_immutable_caching_and_etag(tmp_path, monkeypatch):
+    """Plots carry long-lived caching headers and honor If-None-Match"""
+    monkeypatch.setattr(plot_store, "plots_dir", tmp_path)
+    metadata = plot_store.save(b"\x89PNG fake image bytes", "png")
+
+    response = client.get(metadata["url"])
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+    etag = response.headers["etag"]
+
+    cached = client.get(metadata["url"], headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    partial = client.get(metadata["url"], headers={"Range": "bytes=0-3"})
+    assert partial.status_code == 206
+    assert partial.content == b"\x89PNG"
+
+
+def test_precompressed_svg_and_invalid_names(tmp_path, monkeypatch):
+    """SVG plots are served precompressed; malformed names never touch disk"""
+    monkeypatch.setattr(plot_store, "plots_dir", tmp_path)
+    metadata = plot_store.save(b"<svg>" + b"<g/>" * 200 + b"</svg>", "svg")
+
+    response = client.get(metadata["url"], headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-security-policy"] == "sandbox"
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.content.startswith(b"<svg>")
+
+    assert client.get("/api/plots/..%2Fsecret.png").status_code == 404
+    assert client.get("/api/plots/plot_missing.png").status_code == 404
+
+
+def test_raster_plots_get_size_variants(tmp_path, monkeypatch):
+    """Large static plots get thumb/medium variants selectable via ?size"""
+    from io import BytesIO
+    from PIL import Image
+
+    monkeypatch.setattr(plot_store, "plots_dir", tmp_path)
+    buffer = BytesIO()
+    Image.new("RGB", (1800, 1200), "white").save(buffer, format="PNG")
+    metadata = plot_store.save(buffer.getvalue(), "png", width=1800, height=1200)
+
+    assert set(metadata["variants"]) == {"thumb", "medium"}
+    assert metadata["srcset"].endswith(f"{metadata['url']} 1800w")
+
+    thumb = client.get(metadata["variants"]["thumb"])
+    assert thumb.status_code == 200
+    assert Image.open(BytesIO(thumb.content)).size == (320, 213)
+    assert thumb.headers["etag"] != client.get(metadata["url"]).headers["etag"]
+    assert client.get(metadata["url"] + "?size=huge").status_code == 400
@@ -0,0 +1,59 @@
+"""Tests for figure data export next to rendered plots"""
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.plot_store import plot_store
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.sandbox import plotdata
+
+
+def test_export_round_trips_lines_scatters_and_heatmaps():
+    """Series come back as typed arrays, big ones within the point budget"""
+    fig, (left, right) = plt.subplots(1, 2)
+    x = np.linspace(0, 10, 200_000)
+    y = np.sin(x) + 0.1 * np.random.default_rng(0).normal(size=x.size)
+    left.plot(x, y, color="red", label="signal")
+    left.scatter([1, 2, 3], [4, 5, 6], c=[0.1, 0.5, 0.9], s=[10, 20, 30])
+    image = right.imshow(np.arange(12.0).reshape(3, 4), origin="upper")
+    fig.colorbar(image, ax=right)
+
+    figure = plotdata.decode(plotdata.export_figure(fig))
+    plt.close(fig)
+
+    assert len(figure["axes"]) == 2  # The colorbar is not exported
+    line, scatter = figure["axes"][0]["series"]
+    assert line["kind"] == "line" and line["label"] == "signal" and line["color"] == "#ff0000"
+    assert line["points"] == 200_000 and len(line["x"]) <= plotdata._config["max_points"]
+    assert line["x"].dtype == np.float32
+    assert np.isclose(line["y"].max(), y.max()) and np.isclose(line["y"].min(), y.min())
+    assert list(scatter["x"]) == [1, 2, 3] and list(scatter["sizes"]) == [10, 20, 30]
+    assert len(scatter["colors"]) == 3 * 4
+
+    heatmap = figure["axes"][1]["series"][0]
+    assert (heatmap["rows"], heatmap["columns"]) == (3, 4)
+    assert heatmap["values"][0] == 0 and heatmap["values"][-1] == 11
+    # origin="upper": row 0 sits at the top of the extent
+    assert heatmap["y_edges"][0] < heatmap["y_edges"][-1] and heatmap["y_edges"][0] == -0.5
+    assert len(heatmap["colormap"]) == 256 * 4
+
+
+def test_executed_plot_links_its_data(tmp_path, monkeypatch):
+    """Static plots from the sandbox carry a servable data_url"""
+    monkeypatch.setattr(plot_store, "plots_dir", tmp_path)
+    executor = PythonExecutor(output_dir=str(tmp_path / "temp"))
+    executor.plot_store = plot_store
+    result = executor.execute_code(
+        "x = np.linspace(0, 1, 50)\nplt.plot(x, x ** 2)\nplt.show()\n", timeout=60)
+
+    plot = result["plots"][0]
+    assert plot["data_url"] == f"/api/plots/plot_{plot['plot_id']}.plotdata"
+
+    response = TestClient(app).get(plot["data_url"], headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    series = plotdata.decode(response.content)["axes"][0]["series"][0]
+    assert np.allclose(series["y"], np.linspace(0, 1, 50) ** 2)
@@ -0,0 +1,54 @@
+"""Tests for the opt-in sandbox profiler"""
+from app.core.claude_client import EducationAgent
+from app.tools.executors.python_executor import PythonExecutor
+
+SLOW_CODE = """import numpy as np
+
+def slow(n):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+data = np.ones(1000)
+print(slow(2_000_000))
+"""
+
+
+def test_profile_points_at_the_hot_line(tmp_path):
+    """Hot lines are numbered within the user's code and phases are timed"""
+    result = PythonExecutor(output_dir=str(tmp_path / "temp")).execute_code(
+        SLOW_CODE, include_plots=False, timeout=60, profile=True)
+
+    assert result["success"]
+    assert "@@EDU_PROFILE@@" not in result["output"]
+    profile = result["profile"]
+    assert profile["hot_lines"][0]["line"] == 6
+    assert profile["hot_lines"][0]["source"] == "total += i * i"
+    assert profile["hot_functions"][0]["function"] == "slow (your code)"
+    assert {"preamble", "user_code"} <= set(profile["phases"])
+    assert profile["peak_memory_mb"] > 0 and not profile["timed_out"]
+
+
+def test_profile_survives_a_timeout(tmp_path):
+    """The profiler reports and stops the code before the hard kill"""
+    result = PythonExecutor(output_dir=str(tmp_path / "temp")).execute_code(
+        "x = 0\nwhile True:\n    x += 1\n", include_plots=False, timeout=5, profile=True)
+
+    assert not result["success"]
+    assert result["error"] == "Code execution timeout (5 seconds)"
+    assert result["profile"]["timed_out"]
+    assert result["profile"]["hot_lines"][0]["line"] in (2, 3)
+
+
+def test_profile_is_summarized_for_the_model():
+    """The report survives the result optimizer as readable text"""
+    profile = {"phases": {"preamble": 1.5, "user_code": 4.0}, "plot_render_seconds": 0.2,
+               "peak_memory_mb": 210.0, "memory_growth_mb": 12.5, "timed_out": False,
+               "hot_lines": [{"line": 6, "function": "slow", "share": 0.97, "source": "total += i * i"}],
+               "hot_functions": [{"function": "slow (your code)", "share": 0.97}]}
+    result = {"success": True, "output": "x" * 5000, "plots": [], "profile": profile}
+
+    text = EducationAgent()._optimize_tool_result_for_claude(result)
+    assert "97% line 6 in slow: total += i * i" in text
+    assert "user code 4.00s" in text and "+12.5 MB" in text
@@ -0,0 +1,105 @@
+"""Tests for queue-based remote execution"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.cancellation import CancelScope, cancellations, current_scope
+from app.services.plot_store import PlotStore
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.remote_executor import InProcessBroker, RemoteExecutor, ExecutionWorker
+
+
+@pytest.fixture
+def remote(tmp_path):
+    broker = InProcessBroker()
+    api_executor = PythonExecutor(str(tmp_path / "api"))
+    remote_executor = RemoteExecutor(api_executor, broker, queue_grace=5)
+    remote_executor.plot_store = PlotStore(str(tmp_path / "plots"))
+    worker = ExecutionWorker(broker, PythonExecutor(str(tmp_path / "worker")))
+    yield remote_executor, worker, tmp_path
+    worker.stop()
+
+
+def test_worker_runs_job_and_api_stores_plots(remote):
+    """Results and plot bytes travel back through the broker to the API's store"""
+    remote_executor, worker, tmp_path = remote
+    worker.start_background()
+
+    result = remote_executor.execute_code(
+        "plt.plot([1, 2, 3]); plt.show(); print('done')", timeout=30
+    )
+    assert result["success"], result["error"]
+    assert "done" in result["output"]
+    assert len(result["plots"]) == 1
+    assert "data" not in result["plots"][0]
+    assert (tmp_path / "plots" / result["plots"][0]["url"].rsplit("/", 1)[1]).exists()
+    assert not list((tmp_path / "worker").glob("plot_*"))
+
+
+def test_unsafe_code_never_reaches_the_queue(remote):
+    """Validation happens on the API node before enqueueing"""
+    remote_executor, _, _ = remote
+    result = remote_executor.execute_code("import os")
+    assert not result["success"]
+    assert remote_executor.broker.dequeue(timeout=0.01) is None
+
+
+def test_results_published_between_waits_are_kept():
+    """A timed-out wait slice doesn't drop a result that arrives before the next one"""
+    broker = InProcessBroker()
+    assert broker.wait_result("job", timeout=0.01) is None
+    broker.publish_result("job", {"success": True}, ttl=60)
+    assert broker.wait_result("job", timeout=0.01) == {"success": True}
+    assert broker.wait_result("job", timeout=0.01) is None
+
+    broker.publish_result("stale", {"success": True}, ttl=0)
+    broker.publish_result("fresh", {"success": True}, ttl=60)
+    assert "stale" not in broker._results
+
+
+def test_expired_jobs_are_dropped(remote):
+    """Workers skip jobs whose caller has already given up"""
+    remote_executor, worker, _ = remote
+    remote_executor.broker.enqueue({
+        "job_id": "stale", "code": "print(1)", "include_plots": False, "timeout": 5,
+        "enqueued_at": time.time() - 60, "deadline": time.time() - 1
+    })
+    assert worker.run_once(poll_timeout=0.1)
+    assert remote_executor.broker.wait_result("stale", timeout=0.1) is None
+
+
+def test_cancelled_chat_stops_its_remote_job(remote):
+    """Cancelling the request kills a running job and drops a queued one"""
+    remote_executor, worker, _ = remote
+    worker.start_background()
+    scope = CancelScope("chat")
+    killed_before = cancellations.value(reason="job_cancelled")
+
+    def submit():
+        current_scope.set(scope)
+        return remote_executor.execute_code("import time\ntime.sleep(60)", timeout=60)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(submit)
+        time.sleep(2)
+        scope.cancel("test")
+        result = future.result(timeout=10)
+    assert result["error"] == "Code execution cancelled"
+    assert time.monotonic() - started < 10
+    # The worker saw the flag and killed its sandbox
+    for _ in range(20):
+        if cancellations.value(reason="job_cancelled") > killed_before:
+            break
+        time.sleep(0.1)
+    assert cancellations.value(reason="job_cancelled") == killed_before + 1
+
+    worker.stop()
+    remote_executor.broker.cancel("queued", ttl=60)
+    remote_executor.broker.enqueue({
+        "job_id": "queued", "code": "print(1)", "include_plots": False, "timeout": 5,
+        "enqueued_at": time.time(), "deadline": time.time() + 60
+    })
+    assert worker.run_once(poll_timeout=0.1)
+    assert remote_executor.broker.wait_result("queued", timeout=0.1) is None
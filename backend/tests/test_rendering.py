@@ -0,0 +1,91 @@
+"""Tests for in-memory plot rendering and the worker channel"""
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pytest
+
+from app.services.plot_store import PlotStore, negotiate_render_options
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.sandbox import channel, rendering
+
+
+def test_rendered_figure_round_trips_through_channel(monkeypatch, capsys):
+    """A figure rendered in memory is recovered intact from process output"""
+    monkeypatch.setattr(channel, "_config", {"mode": "memory", "stream": "stdout"})
+    monkeypatch.setattr(channel, "_nonce", "run-nonce")
+
+    fig = plt.figure(figsize=(4, 3))
+    plt.plot([0, 1, 2], [0, 1, 4])
+    print("user output")
+    info = rendering.render_figure(fig, fmt="webp", dpi=50)
+    plt.close(fig)
+
+    output, artifacts = channel.parse_artifacts(capsys.readouterr().out, "run-nonce")
+    assert output.strip() == "user output"
+    assert len(artifacts) == 1
+    assert artifacts[0]["plot_id"] == info["plot_id"]
+    assert artifacts[0]["format"] == "webp"
+    assert artifacts[0]["data"][:4] == b"RIFF"
+
+
+def test_negotiated_dpi_fits_viewport(monkeypatch):
+    """DPI follows the client viewport but stays within configured bounds"""
+    monkeypatch.setattr(rendering, "_config", dict(rendering._config))
+    fig = plt.figure(figsize=(10, 5))
+    rendering.configure(dpi=150, min_dpi=60, target_width=800)
+    assert rendering.negotiate_dpi(fig) == 80
+    rendering.configure(target_width=100)
+    assert rendering.negotiate_dpi(fig) == 60
+    assert rendering.negotiate_dpi(fig, dpi=200) == 200
+    plt.close(fig)
+
+
+def test_plot_store_saves_artifact(tmp_path):
+    """Stored artifacts keep their id and get a servable URL"""
+    store = PlotStore(str(tmp_path))
+    options = negotiate_render_options(viewport_width=700, device_pixel_ratio=2, plot_format="svg")
+    assert options["format"] == "svg"
+    assert options["target_width"] == 1400
+
+    metadata = store.save(b"<svg/>", "svg")
+    assert metadata["url"] == f"/api/plots/plot_{metadata['plot_id']}.svg"
+    assert (tmp_path / f"plot_{metadata['plot_id']}.svg").read_bytes() == b"<svg/>"
+
+
+def test_forged_artifacts_cannot_replace_plots(tmp_path):
+    """Channel records come from user-controlled output: ids and formats aren't trusted"""
+    store = PlotStore(str(tmp_path))
+    existing = store.save(b"<svg/>", "svg")
+
+    forged = store.save_artifact({"data": b"<svg>forged</svg>", "format": "svg",
+                                  "plot_id": existing["plot_id"]})
+    assert forged["plot_id"] != existing["plot_id"]
+    assert (tmp_path / f"plot_{existing['plot_id']}.svg").read_bytes() == b"<svg/>"
+
+    for record in ({"format": "svg/../../x"}, {"format": "html"}, {"type": "script"}):
+        with pytest.raises(ValueError):
+            store.save_artifact(dict({"data": b"x"}, **record))
+    assert {path.name.split(".")[1] for path in tmp_path.iterdir()} == {"svg"}
+
+
+def test_channel_is_not_reachable_from_user_code(tmp_path):
+    """Job configuration runs in a function, so no sandbox module is left in user globals"""
+    executor = PythonExecutor(output_dir=str(tmp_path))
+    probes = "".join(f"try:\n    {name}\n    print('{name} visible')\nexcept NameError:\n    pass\n"
+                     for name in ("channel", "rendering", "_configure_job"))
+    result = executor.execute_code(probes, include_plots=False)
+    assert result["success"] and "visible" not in result["output"]
+
+
+def test_printed_channel_records_are_not_artifacts(tmp_path):
+    """User code can print the marker but not the process's nonce"""
+    executor = PythonExecutor(output_dir=str(tmp_path))
+    executor.plot_store = PlotStore(str(tmp_path / "plots"))
+    record = '{"data": "PHN2Zz48c2NyaXB0PjwvU2NyaXB0Pjwvc3ZnPg==", "format": "svg"}'
+    code = "".join(f"print({line!r})\n" for line in (channel.ARTIFACT_MARKER + record,
+                                                      channel.ARTIFACT_MARKER + "guess " + record))
+    code += "plt.plot([1, 2]); plt.show()\n"
+    result = executor.execute_code(code)
+    assert result["success"], result["error"]
+    assert len(result["plots"]) == 1 and result["plots"][0]["format"] != "svg"
+    assert channel.ARTIFACT_MARKER not in result["output"]
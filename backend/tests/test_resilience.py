@@ -0,0 +1,114 @@
+"""Tests for resilient upstream calls"""
+import asyncio
+
+import anthropic
+import httpx
+import pytest
+
+from app.core.resilience import ResilientClient, CircuitBreaker, CircuitOpenError
+
+
+def _overloaded(retry_after="0"):
+    response = httpx.Response(529, request=httpx.Request("POST", "https://api.test"),
+                              headers={"retry-after": retry_after})
+    return anthropic.InternalServerError("Overloaded", response=response, body=None)
+
+
+def _bad_request():
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.test"))
+    return anthropic.BadRequestError("Invalid request", response=response, body=None)
+
+
+class FakeMessages:
+    """Plays back scripted outcomes: exceptions are raised, tuples are (delay, value)"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        delay, value = outcome
+        await asyncio.sleep(delay)
+        return value
+
+
+class FakeClient:
+    def __init__(self, outcomes):
+        self.messages = FakeMessages(outcomes)
+
+
+def test_retries_overloaded_then_succeeds():
+    """A 529 with retry-after is retried instead of failing the chat"""
+    client = FakeClient([_overloaded(), _overloaded(), (0, "ok")])
+    upstream = ResilientClient(client, max_retries=3, base_delay=0)
+
+    assert asyncio.run(upstream.create(model="main")) == "ok"
+    assert len(client.messages.calls) == 3
+
+
+def test_non_retryable_errors_propagate_immediately():
+    """Client errors such as 400 are not retried"""
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.test"))
+    client = FakeClient([anthropic.BadRequestError("bad", response=response, body=None)])
+    upstream = ResilientClient(client, max_retries=3, base_delay=0)
+
+    with pytest.raises(anthropic.BadRequestError):
+        asyncio.run(upstream.create(model="main"))
+    assert len(client.messages.calls) == 1
+
+
+def test_hedged_request_wins_over_slow_primary():
+    """A slow first call is hedged and the faster duplicate is used"""
+    client = FakeClient([(1.0, "slow"), (0, "fast")])
+    upstream = ResilientClient(client, hedge_delay=0.05)
+
+    assert asyncio.run(upstream.create(hedge=True, model="main")) == "fast"
+    assert len(client.messages.calls) == 2
+
+
+def test_circuit_breaker_fails_fast_and_falls_back():
+    """An open circuit skips the primary model, using the fallback when configured"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    client = FakeClient([_overloaded(), _overloaded()])
+    upstream = ResilientClient(client, max_retries=5, base_delay=0, breaker=breaker)
+
+    with pytest.raises(anthropic.InternalServerError):
+        asyncio.run(upstream.create(model="main"))
+    assert breaker.state == "open"
+    assert len(client.messages.calls) == 2
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(upstream.create(model="main"))
+    assert len(client.messages.calls) == 2
+
+    client.messages.outcomes.append((0, "from fallback"))
+    upstream.fallback_model = "fast"
+    assert asyncio.run(upstream.create(model="main")) == "from fallback"
+    assert client.messages.calls[-1]["model"] == "fast"
+
+
+def test_half_open_probe_always_resolves():
+    """A cancelled probe frees the next one; a 4xx answer counts as upstream healthy"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    client = FakeClient([(1.0, "never"), _bad_request()])
+    upstream = ResilientClient(client, max_retries=0, breaker=breaker)
+
+    async def cancelled_probe():
+        task = asyncio.ensure_future(upstream.create(model="main"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled_probe())
+    assert breaker.state == "half_open" and breaker.allow()
+    breaker.end_probe()
+
+    with pytest.raises(anthropic.BadRequestError):
+        asyncio.run(upstream.create(model="main"))
+    assert breaker.state == "closed"
@@ -0,0 +1,88 @@
+"""Tests for fair-share scheduling of code executions"""
+import asyncio
+
+from app.tools.scheduler import ExecutionScheduler, default_capacity, queue_wait, queued_jobs
+
+ANIMATION = "anim = FuncAnimation(fig, update, frames=200)\nsave_animation(anim)\n"
+
+
+async def _run(scheduler, jobs):
+    """Queue (client, code) jobs behind a held slot; returns the order they start in"""
+    started = []
+
+    async def job(client, code):
+        async with scheduler.slot(client, code, timeout=30):
+            started.append(client)
+            await asyncio.sleep(0)
+
+    blocker = await scheduler.acquire("setup", "pass")
+    tasks = [asyncio.create_task(job(client, code)) for client, code in jobs]
+    await asyncio.sleep(0)
+    scheduler.release(blocker, record=False)
+    await asyncio.gather(*tasks)
+    return started
+
+
+def test_clients_are_served_in_turn():
+    """A client queuing many jobs doesn't hold back another client's single job"""
+    scheduler = ExecutionScheduler(capacity=1)
+    jobs = [("classroom", f"print({n})") for n in range(4)] + [("student", "print('hi')")]
+    started = asyncio.run(_run(scheduler, jobs))
+    assert started.index("student") <= 1
+
+
+def test_short_jobs_bypass_long_ones_and_learn_from_runtimes():
+    scheduler = ExecutionScheduler(capacity=2, short_seconds=5)
+    assert scheduler.estimate(ANIMATION, timeout=30) == 15
+    assert scheduler.estimate("plt.plot(x, y)", timeout=30) == 3
+    before = queue_wait.count(cost_class="long")
+
+    async def scenario():
+        # Long jobs may only hold capacity - 1 slots
+        running = await scheduler.acquire("classroom", ANIMATION)
+        assert scheduler.try_acquire("classroom", ANIMATION) is None
+        waiting = [asyncio.create_task(scheduler.acquire("classroom", ANIMATION)) for _ in range(3)]
+        await asyncio.sleep(0)
+        quick = await asyncio.wait_for(scheduler.acquire("student", "plt.plot(x, y)"), 1)
+        assert queued_jobs.value(cost_class="long") == 3
+        assert not any(task.done() for task in waiting)
+
+        scheduler.release(quick)
+        scheduler.release(running)
+        for task in waiting:
+            scheduler.release(await task)
+
+    asyncio.run(scenario())
+    assert queue_wait.count(cost_class="long") - before == 4
+    assert queued_jobs.value(cost_class="long") == 0
+    # The animations finished instantly; similar code with other numbers is now short
+    assert scheduler.estimate(ANIMATION.replace("200", "50")) < 1
+
+
+def test_cancelled_waiters_give_up_their_place():
+    scheduler = ExecutionScheduler(capacity=1)
+
+    async def scenario():
+        held = await scheduler.acquire("a", "pass")
+        abandoned = asyncio.create_task(scheduler.acquire("b", "pass"))
+        queued = asyncio.create_task(scheduler.acquire("c", "pass"))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        await asyncio.sleep(0)
+        scheduler.release(held)
+        scheduler.release(await asyncio.wait_for(queued, 1))
+        return scheduler.try_acquire("d", "pass")
+
+    assert asyncio.run(scenario()) is not None
+
+
+def test_default_capacity_is_split_between_workers(monkeypatch):
+    """gunicorn workers share the host's CPUs instead of each taking all of them"""
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert default_capacity() == 2
+    assert ExecutionScheduler().capacity == 2
+    monkeypatch.setenv("WEB_CONCURRENCY", "16")
+    assert default_capacity() == 1
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert default_capacity() == 8
@@ -0,0 +1,55 @@
+"""Tests for state shared across worker processes"""
+import multiprocessing
+
+from fastapi.testclient import TestClient
+
+from app.core.rate_limit import RateLimiter
+from app.core.shared_store import SQLiteStore, MemoryStore
+
+
+def _hammer(path, n):
+    store = SQLiteStore(path)
+    for _ in range(n):
+        store.incr("requests", 60)
+
+
+def test_sqlite_store_counts_across_processes(tmp_path):
+    """Concurrent workers never lose increments on the shared counter"""
+    path = str(tmp_path / "shared.db")
+    procs = [multiprocessing.Process(target=_hammer, args=(path, 50)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    count, _ = SQLiteStore(path).incr("requests", 60)
+    assert count == 201
+
+
+def test_sqlite_store_expires_entries(tmp_path):
+    """Expired counters restart and expired values disappear"""
+    store = SQLiteStore(str(tmp_path / "shared.db"))
+    store.incr("window", 0)
+    assert store.incr("window", 60)[0] == 1
+
+    store.set("key", "value", 60)
+    assert store.get("key") == "value"
+    store.set("key", "value", -1)
+    assert store.get("key") is None
+
+
+def test_rate_limit_returns_429_over_limit(monkeypatch):
+    """Chat requests beyond the window limit are rejected with Retry-After"""
+    from app import main
+
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(MemoryStore(), limit=2, window=60))
+    monkeypatch.setattr(main.settings, "rate_limit_enabled", True)
+    client = TestClient(main.app)
+
+    statuses = [client.post("/api/v1/chat/validate", params={"message": "hi"}).status_code
+                for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    blocked = client.post("/api/v1/chat/validate", params={"message": "hi"})
+    assert int(blocked.headers["retry-after"]) > 0
+    assert client.get("/").status_code == 200
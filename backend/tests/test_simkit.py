@@ -0,0 +1,55 @@
+"""Tests for the sandbox simulation helpers"""
+import numpy as np
+
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.sandbox import simkit
+
+
+def test_rk4_integrates_a_batch_of_oscillators():
+    """One call advances every initial condition; matches cos(omega t)"""
+    omega = np.array([1.0, 2.0, 3.0])
+    t = np.linspace(0, 5, 501)
+    y = simkit.rk4(lambda t, y, w: np.stack([y[1], -w ** 2 * y[0]]),
+                   np.stack([np.ones(3), np.zeros(3)]), t, args=(omega,))
+
+    assert y.shape == (501, 2, 3)
+    assert np.allclose(y[:, 0, :], np.cos(np.outer(t, omega)), atol=1e-6)
+
+
+def test_verlet_keeps_orbit_energy_bounded():
+    t = np.linspace(0, 200, 20001)
+    masses = np.array([1.0, 1e-6])
+    x, v = simkit.verlet(lambda x: simkit.pairwise_gravity(x, masses, softening=0.0),
+                         np.array([[0.0, 0.0], [1.0, 0.0]]), np.array([[0.0, 0.0], [0.0, 1.0]]), t)
+
+    r = np.linalg.norm(x[:, 1] - x[:, 0], axis=-1)
+    energy = 0.5 * np.sum(v[:, 1] ** 2, axis=-1) - 1.0 / r
+    assert simkit.energy_drift(energy) < 1e-4
+    assert np.allclose(r, 1.0, atol=1e-3)  # Circular orbit stays circular
+
+
+def test_field_grid_and_sweep():
+    X, Y = simkit.grid((-1, 1), (-1, 1), n=41)
+    Ex, Ey, V = simkit.point_charge_field([1.0, -1.0], [(-0.5, 0.0), (0.5, 0.0)], X, Y, k=1.0)
+    assert Ex.shape == V.shape == (41, 41)
+    assert Ex[20, 20] > 0 and abs(Ey[20, 20]) < 1e-9 and abs(V[20, 20]) < 1e-9
+
+    vectorized = simkit.sweep(lambda v0, angle: v0 ** 2 * np.sin(2 * angle) / 9.81,
+                              v0=[10, 20], angle=np.radians([30, 45, 60]))
+    assert vectorized["result"].shape == (2, 3)
+    assert np.isclose(vectorized["result"][1, 1], 400 / 9.81)
+
+    import math
+    scalar_only = simkit.sweep(lambda a, b: math.hypot(a, b), a=[3, 6], b=[4, 8])
+    assert scalar_only["result"].tolist() == [[5.0, math.hypot(3, 8)], [math.hypot(6, 4), 10.0]]
+
+
+def test_simkit_is_preloaded_in_the_sandbox():
+    code = (
+        "t = np.linspace(0, 1, 11)\n"
+        "y = simkit.rk4(lambda t, y: -y, np.ones(4), t)\n"
+        "print(round(float(y[-1, 0]), 4))\n"
+    )
+    result = PythonExecutor().execute_code(code, include_plots=False, timeout=60)
+    assert result["success"], result.get("error")
+    assert str(round(np.exp(-1.0), 4)) in result["output"]
@@ -0,0 +1,130 @@
+"""Tests for speculative sandbox execution from streamed tool input"""
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+from app.services.plot_store import PlotStore
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.speculation import Speculation, StreamedCode
+
+
+def _events(tool_id, tool_input, chunk=7):
+    raw = json.dumps(tool_input)
+    yield SimpleNamespace(type="content_block_start", index=1,
+                          content_block=SimpleNamespace(type="tool_use", name="python_execute", id=tool_id))
+    for i in range(0, len(raw), chunk):
+        yield SimpleNamespace(type="content_block_delta", index=1,
+                              delta=SimpleNamespace(type="input_json_delta", partial_json=raw[i:i + chunk]))
+    yield SimpleNamespace(type="content_block_stop", index=1)
+
+
+def test_streamed_code_scanner_handles_escapes_and_imports():
+    """The code string is decoded once closed and imports are seen early"""
+    code = 'import numpy as np\nfrom scipy import integrate\nprint("a \\"quoted\\" word")'
+    raw = json.dumps({"code": code, "timeout": 10})
+    scanner = StreamedCode()
+    seen = set()
+    for i in range(0, len(raw), 5):
+        seen |= scanner.feed(raw[i:i + 5])
+        if "scipy" in seen:
+            assert scanner.code is None or scanner.code == code
+    assert scanner.code == code
+    assert seen == {"numpy", "scipy"}
+
+
+def test_execution_starts_before_the_tool_call_completes(tmp_path):
+    """The sandbox runs while the rest of the input streams and the result is reused"""
+    executor = PythonExecutor(output_dir=str(tmp_path / "temp"))
+    executor.plot_store = PlotStore(str(tmp_path / "plots"))
+    executor.warm_pool.size = 1
+    tool_input = {"code": "import math\nprint(math.factorial(5))", "timeout": 20, "include_plots": False}
+
+    async def scenario():
+        executor.warm_pool.start()
+        speculation = Speculation(executor, {})
+        events = list(_events("t1", tool_input))
+        for event in events[:-1]:
+            speculation.on_event(event)
+        assert speculation.blocks[1].task is not None
+        speculation.on_event(events[-1])
+        assert speculation.blocks[1].worker._timeout == 20
+
+        tool_use = SimpleNamespace(id="t1", name="python_execute", input=tool_input)
+        result = await speculation.result_for(tool_use)
+        mismatch = await speculation.result_for(
+            SimpleNamespace(id="t1", name="python_execute", input={"code": "print(2)"}))
+        speculation.close()
+        return result, mismatch
+
+    try:
+        result, mismatch = asyncio.run(scenario())
+    finally:
+        executor.warm_pool.shutdown()
+
+    assert result["success"], result
+    assert "120" in result["output"]
+    assert result["plots"] == []
+    assert mismatch is None
+
+
+def test_unused_speculative_runs_are_stopped(tmp_path):
+    """A mismatched or never-consumed block doesn't keep running to the timeout"""
+    executor = PythonExecutor(output_dir=str(tmp_path / "temp"))
+    executor.plot_store = PlotStore(str(tmp_path / "plots"))
+    tool_input = {"code": "import time\ntime.sleep(60)", "timeout": 60}
+
+    async def scenario():
+        speculation = Speculation(executor, {})
+        for event in _events("t1", tool_input):
+            speculation.on_event(event)
+        task = speculation.blocks[1].task
+        assert await speculation.result_for(
+            SimpleNamespace(id="t1", name="python_execute", input={"code": "print(1)"})) is None
+        await asyncio.wait_for(task, 10)
+
+        speculation = Speculation(executor, {})
+        for event in _events("t2", tool_input):
+            speculation.on_event(event)
+        task = speculation.blocks[1].task
+        speculation.close()
+        return (await asyncio.wait_for(task, 10))["success"]
+
+    try:
+        assert asyncio.run(scenario()) is False
+    finally:
+        executor.warm_pool.shutdown()
+
+
+def test_replayed_blocks_retire_the_earlier_run_and_spawn_off_loop(tmp_path, monkeypatch):
+    """A retried stream doesn't orphan the first attempt; cold spawns don't block the loop"""
+    executor = PythonExecutor(output_dir=str(tmp_path / "temp"))
+    executor.plot_store = PlotStore(str(tmp_path / "plots"))
+    loop_threads = []
+    spawn = executor.warm_pool.spawn
+
+    def tracked_spawn():
+        loop_threads.append(threading.current_thread() is threading.main_thread())
+        return spawn()
+    monkeypatch.setattr(executor.warm_pool, "spawn", tracked_spawn)
+    tool_input = {"code": "import time\ntime.sleep(60)", "timeout": 60}
+
+    async def scenario():
+        speculation = Speculation(executor, {})
+        for event in _events("t1", tool_input):
+            speculation.on_event(event)
+        assert speculation.blocks[1].worker is None  # Still booting in a thread
+        first = speculation.blocks[1].task
+
+        # The retry replays block 1 from its start
+        for event in _events("t1", tool_input):
+            speculation.on_event(event)
+        outcome = await asyncio.wait_for(first, 10)
+        speculation.close()
+        return outcome
+
+    try:
+        assert asyncio.run(scenario())["success"] is False
+    finally:
+        executor.warm_pool.shutdown()
+    assert loop_threads == [False, False]
@@ -0,0 +1,94 @@
+"""Tests for application startup cost and background readiness probing"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+from anthropic import APIStatusError
+from fastapi.testclient import TestClient
+
+from app.core.claude_client import EducationAgent, education_agent
+from app.core.shared_store import MemoryStore
+from app.main import app
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Importing app.main took ~2s while it loaded the anthropic SDK; ~0.5s without
+IMPORT_BUDGET_SECONDS = 1.5
+
+# Loaded on first use (first chat, kernel session or knowledge search), never at import
+DEFERRED_MODULES = ["anthropic", "jupyter_client", "hnswlib", "sentence_transformers", "matplotlib"]
+
+
+def test_import_stays_within_budget(tmp_path):
+    """A fresh interpreter imports the app quickly and without the heavy SDKs"""
+    script = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import app.main\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    # Best of three, so a busy test machine doesn't fail the budget
+    runs = []
+    for _ in range(3):
+        completed = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env,
+                                   capture_output=True, text=True, timeout=60, check=True)
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    assert runs[0]["loaded"] == []
+    assert min(run["seconds"] for run in runs) < IMPORT_BUDGET_SECONDS
+
+
+def test_health_reports_probe_result_without_calling_the_api(monkeypatch):
+    def live_call():
+        raise AssertionError("health checks must not call the Claude API")
+    monkeypatch.setattr(education_agent, "validate_api_key", live_call)
+    monkeypatch.setattr(education_agent, "api_status", None)
+    monkeypatch.setattr(education_agent, "store", MemoryStore())
+    client = TestClient(app)
+
+    assert client.get("/health").json()["claude_api"] == "unknown"
+
+    monkeypatch.setattr(education_agent, "validate_api_key", lambda: False)
+    assert education_agent.probe_api() is False
+    monkeypatch.setattr(education_agent, "validate_api_key", live_call)
+    body = client.get("/health").json()
+    assert body["status"] == "degraded" and body["claude_api"] == "disconnected"
+    assert client.get("/api/v1/chat/health").json()["claude_api"] == "disconnected"
+
+
+def _overloaded():
+    request = httpx.Request("GET", "https://api.anthropic.com/v1/models")
+    return APIStatusError("overloaded", response=httpx.Response(529, request=request), body=None)
+
+
+def test_probe_runs_once_per_interval_and_tolerates_blips(monkeypatch):
+    """One worker probes per interval, and a single 529 doesn't flip the API to down"""
+    store = MemoryStore()
+    workers = [EducationAgent(store=store), EducationAgent(store=store)]
+    calls = []
+
+    def healthy():
+        calls.append("ok")
+        return True
+
+    def overloaded():
+        calls.append("529")
+        raise _overloaded()
+
+    for worker in workers:
+        monkeypatch.setattr(worker, "validate_api_key", healthy)
+    assert [worker.probe_api() for worker in workers] == [True, True]
+    assert calls == ["ok"]
+
+    monkeypatch.setattr(workers[0], "validate_api_key", overloaded)
+    for attempt in range(3):
+        store.delete("claude_probe:claim")  # next interval
+        status = workers[0].probe_api()
+        assert status is (True if attempt < 2 else False)
+    assert workers[1].probe_api() is False
+    assert calls == ["ok", "529", "529", "529"]
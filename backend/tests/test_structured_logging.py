@@ -0,0 +1,95 @@
+"""Tests for the queued, sampled structured logging pipeline"""
+import asyncio
+import json
+import logging
+import logging.handlers
+import queue
+
+from app.core.structured_logging import (
+    JsonFormatter, NonBlockingQueueHandler, RateLimitFilter, RequestContextFilter,
+    SamplingFilter, bind_request_id, parse_sample_rates, request_id_var
+)
+
+
+def _pipeline(*filters):
+    """Queue handler feeding a listener that collects formatted lines"""
+    lines = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            lines.append(json.loads(self.format(record)))
+
+    collector = Collect()
+    collector.setFormatter(JsonFormatter())
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=100))
+    handler.addFilter(RequestContextFilter())
+    for log_filter in filters:
+        handler.addFilter(log_filter)
+    listener = logging.handlers.QueueListener(handler.queue, collector)
+    logger = logging.getLogger("test.structured")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = [handler]
+    return logger, listener, lines
+
+
+def test_records_carry_request_id_across_threads():
+    """Lines logged from executor threads keep the request ID bound in the endpoint"""
+    logger, listener, lines = _pipeline()
+    listener.start()
+
+    async def request():
+        bind_request_id("req-42")
+        logger.info("tool %s", "python_execute", extra={"plots": 2})
+        await asyncio.to_thread(logger.info, "sandbox done")
+
+    asyncio.run(request())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("outside any request")
+    listener.stop()
+
+    assert [line["request_id"] for line in lines[:2]] == ["req-42", "req-42"]
+    assert lines[0]["message"] == "tool python_execute" and lines[0]["plots"] == 2
+    assert "request_id" not in lines[2] and "ValueError: boom" in lines[2]["exc_info"]
+    assert request_id_var.get() is None
+
+
+def test_sampling_keeps_or_drops_whole_requests():
+    logger, listener, lines = _pipeline(SamplingFilter(parse_sample_rates("test=0.5, bad=x")))
+    listener.start()
+
+    async def request(request_id):
+        bind_request_id(request_id)
+        for step in range(3):
+            logger.info(f"step {step}")
+        logger.warning("always kept")
+
+    for n in range(40):
+        asyncio.run(request(f"req-{n}"))
+    listener.stop()
+
+    per_request = {}
+    for line in lines:
+        per_request.setdefault(line["request_id"], []).append(line["level"])
+    assert all(levels in (["WARNING"], ["INFO"] * 3 + ["WARNING"]) for levels in per_request.values())
+    assert len(per_request) == 40
+    assert 0 < sum(len(levels) == 4 for levels in per_request.values()) < 40
+
+
+def test_rate_limit_reports_suppressed_records():
+    rate_limit = RateLimitFilter(per_second=1000, burst=5)
+    logger, listener, lines = _pipeline(rate_limit)
+    listener.start()
+    for n in range(50):
+        logger.info(f"hot {n}")
+    logger.error("errors are never rate limited")
+    rate_limit.per_second = 1e9  # Refill immediately
+    logger.info("after the burst")
+    listener.stop()
+
+    messages = [line["message"] for line in lines]
+    assert messages[:5] == [f"hot {n}" for n in range(5)]
+    assert "errors are never rate limited" in messages
+    assert lines[-1]["message"] == "after the burst" and lines[-1]["suppressed"] >= 40
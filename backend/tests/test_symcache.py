@@ -0,0 +1,143 @@
+"""Tests for the persistent SymPy memoization in the sandbox"""
+import sqlite3
+import types
+from fractions import Fraction
+
+import pytest
+import sympy as sp
+
+from app.core.config import settings
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.sandbox import symcache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch, capsys):
+    """symcache on a fresh store, wrapping counting stand-ins for sympy
+
+    Yields a ``flush`` callable playing the executor: it writes the records
+    published so far to the store.
+    """
+    monkeypatch.setattr(symcache, "_config", dict(symcache._config))
+    monkeypatch.setattr(symcache, "_connection", None)
+    path = str(tmp_path / "sympy.db")
+    symcache.configure(path=path, token="job-token", stream="stdout", min_seconds=0)
+    calls = []
+
+    def flush(max_bytes=2 ** 20):
+        _, records = symcache.parse_records(capsys.readouterr().out, "job-token")
+        return symcache.save_records(path, records, max_bytes)
+
+    def counted(name):
+        def function(*args, **kwargs):
+            calls.append(name)
+            return getattr(sp, name)(*args, **kwargs)
+        function.__name__ = name
+        return function
+
+    module = types.SimpleNamespace(**{name: counted(name) for name in symcache.CACHED_FUNCTIONS})
+    symcache.install(module)
+    yield module, calls, flush
+    if symcache._connection is not None:
+        symcache._connection.close()
+
+
+def test_repeated_calls_are_served_from_the_store(cache):
+    module, calls, flush = cache
+    x = sp.Symbol("x")
+    f = sp.Function("f")
+
+    first = module.solve([x ** 2 - 4, x > 0], x)
+    ode = module.dsolve(f(x).diff(x) - f(x), ics={f(0): 2})
+    assert flush() == 2
+    assert module.solve([x ** 2 - 4, x > 0], x) == first
+    assert module.dsolve(f(x).diff(x) - f(x), ics={f(0): 2}) == ode
+    assert calls == ["solve", "dsolve"]
+
+    # Symbol assumptions are part of the key
+    positive = sp.Symbol("x", positive=True)
+    assert module.simplify(sp.sqrt(positive ** 2)) == positive
+    flush()
+    assert module.simplify(sp.sqrt(x ** 2)) == sp.sqrt(x ** 2)
+    assert calls.count("simplify") == 2
+
+
+def test_uncacheable_arguments_and_failures_call_through(cache):
+    module, calls, flush = cache
+    assert module.simplify(Fraction(2, 4)) == sp.Rational(1, 2)
+    assert flush() == 0
+    assert module.simplify(Fraction(2, 4)) == sp.Rational(1, 2)
+    with pytest.raises(sp.SympifyError):
+        module.simplify(object())
+    assert calls == ["simplify"] * 3
+
+
+def test_store_is_bounded_by_evicting_least_recently_used(cache, tmp_path):
+    module, _, flush = cache
+    x = sp.Symbol("x")
+    for n in range(40):
+        module.integrate(x ** n, x)
+    flush(max_bytes=4000)
+
+    db = sqlite3.connect(tmp_path / "sympy.db")
+    total, count = db.execute("SELECT SUM(size), COUNT(*) FROM results").fetchone()
+    assert total <= 4000 and 0 < count < 40
+    db.close()
+
+
+def test_entries_cannot_run_code_or_answer_other_calls(cache, tmp_path):
+    """Only whitelisted constructors are called, and a row answers only its own call"""
+    module, calls, flush = cache
+    x = sp.Symbol("x")
+    for forged in ("__import__('os').system('true')", "sympify('x')", "Add('x', 'y')",
+                   "(lambda: 1)()", "Symbol('x').subs"):
+        with pytest.raises((ValueError, SyntaxError)):
+            symcache._load(forged)
+    # Printed records don't carry the executor's token
+    print(symcache.RECORD_MARKER + '{"call": "c", "value": "Integer(1)", "seconds": 1, "token": "guess"}')
+    assert flush() == 0
+
+    module.integrate(x, x)
+    flush()
+    db = sqlite3.connect(tmp_path / "sympy.db")
+    db.execute("UPDATE results SET call = 'other'")
+    db.commit()
+    db.close()
+    assert module.integrate(x, x) == x ** 2 / 2
+    assert calls == ["integrate", "integrate"]
+
+
+def test_cache_is_shared_between_executions(tmp_path, monkeypatch):
+    """The executor stores a run's result and a second sandbox run reads it"""
+    monkeypatch.setattr(settings, "sympy_cache_path", str(tmp_path / "sympy.db"))
+    executor = PythonExecutor(output_dir=str(tmp_path / "temp"))
+    code = "x = symbols('x')\nprint(sp_integrate(exp(-x**2) * sin(x)**2, (x, -oo, oo)))\n"
+
+    first = executor.execute_code(code, include_plots=False, timeout=60)
+    second = executor.execute_code(code, include_plots=False, timeout=60)
+    assert first["success"] and second["success"]
+    assert "sqrt(pi)*(1 - exp(-1))/2" in second["output"]
+    assert symcache.RECORD_MARKER not in first["output"] + second["output"]
+
+    db = sqlite3.connect(tmp_path / "sympy.db")
+    assert db.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 1
+    db.close()
+
+
+
+def test_sandbox_connection_is_read_only(cache):
+    """Even the sandbox's own connection can't change the store"""
+    module, _, flush = cache
+    x = sp.Symbol("x")
+    module.integrate(x, x)
+    flush()
+    module.integrate(x, x)
+    with pytest.raises(sqlite3.OperationalError):
+        symcache._db().execute("DELETE FROM results")
+
+
+def test_module_is_not_reachable_from_user_code(tmp_path):
+    executor = PythonExecutor(output_dir=str(tmp_path))
+    result = executor.execute_code("try:\n    symcache\n    print('visible')\nexcept NameError:\n    pass\n",
+                                   include_plots=False)
+    assert result["success"] and "visible" not in result["output"]
@@ -0,0 +1,59 @@
+"""Tests for the in-process template renderer"""
+import asyncio
+from types import SimpleNamespace
+
+from app.services.plot_store import PlotStore
+from app.tools import manager
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.template_renderer import TemplateRenderer
+
+
+def test_templates_render_in_process_and_memoize(tmp_path, monkeypatch):
+    """Built-in scenarios skip the sandbox and repeat calls hit the memo"""
+    renderer = TemplateRenderer()
+    renderer.plot_store = PlotStore(str(tmp_path))
+    monkeypatch.setattr(manager, "template_renderer", renderer)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("sandbox should not be used")
+    monkeypatch.setattr(manager, "_execute_python_code", fail)
+    draws = []
+    draw = renderer._draw
+    monkeypatch.setattr(renderer, "_draw", lambda *args: draws.append(args) or draw(*args))
+
+    tool_call = SimpleNamespace(name="physics_simulate", input={
+        "scenario": "projectile_motion", "parameters": {"initial_velocity": 20, "angle": 30}
+    })
+    first = asyncio.run(manager.use_tool(tool_call))
+    assert first["success"]
+    assert len(first["plots"]) == 1 and first["plots"][0]["width"] == 1500
+
+    second = asyncio.run(manager.use_tool(tool_call))
+    assert second["plots"][0]["url"] == first["plots"][0]["url"]
+    assert len(draws) == 1  # The repeat call was served from the memo
+
+    other = renderer.render("math_visualize", "integral", {"range": [0, 2]},
+                            {"format": "svg", "dpi": 150, "target_width": 600})
+    assert other["plots"][0]["format"] == "svg"
+    assert other["plots"][0]["width"] == 600
+
+
+def test_unknown_scenarios_use_the_default_template(tmp_path):
+    """Scenarios without a dedicated template fall back to the generic one"""
+    renderer = TemplateRenderer()
+    renderer.plot_store = PlotStore(str(tmp_path))
+    result = renderer.render("math_visualize", "fourier series", {"range": "bad"})
+    assert result["success"]
+    assert (tmp_path / result["plots"][0]["url"].rsplit("/", 1)[1]).exists()
+
+
+def test_sandbox_fallback_interprets_parameters_like_the_fast_path(tmp_path):
+    """With the fast path off or failing, the sandbox draws the same data"""
+    renderer = TemplateRenderer()
+    parameters = {"initial_velocity": 20, "angle": 30, "time_duration": 2}
+    code = renderer.sandbox_code("physics_simulate", "projectile_motion", parameters)
+    code += "print(round(float(ax.lines[0].get_xdata()[-1]), 3))\n"
+
+    result = PythonExecutor(output_dir=str(tmp_path)).execute_code(code, include_plots=False)
+    assert result["success"], result["error"]
+    assert "34.641" in result["output"]  # 20 m/s * cos(30°) * 2 s
@@ -0,0 +1,77 @@
+"""Tests for the AST-based pre-flight validator"""
+from app.tools.executors.python_executor import PythonExecutor
+from app.tools.executors.validator import CodeValidator
+
+validator = CodeValidator(
+    allowed_imports={"numpy", "math", "matplotlib"},
+    forbidden_calls={"eval", "exec", "open", "__import__", "globals"}
+)
+
+
+def test_identifiers_resembling_forbidden_names_pass():
+    """Substrings like 'eval' inside identifiers are no longer rejected"""
+    result = validator.validate("def evaluate(x):\n    return x\nopened = evaluate(1)\nimport numpy.linalg")
+    assert result["safe"], result["reason"]
+
+
+def test_rejections_report_line_numbers():
+    """Disallowed imports, builtins and dunder escapes are caught with their line"""
+    assert validator.validate("x = 1\nimport os")["line"] == 2
+    assert not validator.validate("from subprocess import run")["safe"]
+    assert not validator.validate("f = eval")["safe"]
+    assert not validator.validate("().__class__.__base__.__subclasses__()")["safe"]
+    assert not validator.validate("getattr(print, '__globals__')")["safe"]
+
+
+def test_syntax_errors_and_cache():
+    """Syntax errors use validate_syntax's message format and results are cached"""
+    result = validator.validate("x = (1,\n")
+    assert result["syntax_error"]
+    assert result["reason"].startswith("Syntax error:")
+    assert validator.check_syntax("return 1")["valid"] is False
+
+    code = "import math\nprint(math.pi)"
+    assert validator.validate(code) is validator.validate(code)
+
+
+def test_attribute_chains_to_os_and_sys_are_rejected():
+    """Modules re-exported by allowed libraries don't open a way to the OS"""
+    for code in (
+        "import matplotlib\nmatplotlib.os.system('id')",
+        "import numpy as np\nnp.os.popen('id')",
+        "sys.modules['os'].system('id')",
+        "m = sys\nm.modules",
+        "import numpy\ngetattr(numpy, 'os')",
+        "import numpy\nnumpy.core.multiarray.builtins",
+    ):
+        assert not validator.validate(code)["safe"], code
+    assert validator.validate("import numpy as np\nnp.cos(np.pi)")["safe"]
+
+
+def test_builtin_escapes_and_file_access_are_rejected(tmp_path):
+    """Bypasses of the AST checks that the old substring check caught"""
+    executor = PythonExecutor(output_dir=str(tmp_path))
+    for code in (
+        "print.__self__.eval(\"__import__('os').system('echo PWNED')\")",
+        "b = print.__self__\nb.exec('x = 1')",
+        "getattr(print, '__se' + 'lf__')",
+        "name = '__self__'\nsetattr(print, name, 1)",
+        "import io\nio.open('/etc/passwd').read()",
+        "from io import open",
+        "import io\nio.FileIO('/etc/passwd')",
+        "import pathlib\npathlib.Path('/etc/passwd').read_text()",
+        "import numpy as np\nnp.__class__",
+    ):
+        assert not executor.validator.validate(code)["safe"], code
+
+    result = executor.execute_code("print.__self__.eval(\"__import__('os').system('echo PWNED')\")",
+                                   include_plots=False)
+    assert not result["success"] and "PWNED" not in result["output"]
+
+    for code in (
+        "import re\npattern = re.compile('a+')",
+        "from io import BytesIO\nbuffer = BytesIO()",
+        "class Body:\n    def __init__(self):\n        super().__init__()\nprint(Body.__name__)",
+        "import numpy as np\nhasattr(np, 'cos')",
+    ):
+        assert executor.validator.validate(code)["safe"], code
@@ -143,11 +143,11 @@ start_services() {
 wait_for_services() {
     print_info "Waiting for services to be ready..."
     
-    # Wait for backend service
+    # Wait for backend service (ready = warm-up finished)
     print_info "Waiting for backend service..."
-    timeout=60
+    timeout=120
     while [ $timeout -gt 0 ]; do
-        if curl -f http://localhost:8000/health >/dev/null 2>&1; then
+        if curl -f http://localhost:8000/ready >/dev/null 2>&1; then
             break
         fi
         sleep 2
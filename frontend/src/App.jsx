@@ -5,6 +5,7 @@ import { vscDarkPlus } from 'react-syntax-highlighter/dist/esm/styles/prism';
 import remarkMath from 'remark-math';
 import rehypeKatex from 'rehype-katex';
 import 'katex/dist/katex.min.css';
+import InteractivePlot from './InteractivePlot';
 import './styles/App.css';
 
 function App() {
@@ -12,6 +13,14 @@ function App() {
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [showWelcome, setShowWelcome] = useState(true);
+  // Identifies this conversation so the backend can keep execution state
+  const [sessionId, setSessionId] = useState(() => {
+    const saved = localStorage.getItem('chat-session-id');
+    if (saved) return saved;
+    const created = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+    localStorage.setItem('chat-session-id', created);
+    return created;
+  });
 
   // Load messages from localStorage on component mount
   useEffect(() => {
@@ -57,7 +66,12 @@ function App() {
         },
         body: JSON.stringify({
           message: input,
-          history: messages
+          history: messages,
+          session_id: sessionId,
+          // Let the backend pick plot format and DPI for this screen
+          viewport_width: Math.min(window.innerWidth, 1200),
+          device_pixel_ratio: window.devicePixelRatio || 1,
+          plot_format: 'webp'
         }),
       });
 
@@ -102,6 +116,10 @@ function App() {
     setShowWelcome(true);
     setInput('');
     localStorage.removeItem('chat-messages');
+    // Start a fresh execution session for the next conversation
+    const created = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+    localStorage.setItem('chat-session-id', created);
+    setSessionId(created);
   };
 
   // Custom code block renderer for syntax highlighting
@@ -230,13 +248,43 @@ function App() {
                       return null;
                     }
                     
+                    if (plot.format === 'mp4') {
+                      return (
+                        <div key={plotIndex} className="plot">
+                          <video 
+                            src={imageUrl} 
+                            className="plot-image"
+                            autoPlay
+                            loop
+                            muted
+                            playsInline
+                          />
+                        </div>
+                      );
+                    }
+                    
+                    // Downscaled variants let the browser skip full-size images
+                    const srcSet = plot.url && plot.srcset
+                      ? plot.srcset.split(', ').map(entry => `${apiUrl}${entry}`).join(', ')
+                      : undefined;
+                    
+                    const imageProps = {
+                      src: imageUrl,
+                      srcSet,
+                      sizes: srcSet ? '(max-width: 900px) 100vw, 800px' : undefined,
+                      loading: 'lazy',
+                      alt: `Physics visualization ${plotIndex + 1}`,
+                      className: 'plot-image'
+                    };
+                    
                     return (
                       <div key={plotIndex} className="plot">
-                        <img 
-                          src={imageUrl} 
-                          alt={`Physics visualization ${plotIndex + 1}`}
-                          className="plot-image"
-                        />
+                        {plot.data_url ? (
+                          // Zoom and pan are redrawn locally from the exported data
+                          <InteractivePlot dataUrl={`${apiUrl}${plot.data_url}`} {...imageProps} />
+                        ) : (
+                          <img {...imageProps} alt={imageProps.alt} />
+                        )}
                       </div>
                     );
                   })}
@@ -0,0 +1,96 @@
+import React, { useEffect, useRef, useState } from 'react';
+import { axesAt, drawFigure, initialViews, loadPlotData, panView, zoomView } from './plotData';
+
+// A static plot that becomes zoomable once its exported data is loaded:
+// Ctrl/⌘ + scroll (or pinch) zooms, dragging pans, double-click restores
+// the server-rendered image. No request goes back to the model or sandbox.
+function InteractivePlot({ dataUrl, ...imageProps }) {
+  const containerRef = useRef(null);
+  const canvasRef = useRef(null);
+  const dragRef = useRef(null);
+  const [figure, setFigure] = useState(null);
+  // null while the server-rendered image is shown
+  const [views, setViews] = useState(null);
+
+  const prefetch = () => {
+    if (!figure) {
+      loadPlotData(dataUrl).then(setFigure).catch(error => console.warn('Plot data unavailable:', error));
+    }
+  };
+
+  // Pointer position in figure fractions (origin top left)
+  const locate = event => {
+    const rect = containerRef.current.getBoundingClientRect();
+    return [(event.clientX - rect.left) / rect.width, (event.clientY - rect.top) / rect.height];
+  };
+
+  useEffect(() => {
+    const container = containerRef.current;
+    if (!figure || !container) return undefined;
+    // Registered natively: React's wheel listeners are passive and can't block page zoom
+    const onWheel = event => {
+      if (!event.ctrlKey && !event.metaKey) return;
+      const [fx, fy] = locate(event);
+      const index = axesAt(figure, fx, fy);
+      if (index < 0) return;
+      event.preventDefault();
+      setViews(current => zoomView(figure, current || initialViews(figure), index,
+        Math.exp(event.deltaY * 0.002), fx, fy));
+    };
+    container.addEventListener('wheel', onWheel, { passive: false });
+    return () => container.removeEventListener('wheel', onWheel);
+  }, [figure]);
+
+  useEffect(() => {
+    const canvas = canvasRef.current;
+    if (!figure || !views || !canvas) return;
+    const rect = containerRef.current.getBoundingClientRect();
+    const ratio = window.devicePixelRatio || 1;
+    canvas.width = Math.round(rect.width * ratio);
+    canvas.height = Math.round(rect.width * ratio * figure.size[1] / figure.size[0]);
+    drawFigure(canvas, figure, views);
+  }, [figure, views]);
+
+  const onPointerDown = event => {
+    if (!figure || event.button !== 0) return;
+    const [fx, fy] = locate(event);
+    const index = axesAt(figure, fx, fy);
+    if (index < 0) return;
+    event.preventDefault();
+    event.currentTarget.setPointerCapture(event.pointerId);
+    dragRef.current = { index, fx, fy, views: views || initialViews(figure) };
+  };
+
+  const onPointerMove = event => {
+    const drag = dragRef.current;
+    if (!drag) return;
+    const [fx, fy] = locate(event);
+    setViews(panView(figure, drag.views, drag.index, fx - drag.fx, fy - drag.fy));
+  };
+
+  const endDrag = () => {
+    dragRef.current = null;
+  };
+
+  return (
+    <div
+      ref={containerRef}
+      className={`interactive-plot${figure ? ' ready' : ''}`}
+      title={figure ? 'Ctrl + scroll to zoom, drag to pan, double-click to reset' : undefined}
+      onPointerEnter={prefetch}
+      onPointerDown={onPointerDown}
+      onPointerMove={onPointerMove}
+      onPointerUp={endDrag}
+      onPointerCancel={endDrag}
+      onDoubleClick={() => setViews(null)}
+    >
+      {views ? (
+        <canvas ref={canvasRef} className="plot-image" />
+      ) : (
+        <img {...imageProps} alt={imageProps.alt} draggable={false} />
+      )}
+    </div>
+  );
+}
+
+export default InteractivePlot;
@@ -0,0 +1,328 @@
+// Client-side redraw of figure data exported next to static plots
+// (see backend/app/tools/executors/sandbox/plotdata.py for the layout).
+// Zooming and panning only change the view limits, so they are drawn here
+// instead of asking the model to re-run the code.
+
+const MAGIC = 'EDUPLOT1';
+const ARRAY_TYPES = { float32: Float32Array, uint8: Uint8Array };
+
+// url -> Promise of the parsed figure
+const figureCache = new Map();
+
+export function parsePlotData(buffer) {
+  const bytes = new Uint8Array(buffer);
+  if (String.fromCharCode(...bytes.subarray(0, 8)) !== MAGIC) {
+    throw new Error('Not an exported figure');
+  }
+  const headerLength = new DataView(buffer).getUint32(8, true);
+  const header = JSON.parse(new TextDecoder().decode(bytes.subarray(12, 12 + headerLength)));
+  const bodyStart = 12 + headerLength;
+
+  const materialize = node => {
+    if (Array.isArray(node)) return node.map(materialize);
+    if (node && typeof node === 'object') {
+      const keys = Object.keys(node);
+      if (keys.length === 3 && 'offset' in node && 'length' in node && 'dtype' in node) {
+        return new ARRAY_TYPES[node.dtype](buffer, bodyStart + node.offset, node.length);
+      }
+      return Object.fromEntries(keys.map(key => [key, materialize(node[key])]));
+    }
+    return node;
+  };
+  return materialize(header);
+}
+
+export function loadPlotData(url) {
+  if (!figureCache.has(url)) {
+    const request = fetch(url)
+      .then(response => {
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        return response.arrayBuffer();
+      })
+      .then(parsePlotData);
+    // Let a failed load be retried on the next interaction
+    request.catch(() => figureCache.delete(url));
+    figureCache.set(url, request);
+  }
+  return figureCache.get(url);
+}
+
+const scaleOf = kind => (kind === 'log' ? v => Math.log10(v) : v => v);
+const unscaleOf = kind => (kind === 'log' ? v => 10 ** v : v => v);
+
+// View limits as rendered on the server
+export function initialViews(figure) {
+  return figure.axes.map(axes => ({ xlim: [...axes.xlim], ylim: [...axes.ylim] }));
+}
+
+// Index of the axes under a point given in figure fractions (origin top left)
+export function axesAt(figure, fx, fy) {
+  return figure.axes.findIndex(({ position: [x0, y0, w, h] }) =>
+    fx >= x0 && fx <= x0 + w && 1 - fy >= y0 && 1 - fy <= y0 + h);
+}
+
+function zoomLimits(limits, kind, factor, anchorFraction) {
+  const scale = scaleOf(kind);
+  const unscale = unscaleOf(kind);
+  const [lo, hi] = limits.map(scale);
+  const anchor = lo + (hi - lo) * anchorFraction;
+  return [unscale(anchor + (lo - anchor) * factor), unscale(anchor + (hi - anchor) * factor)];
+}
+
+function panLimits(limits, kind, fraction) {
+  const scale = scaleOf(kind);
+  const unscale = unscaleOf(kind);
+  const [lo, hi] = limits.map(scale);
+  const shift = (hi - lo) * fraction;
+  return [unscale(lo - shift), unscale(hi - shift)];
+}
+
+// Zoom one axes by `factor` (< 1 zooms in) around a point in figure fractions
+export function zoomView(figure, views, index, factor, fx, fy) {
+  const { position: [x0, y0, w, h], xscale, yscale } = figure.axes[index];
+  const view = views[index];
+  const next = [...views];
+  next[index] = {
+    xlim: zoomLimits(view.xlim, xscale, factor, (fx - x0) / w),
+    ylim: zoomLimits(view.ylim, yscale, factor, (1 - fy - y0) / h),
+  };
+  return next;
+}
+
+// Shift one axes by a drag of (dfx, dfy) figure fractions (dfy grows downwards)
+export function panView(figure, views, index, dfx, dfy) {
+  const { position: [, , w, h], xscale, yscale } = figure.axes[index];
+  const view = views[index];
+  const next = [...views];
+  next[index] = {
+    xlim: panLimits(view.xlim, xscale, dfx / w),
+    ylim: panLimits(view.ylim, yscale, -dfy / h),
+  };
+  return next;
+}
+
+function niceTicks(lo, hi, count = 5) {
+  const span = Math.abs(hi - lo);
+  if (!(span > 0) || !Number.isFinite(span)) return [];
+  const raw = span / count;
+  const magnitude = 10 ** Math.floor(Math.log10(raw));
+  const step = [1, 2, 2.5, 5, 10].map(m => m * magnitude).find(s => s >= raw);
+  const ticks = [];
+  for (let t = Math.ceil(Math.min(lo, hi) / step) * step; t <= Math.max(lo, hi) + step * 1e-9; t += step) {
+    ticks.push(Math.abs(t) < step * 1e-9 ? 0 : t);
+  }
+  return ticks;
+}
+
+function logTicks(lo, hi) {
+  const ticks = [];
+  for (let p = Math.ceil(Math.log10(Math.min(lo, hi))); p <= Math.floor(Math.log10(Math.max(lo, hi))); p++) {
+    ticks.push(10 ** p);
+  }
+  return ticks;
+}
+
+const formatTick = value => String(Number(value.toPrecision(6)));
+
+const DASHES = { '--': [3.7, 1.6], ':': [1, 1.65], '-.': [6.4, 1.6, 1, 1.6] };
+
+function rgba(colors, index) {
+  const i = (colors.length >= (index + 1) * 4 ? index : 0) * 4;
+  return `rgba(${colors[i]},${colors[i + 1]},${colors[i + 2]},${colors[i + 3] / 255})`;
+}
+
+function drawLine(ctx, series, X, Y, pointPx) {
+  const { x, y } = series;
+  ctx.globalAlpha = series.alpha ?? 1;
+  ctx.strokeStyle = ctx.fillStyle = series.color;
+  if (series.linestyle !== 'None' && series.linestyle !== 'none' && series.linestyle !== '') {
+    const width = series.linewidth * pointPx;
+    ctx.lineWidth = width;
+    ctx.setLineDash((DASHES[series.linestyle] || []).map(d => d * width));
+    ctx.beginPath();
+    let drawing = false;
+    for (let i = 0; i < x.length; i++) {
+      const px = X(x[i]);
+      const py = Y(y[i]);
+      if (!Number.isFinite(px) || !Number.isFinite(py)) {
+        drawing = false;  // NaN gaps break the line
+      } else if (drawing) {
+        ctx.lineTo(px, py);
+      } else {
+        ctx.moveTo(px, py);
+        drawing = true;
+      }
+    }
+    ctx.stroke();
+    ctx.setLineDash([]);
+  }
+  if (series.marker) {
+    const radius = (series.markersize / 2) * pointPx;
+    for (let i = 0; i < x.length; i++) {
+      ctx.beginPath();
+      ctx.arc(X(x[i]), Y(y[i]), radius, 0, 2 * Math.PI);
+      ctx.fill();
+    }
+  }
+}
+
+function drawScatter(ctx, series, X, Y, pointPx) {
+  const { x, y, sizes, colors } = series;
+  ctx.globalAlpha = 1;
+  for (let i = 0; i < x.length; i++) {
+    const size = sizes.length === x.length ? sizes[i] : sizes[0];
+    ctx.fillStyle = rgba(colors, colors.length === x.length * 4 ? i : 0);
+    ctx.beginPath();
+    ctx.arc(X(x[i]), Y(y[i]), (Math.sqrt(size) / 2) * pointPx, 0, 2 * Math.PI);
+    ctx.fill();
+  }
+}
+
+// Cell colors as an offscreen canvas, row 0 first (cached on the series)
+function heatmapImage(series) {
+  if (series.image) return series.image;
+  const { rows, columns } = series;
+  const pixels = new Uint8ClampedArray(rows * columns * 4);
+  if (series.rgba) {
+    pixels.set(series.rgba);
+  } else {
+    const { values, colormap, vmin, vmax } = series;
+    const log = series.norm === 'log';
+    const lo = log ? Math.log10(vmin) : vmin;
+    const hi = log ? Math.log10(vmax) : vmax;
+    for (let i = 0; i < values.length; i++) {
+      const value = log ? Math.log10(values[i]) : values[i];
+      if (!Number.isFinite(value)) continue;  // Masked cells stay transparent
+      const level = Math.min(255, Math.max(0, Math.floor(((value - lo) / (hi - lo || 1)) * 256)));
+      pixels.set(colormap.subarray(level * 4, level * 4 + 4), i * 4);
+    }
+  }
+  const canvas = document.createElement('canvas');
+  canvas.width = columns;
+  canvas.height = rows;
+  canvas.getContext('2d').putImageData(new ImageData(pixels, columns, rows), 0, 0);
+  series.image = canvas;
+  return canvas;
+}
+
+const isUniform = edges => {
+  const step = (edges[edges.length - 1] - edges[0]) / (edges.length - 1);
+  return edges.every((edge, i) => Math.abs(edge - (edges[0] + i * step)) <= Math.abs(step) * 1e-3);
+};
+
+function drawHeatmap(ctx, series, X, Y) {
+  const image = heatmapImage(series);
+  const xs = Array.from(series.x_edges, X);
+  const ys = Array.from(series.y_edges, Y);
+  ctx.globalAlpha = 1;
+  ctx.imageSmoothingEnabled = false;
+  if (isUniform(xs) && isUniform(ys)) {
+    // Negative sizes flip the image, e.g. row 0 at the bottom for origin="lower"
+    ctx.save();
+    ctx.translate(xs[0], ys[0]);
+    ctx.scale(Math.sign(xs[xs.length - 1] - xs[0]) || 1, Math.sign(ys[ys.length - 1] - ys[0]) || 1);
+    ctx.drawImage(image, 0, 0, Math.abs(xs[xs.length - 1] - xs[0]), Math.abs(ys[ys.length - 1] - ys[0]));
+    ctx.restore();
+    return;
+  }
+  for (let row = 0; row < series.rows; row++) {
+    for (let column = 0; column < series.columns; column++) {
+      ctx.drawImage(image, column, row, 1, 1, xs[column], ys[row],
+        xs[column + 1] - xs[column], ys[row + 1] - ys[row]);
+    }
+  }
+}
+
+const SERIES_PAINTERS = { heatmap: drawHeatmap, scatter: drawScatter, line: drawLine };
+
+// Draw every exported axes of `figure` with the given view limits
+export function drawFigure(canvas, figure, views) {
+  const ctx = canvas.getContext('2d');
+  const { width, height } = canvas;
+  const pointPx = width / (figure.size[0] * 72);
+  const fontPx = 9 * pointPx;
+  ctx.save();
+  ctx.fillStyle = 'white';
+  ctx.fillRect(0, 0, width, height);
+  ctx.font = `${fontPx}px sans-serif`;
+
+  figure.axes.forEach((axes, index) => {
+    const [fx, fy, fw, fh] = axes.position;
+    const left = fx * width;
+    const top = (1 - fy - fh) * height;
+    const boxWidth = fw * width;
+    const boxHeight = fh * height;
+    const { xlim, ylim } = views[index];
+    const sx = scaleOf(axes.xscale);
+    const sy = scaleOf(axes.yscale);
+    const X = v => left + ((sx(v) - sx(xlim[0])) / (sx(xlim[1]) - sx(xlim[0]))) * boxWidth;
+    const Y = v => top + boxHeight - ((sy(v) - sy(ylim[0])) / (sy(ylim[1]) - sy(ylim[0]))) * boxHeight;
+
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(left, top, boxWidth, boxHeight);
+    ctx.clip();
+    // Heatmaps below scatters below lines, as matplotlib's default z-order does
+    ['heatmap', 'scatter', 'line'].forEach(kind => axes.series
+      .filter(series => series.kind === kind)
+      .forEach(series => SERIES_PAINTERS[kind](ctx, series, X, Y, pointPx)));
+    ctx.restore();
+
+    ctx.globalAlpha = 1;
+    ctx.strokeStyle = ctx.fillStyle = '#222';
+    ctx.lineWidth = Math.max(1, 0.8 * pointPx);
+    ctx.strokeRect(left, top, boxWidth, boxHeight);
+    const tick = 3.5 * pointPx;
+    const xticks = axes.xscale === 'log' ? logTicks(...xlim) : niceTicks(...xlim);
+    const yticks = axes.yscale === 'log' ? logTicks(...ylim) : niceTicks(...ylim);
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'top';
+    xticks.forEach(value => {
+      const px = X(value);
+      ctx.beginPath();
+      ctx.moveTo(px, top + boxHeight);
+      ctx.lineTo(px, top + boxHeight + tick);
+      ctx.stroke();
+      ctx.fillText(formatTick(value), px, top + boxHeight + tick * 1.5);
+    });
+    ctx.textAlign = 'right';
+    ctx.textBaseline = 'middle';
+    yticks.forEach(value => {
+      const py = Y(value);
+      ctx.beginPath();
+      ctx.moveTo(left, py);
+      ctx.lineTo(left - tick, py);
+      ctx.stroke();
+      ctx.fillText(formatTick(value), left - tick * 1.5, py);
+    });
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'top';
+    if (axes.xlabel) ctx.fillText(axes.xlabel, left + boxWidth / 2, top + boxHeight + tick * 2 + fontPx * 1.4);
+    ctx.textBaseline = 'bottom';
+    if (axes.title) ctx.fillText(axes.title, left + boxWidth / 2, top - tick);
+    if (axes.ylabel) {
+      ctx.save();
+      ctx.translate(left - tick * 2 - fontPx * 3.5, top + boxHeight / 2);
+      ctx.rotate(-Math.PI / 2);
+      ctx.fillText(axes.ylabel, 0, 0);
+      ctx.restore();
+    }
+
+    const labelled = axes.series.filter(series => series.label && series.kind === 'line');
+    if (labelled.length) {
+      ctx.textAlign = 'left';
+      ctx.textBaseline = 'middle';
+      labelled.forEach((series, i) => {
+        const py = top + fontPx * (1.2 + 1.4 * i);
+        ctx.strokeStyle = ctx.fillStyle = series.color;
+        ctx.beginPath();
+        ctx.moveTo(left + boxWidth - fontPx * 9, py);
+        ctx.lineTo(left + boxWidth - fontPx * 7.5, py);
+        ctx.stroke();
+        ctx.fillStyle = '#222';
+        ctx.fillText(series.label, left + boxWidth - fontPx * 7, py, fontPx * 6.5);
+      });
+    }
+  });
+  ctx.restore();
+}
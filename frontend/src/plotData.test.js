@@ -0,0 +1,51 @@
+import { TextDecoder, TextEncoder } from 'util';
+import { axesAt, initialViews, panView, parsePlotData, zoomView } from './plotData';
+
+// jsdom, which react-scripts tests run in, lacks the Encoding API
+Object.assign(global, { TextDecoder, TextEncoder });
+
+// Builds a buffer in the backend's layout: magic, header length, header, body
+function encode(header, arrays) {
+  let json = JSON.stringify(header);
+  json += ' '.repeat((4 - (json.length % 4)) % 4);
+  const body = new Float32Array(arrays.flat());
+  const buffer = new ArrayBuffer(12 + json.length + body.byteLength);
+  const bytes = new Uint8Array(buffer);
+  bytes.set([...'EDUPLOT1'].map(c => c.charCodeAt(0)));
+  new DataView(buffer).setUint32(8, json.length, true);
+  bytes.set(new TextEncoder().encode(json), 12);
+  bytes.set(new Uint8Array(body.buffer), 12 + json.length);
+  return buffer;
+}
+
+const figure = parsePlotData(encode({
+  version: 1,
+  size: [6, 4],
+  axes: [{
+    position: [0.1, 0.1, 0.8, 0.8], xlim: [0, 10], ylim: [1, 100], xscale: 'linear', yscale: 'log',
+    series: [{
+      kind: 'line', x: { offset: 0, length: 3, dtype: 'float32' }, y: { offset: 12, length: 3, dtype: 'float32' },
+    }],
+  }],
+}, [[0, 5, 10], [1, 10, 100]]));
+
+test('parses typed arrays out of exported plot data', () => {
+  const [line] = figure.axes[0].series;
+  expect(line.x).toBeInstanceOf(Float32Array);
+  expect(Array.from(line.y)).toEqual([1, 10, 100]);
+});
+
+test('zooms around the pointer and pans in data units', () => {
+  const views = initialViews(figure);
+  expect(axesAt(figure, 0.5, 0.5)).toBe(0);
+  expect(axesAt(figure, 0.05, 0.5)).toBe(-1);
+
+  const zoomed = zoomView(figure, views, 0, 0.5, 0.5, 0.5);
+  expect(zoomed[0].xlim).toEqual([2.5, 7.5]);
+  // Log axes zoom in decades: 1..100 around 10 becomes ~3.16..31.6
+  expect(zoomed[0].ylim[0]).toBeCloseTo(Math.sqrt(10));
+
+  const panned = panView(figure, zoomed, 0, 0.08, 0);
+  expect(panned[0].xlim[0]).toBeCloseTo(2);
+  expect(views[0].xlim).toEqual([0, 10]);
+});